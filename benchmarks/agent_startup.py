@@ -0,0 +1,78 @@
+"""
+Time until a web worker can serve its first upload: eager vs lazy AWSBoto3Agent.
+
+The eager column builds every sub-agent up front, as the import-time agent in
+views.py used to: create four clients, get_queue_url, list_foundation_models and
+list_inference_profiles. The lazy columns build only the facade, then only the S3
+agent that an upload needs. boto3 is replaced by a fake whose calls sleep for a
+typical round trip, so the numbers show startup work only.
+
+    python -m benchmarks.agent_startup
+"""
+import time
+from unittest import mock
+
+from helper import aws_boto3_agent
+from helper.aws_boto3_agent import AWSBoto3Agent
+
+CLIENT_CREATE_SECONDS = 0.04
+LATENCY_SECONDS = {
+    "get_queue_url": 0.05,
+    "list_foundation_models": 0.35,
+    "list_inference_profiles": 0.25,
+}
+MODEL_ARN = "arn:aws:bedrock:eu-central-1::foundation-model/bench-model"
+
+
+class FakeClient:
+    def __init__(self, service, *args, **kwargs):
+        # boto3.client() is called with region_name=, config= etc.
+        time.sleep(CLIENT_CREATE_SECONDS)
+        self.service = service
+
+    def _wait(self, name):
+        time.sleep(LATENCY_SECONDS.get(name, 0))
+
+    def get_queue_url(self, QueueName):
+        self._wait("get_queue_url")
+        return {"QueueUrl": f"https://sqs.local/{QueueName}"}
+
+    def list_foundation_models(self):
+        self._wait("list_foundation_models")
+        return {"modelSummaries": [{"modelArn": MODEL_ARN, "providerName": self.provider,
+                                    "modelLifecycle": {"status": "ACTIVE"}}]}
+
+    def list_inference_profiles(self):
+        self._wait("list_inference_profiles")
+        return {"inferenceProfileSummaries": [{"inferenceProfileArn": "bench-profile", "models": [{"modelArn": MODEL_ARN}]}]}
+
+
+def _timed(build) -> float:
+    started = time.perf_counter()
+    build()
+    return time.perf_counter() - started
+
+
+def _eager():
+    agent = AWSBoto3Agent()
+    agent._s3, agent._sqs, agent._bedrock
+
+
+def _lazy():
+    AWSBoto3Agent()
+
+
+def _upload_only():
+    AWSBoto3Agent()._s3
+
+
+def main() -> None:
+    with mock.patch.object(aws_boto3_agent.boto3, "client", side_effect=FakeClient):
+        FakeClient.provider = AWSBoto3Agent().provider
+        print(f"{'eager':>10} {'lazy':>10} {'upload only':>12}")
+        for _ in range(3):
+            print(f"{_timed(_eager) * 1000:>8.0f}ms {_timed(_lazy) * 1000:>8.0f}ms {_timed(_upload_only) * 1000:>10.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
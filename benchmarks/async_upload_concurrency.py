@@ -0,0 +1,115 @@
+"""
+Requests per second of the upload endpoint under ASGI: views.upload_file vs views_async.upload_file.
+
+Both views are driven through Django's AsyncClient, so each request goes through
+the ASGI handler, middleware, multipart parsing with the inspecting upload
+handlers, form validation and the outbox write, as under Uvicorn. Django runs the
+sync view through sync_to_async(thread_sensitive=True), so every request's S3
+latency is spent on one shared thread; the async view awaits it on the bounded
+AWS executor. The database is a throwaway SQLite file and the AWS agent is a fake
+whose S3 upload sleeps for a typical round trip, so no AWS access is needed.
+
+    python -m benchmarks.async_upload_concurrency
+"""
+import asyncio
+import itertools
+import os
+import tempfile
+import time
+
+import django
+from django.conf import settings
+
+import django_main.settings as project_settings
+
+_workdir = tempfile.mkdtemp(prefix="upload-bench-")
+settings.configure(**{
+    **{name: getattr(project_settings, name) for name in dir(project_settings) if name.isupper()},
+    "DATABASES": {"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": os.path.join(_workdir, "db.sqlite3")}},
+    "ROOT_URLCONF": __name__,
+    "ALLOWED_HOSTS": ["*"],
+})
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.core.files.uploadedfile import SimpleUploadedFile  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.test import AsyncClient  # noqa: E402
+from django.urls import include, path  # noqa: E402
+
+from helper import aws_boto3_agent  # noqa: E402
+from home_app import views  # noqa: E402
+from home_app.models import UploadedFile  # noqa: E402
+
+S3_UPLOAD_SECONDS = 0.08
+CONCURRENCY = (1, 8, 32, 64)
+ROUNDS = 3
+PDF_BYTES = 64 * 1024
+
+urlpatterns = [
+    path("bench/sync-upload", views.upload_file),
+    path("", include("accounts_app.urls")),
+    path("", include("home_app.urls")),  # home_app:upload is views_async.upload_file
+]
+
+
+class FakeDepthProbe:
+    def backlog(self) -> int:
+        return 0
+
+
+class FakeAgent:
+    def get_sqs_depth_probe(self) -> FakeDepthProbe:
+        return FakeDepthProbe()
+
+    def upload_fileobj_to_s3(self, fileobj, key) -> bool:
+        fileobj.seek(0)
+        while fileobj.read(1024 * 1024):
+            pass
+        time.sleep(S3_UPLOAD_SECONDS)
+        return True
+
+    def delete_fileobj_from_s3(self, file_key) -> bool:
+        return True
+
+
+def _pdf(index: int) -> bytes:
+    # Distinct bytes per request so no upload is treated as a duplicate of another
+    header = f"%PDF-1.7\n% bench {index}\n".encode()
+    return header + b"0" * (PDF_BYTES - len(header))
+
+
+async def _rps(client: AsyncClient, url: str, user_id: int, concurrent: int, counter) -> float:
+    async def upload():
+        index = next(counter)
+        response = await client.post(url, {
+            "user": user_id, "filetype": UploadedFile.FILE_TYPES[0][0],
+            "filelocation": SimpleUploadedFile(f"cv-{index}.pdf", _pdf(index), content_type="application/pdf"),
+        })
+        assert response.status_code == 302, response.status_code
+
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        await asyncio.gather(*(upload() for _ in range(concurrent)))
+    return concurrent * ROUNDS / (time.perf_counter() - started)
+
+
+async def main(user) -> None:
+    client = AsyncClient()
+    await client.aforce_login(user)
+    counter = itertools.count()
+
+    print(f"{'concurrent':>10} {'sync rps':>10} {'async rps':>10}")
+    for concurrent in CONCURRENCY:
+        sync_rps = await _rps(client, "/bench/sync-upload", user.id, concurrent, counter)
+        async_rps = await _rps(client, "/upload", user.id, concurrent, counter)
+        print(f"{concurrent:>10} {sync_rps:>10.1f} {async_rps:>10.1f}")
+
+    stored = await UploadedFile.objects.acount()
+    print(f"uploads stored: {stored} of {next(counter)}")
+
+
+if __name__ == "__main__":
+    call_command("migrate", verbosity=0)
+    aws_boto3_agent._agent = FakeAgent()
+    asyncio.run(main(get_user_model().objects.create_user(username="bench", password="bench-password")))
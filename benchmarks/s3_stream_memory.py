@@ -0,0 +1,85 @@
+"""
+Peak memory of reading an S3 object: get_object_from_s3 (whole body) vs get_object_stream (chunks).
+
+The fake client hands out a botocore StreamingBody over a lazily generated
+payload, so the object itself never sits in memory and only the reader's
+buffering is measured.
+
+    python -m benchmarks.s3_stream_memory
+"""
+import hashlib
+import tracemalloc
+from unittest import mock
+
+from botocore.response import StreamingBody
+
+from helper.aws_boto3_agent import S3Agent, MB
+
+SIZES_MB = (1, 8, 32, 128)
+
+
+class LazyPayload:
+    def __init__(self, size: int) -> None:
+        self.remaining = size
+
+    def read(self, amt=None) -> bytes:
+        amt = self.remaining if amt is None else min(amt, self.remaining)
+        self.remaining -= amt
+        return b"x" * amt
+
+    def close(self) -> None:
+        pass
+
+
+class FakeS3Client:
+    class exceptions:
+        NoSuchKey = KeyError
+
+    def __init__(self) -> None:
+        self.size = 0
+
+    def head_bucket(self, Bucket):
+        return {}
+
+    def get_object(self, Bucket, Key, Range=None):
+        return {
+            "Body": StreamingBody(LazyPayload(self.size), self.size),
+            "ContentLength": self.size,
+            "ContentType": "application/pdf",
+        }
+
+
+def _peak(fn) -> int:
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main() -> None:
+    client = FakeS3Client()
+    with mock.patch("helper.aws_boto3_agent.boto3.client", return_value=client):
+        agent = S3Agent(boto3_config=None, bucket_name="bench-bucket", region="eu-central-1")
+
+    def full_read():
+        hashlib.sha256(agent.get_object_from_s3("bench/key.pdf")).hexdigest()
+
+    def streamed_read():
+        chunks, _ = agent.get_object_stream("bench/key.pdf")
+        digest = hashlib.sha256()
+        for chunk in chunks:
+            digest.update(chunk)
+        digest.hexdigest()
+
+    print(f"{'size':>8} {'full read peak':>16} {'streamed peak':>15}")
+    for size_mb in SIZES_MB:
+        client.size = size_mb * MB
+        full = _peak(full_read)
+        streamed = _peak(streamed_read)
+        print(f"{size_mb:>6}MB {full / MB:>14.2f}MB {streamed / MB:>13.2f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Peak memory of S3Agent.upload_fileobj_to_s3: buffered copy vs streaming.
+
+Runs against an in-process fake S3 client that drains the stream the way
+boto3 does (multipart_chunksize reads), so no AWS access is needed.
+
+    python -m benchmarks.s3_upload_memory
+"""
+import io
+import tempfile
+import tracemalloc
+from unittest import mock
+
+from boto3.s3.transfer import TransferConfig
+from django.core.files.uploadedfile import InMemoryUploadedFile
+
+from helper.aws_boto3_agent import S3Agent, MB
+
+SIZES_MB = (1, 8, 32, 64)
+
+
+class FakeS3Client:
+    def head_bucket(self, Bucket):
+        return {}
+
+    def upload_fileobj(self, fileobj, bucket, key, Config=None):
+        chunk = (Config or TransferConfig()).multipart_chunksize
+        while fileobj.read(chunk):
+            pass
+
+
+def _in_memory_upload(payload: bytes) -> InMemoryUploadedFile:
+    # Built the way MemoryFileUploadHandler builds it, chunk by chunk; a BytesIO(payload) would hand
+    # the payload object itself back from read() and hide the copy the buffered path makes
+    buffer = io.BytesIO()
+    for start in range(0, len(payload), 64 * 1024):
+        buffer.write(payload[start:start + 64 * 1024])
+    return InMemoryUploadedFile(buffer, "filelocation", "cv.pdf", "application/pdf", len(payload), None)
+
+
+def _peak_upload(agent: S3Agent, file_obj, streaming: bool) -> int:
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    agent.upload_fileobj_to_s3(file_obj, "bench/key.pdf", streaming=streaming)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main() -> None:
+    with mock.patch("helper.aws_boto3_agent.boto3.client", return_value=FakeS3Client()):
+        agent = S3Agent(boto3_config=None, bucket_name="bench-bucket", region="eu-central-1",
+                        transfer_config=TransferConfig(multipart_chunksize=8 * MB))
+
+    print(f"{'size':>8} {'source':>10} {'buffered peak':>15} {'streaming peak':>15}")
+    for size_mb in SIZES_MB:
+        payload = b"%PDF-" + b"x" * (size_mb * MB - 5)
+
+        in_memory = _in_memory_upload(payload)
+        buffered = _peak_upload(agent, in_memory, streaming=False)
+        streamed = _peak_upload(agent, in_memory, streaming=True)
+        print(f"{size_mb:>6}MB {'memory':>10} {buffered / MB:>13.1f}MB {streamed / MB:>13.1f}MB")
+
+        with tempfile.TemporaryFile() as on_disk:
+            on_disk.write(payload)
+            buffered = _peak_upload(agent, on_disk, streaming=False)
+            streamed = _peak_upload(agent, on_disk, streaming=True)
+        print(f"{size_mb:>6}MB {'tempfile':>10} {buffered / MB:>13.1f}MB {streamed / MB:>13.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+CPU time and bytes read per upload: old multi-pass pipeline vs the inspecting upload handlers.
+
+Old: Django's default handlers, then a 1 KB read for the MIME sniff, a full read
+for SHA-256 and a full read into BytesIO for the S3 upload.
+New: InspectingMemory/TemporaryFileUploadHandler hash and sniff while parsing,
+then the S3 upload streams the file once.
+
+    python -m benchmarks.upload_pipeline
+"""
+import hashlib
+import io
+import time
+
+from django.conf import settings
+
+settings.configure()
+
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler  # noqa: E402
+from django.http.multipartparser import MultiPartParser  # noqa: E402
+
+from home_app import upload_handlers  # noqa: E402
+
+MB = 1024 * 1024
+SIZES_MB = (1, 8, 32)
+BOUNDARY = "benchmarkboundary"
+UPLOAD_CHUNK = 8 * MB
+
+
+class CountingFile:
+    def __init__(self, wrapped) -> None:
+        self._wrapped = wrapped
+        self.bytes_read = 0
+
+    def read(self, *args):
+        data = self._wrapped.read(*args)
+        self.bytes_read += len(data)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+
+def _multipart_body(payload: bytes) -> bytes:
+    return (
+        f"--{BOUNDARY}\r\n"
+        'Content-Disposition: form-data; name="filelocation"; filename="cv.pdf"\r\n'
+        "Content-Type: application/pdf\r\n\r\n"
+    ).encode() + payload + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def _parse(body: bytes, handlers):
+    meta = {"CONTENT_TYPE": f"multipart/form-data; boundary={BOUNDARY}", "CONTENT_LENGTH": str(len(body))}
+    _, files = MultiPartParser(meta, io.BytesIO(body), handlers).parse()
+    uploaded = files["filelocation"]
+    uploaded.file = CountingFile(uploaded.file)
+    return uploaded
+
+
+def _drain(file_obj) -> None:
+    while file_obj.read(UPLOAD_CHUNK):
+        pass
+
+
+def old_pipeline(body: bytes):
+    uploaded = _parse(body, [MemoryFileUploadHandler(), TemporaryFileUploadHandler()])
+    uploaded.seek(0)
+    uploaded.read(1024)
+    uploaded.seek(0)
+    hashlib.sha256(uploaded.read()).hexdigest()
+    uploaded.seek(0)
+    _drain(io.BytesIO(uploaded.read()))
+    return uploaded
+
+
+def new_pipeline(body: bytes):
+    uploaded = _parse(body, [upload_handlers.InspectingMemoryFileUploadHandler(),
+                             upload_handlers.InspectingTemporaryFileUploadHandler()])
+    assert uploaded.sha256 and uploaded.detected_mime == "application/pdf"
+    uploaded.seek(0)
+    _drain(uploaded)
+    return uploaded
+
+
+def _measure(pipeline, body: bytes):
+    started = time.process_time()
+    uploaded = pipeline(body)
+    cpu = time.process_time() - started
+    return cpu, uploaded.file.bytes_read
+
+
+def main() -> None:
+    # Measure throughput, not the size limit
+    upload_handlers.MAX_UPLOAD_BYTES = 0
+    print(f"{'size':>8} {'old cpu':>10} {'old read':>10} {'new cpu':>10} {'new read':>10}")
+    for size_mb in SIZES_MB:
+        body = _multipart_body(b"%PDF-" + b"x" * (size_mb * MB - 5))
+        old_cpu, old_read = _measure(old_pipeline, body)
+        new_cpu, new_read = _measure(new_pipeline, body)
+        print(f"{size_mb:>6}MB {old_cpu * 1000:>8.1f}ms {old_read / MB:>8.1f}MB "
+              f"{new_cpu * 1000:>8.1f}ms {new_read / MB:>8.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -150,4 +150,10 @@ SIMPLE_JWT = {
     #"TOKEN_OBTAIN_SERIALIZER": "accounts_app.serializers.MyTokenObtainPairSerializer",
     }
 
-MEDIA_ROOT='media/'
\ No newline at end of file
+MEDIA_ROOT='media/'
+
+# Hash, sniff and size-check uploads while they stream in (see home_app/upload_handlers.py)
+FILE_UPLOAD_HANDLERS = [
+    'home_app.upload_handlers.InspectingMemoryFileUploadHandler',
+    'home_app.upload_handlers.InspectingTemporaryFileUploadHandler',
+]
\ No newline at end of file
@@ -1,26 +1,104 @@
+import hashlib
 import io
+import os
+import threading
+import time
+import unicodedata
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
 
 from botocore.exceptions import ClientError
-from typing import Dict, Optional, Tuple
-from json import dumps, loads, JSONDecodeError
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote
 
 from helper.logger_setup import setup_logger
+from helper.sqs_envelope import SQSEnvelopeCodec
+from helper.bedrock_discovery import ModelDiscoveryCache
+from helper.bedrock_streaming import BedrockStream
+from helper.bedrock_batch import THROTTLE_CODES, TokenBucketPacer, is_throttle, run_batch
+from helper.bedrock_cache import ResponseCache, response_cache_key
+from helper.bedrock_usage import get_usage_aggregator
+from helper.bedrock_routing import ModelRouter, is_failover_error, parse_routes
 from config.configuration import ConfigurationCenter
 
 logger = setup_logger("helper")
 
+MB = 1024 * 1024
+# First wait after a failed background model refresh
+REFRESH_RETRY_SECONDS = 60
+
+
+def _is_no_such_bucket(exc: Exception) -> bool:
+    if isinstance(exc, ClientError):
+        return exc.response.get("Error", {}).get("Code") == "NoSuchBucket"
+    # s3transfer wraps the ClientError in S3UploadFailedError and only keeps its message
+    return "NoSuchBucket" in str(exc)
+
+
+def _config_bool(value: Optional[str], default: bool) -> bool:
+    if value is None or value == "":
+        return default
+    return str(value).strip().lower() in ("1", "true", "yes", "on")
+
+
+def _config_int(value: Optional[str], default: int) -> int:
+    try:
+        return int(value) if value not in (None, "") else default
+    except (TypeError, ValueError):
+        logger.error("config.invalid_int value=%s default=%s", value, default)
+        return default
+
+
+def attachment_disposition(filename: str) -> str:
+    """RFC 6266 Content-Disposition: a sanitised ASCII filename for old clients plus the exact name as filename*."""
+    fallback = unicodedata.normalize("NFKD", filename).encode("ascii", "ignore").decode("ascii")
+    fallback = "".join(char if char.isprintable() and char not in '"\\;' else "_" for char in fallback).strip()
+    stem, dot, extension = fallback.rpartition(".")
+    if not (stem if dot else fallback).strip(" ._"):
+        # Nothing of the name survived, e.g. a name written only in CJK characters
+        fallback = f"download.{extension}" if dot else "download"
+    return f'attachment; filename="{fallback}"; filename*=UTF-8\'\'{quote(filename, safe="")}'
+
+
+def load_transfer_config(cfg: ConfigurationCenter) -> TransferConfig:
+    """Build the boto3 TransferConfig from the [s3_configuration] section of config.ini."""
+    return TransferConfig(
+        multipart_threshold=_config_int(cfg.get_parameter("s3_configuration", "multipart_threshold_mb"), 8) * MB,
+        multipart_chunksize=_config_int(cfg.get_parameter("s3_configuration", "multipart_chunksize_mb"), 8) * MB,
+        max_concurrency=_config_int(cfg.get_parameter("s3_configuration", "max_concurrency"), 4),
+        use_threads=_config_bool(cfg.get_parameter("s3_configuration", "use_threads"), True),
+    )
+
 # -------------------------
 # S3 responsibilities only
 # -------------------------
 class S3Agent:
-    def __init__(self, boto3_config:Config, bucket_name: str,region:str=None) -> None:
+    # Per-process bucket state shared by every S3Agent: bucket -> monotonic expiry of the last good check
+    _bucket_cache: Dict[str, float] = {}
+    _bucket_cache_lock = threading.Lock()
+    _bucket_cache_stats = {"hits": 0, "misses": 0, "head_calls": 0, "invalidations": 0, "rechecks": 0}
+
+    def __init__(self, boto3_config:Config, bucket_name: str,region:str=None,
+                 transfer_config: Optional[TransferConfig] = None, streaming: bool = True,
+                 bucket_cache_ttl: int = 300, presigned_get_expires: int = 300,
+                 presigned_get_refresh_margin: int = 60, stream_chunk_size: int = 64 * 1024) -> None:
         self.bucket_name = bucket_name
+        # 0 disables the cache and restores one head_bucket per operation
+        self.bucket_cache_ttl = bucket_cache_ttl
         if region is None:
             logger.error("config.region_missing")
             raise ValueError("AWS region missing.")
         self.region = region
+        self.transfer_config = transfer_config or TransferConfig()
+        # streaming=True hands the Django file straight to boto3, False keeps the old in-memory copy
+        self.streaming = streaming
+        self.stream_chunk_size = stream_chunk_size
+        self.presigned_get_expires = presigned_get_expires
+        self.presigned_get_refresh_margin = min(presigned_get_refresh_margin, presigned_get_expires // 2)
+        # (bucket, key, filename) -> (url, monotonic time after which we sign again)
+        self._presigned_get_cache: Dict[Tuple[str, str, Optional[str]], Tuple[str, float]] = {}
+        self._presigned_get_lock = threading.Lock()
         try:
             self.s3 = boto3.client("s3", config=boto3_config)
         except Exception as e:
@@ -29,7 +107,58 @@ class S3Agent:
 
     def _ensure_bucket_exists(self, bucket_name: Optional[str] = None) -> bool:
         bucket = bucket_name or self.bucket_name
+        cls = type(self)
 
+        with cls._bucket_cache_lock:
+            expires_at = cls._bucket_cache.get(bucket)
+            if expires_at is not None and expires_at > time.monotonic():
+                cls._bucket_cache_stats["hits"] += 1
+                return True
+            cls._bucket_cache_stats["misses"] += 1
+
+        available = self._check_bucket(bucket)
+        if available and self.bucket_cache_ttl > 0:
+            with cls._bucket_cache_lock:
+                cls._bucket_cache[bucket] = time.monotonic() + self.bucket_cache_ttl
+        return available
+
+    @classmethod
+    def invalidate_bucket_cache(cls, bucket_name: Optional[str] = None) -> None:
+        """Forget the cached state of one bucket, or of all buckets when no name is given."""
+        with cls._bucket_cache_lock:
+            if bucket_name is None:
+                cls._bucket_cache.clear()
+            else:
+                cls._bucket_cache.pop(bucket_name, None)
+            cls._bucket_cache_stats["invalidations"] += 1
+        logger.info("s3.bucket_cache_invalidated bucket=%s", bucket_name or "*")
+
+    @classmethod
+    def get_bucket_cache_stats(cls) -> Dict[str, int]:
+        """Counters of the bucket cache; every hit is a head_bucket round-trip saved."""
+        with cls._bucket_cache_lock:
+            stats = dict(cls._bucket_cache_stats)
+        stats["round_trips_saved"] = stats["hits"]
+        return stats
+
+    def _call_with_bucket_recheck(self, bucket: str, operation):
+        """Run operation(); if S3 says the bucket is gone, drop the cached state, re-check and retry once."""
+        try:
+            return operation()
+        except Exception as e:
+            if not _is_no_such_bucket(e):
+                raise
+            logger.warning("s3.no_such_bucket_rechecking bucket=%s", bucket)
+            self.invalidate_bucket_cache(bucket)
+            with type(self)._bucket_cache_lock:
+                type(self)._bucket_cache_stats["rechecks"] += 1
+            if not self._ensure_bucket_exists(bucket):
+                raise
+            return operation()
+
+    def _check_bucket(self, bucket: str) -> bool:
+        with type(self)._bucket_cache_lock:
+            type(self)._bucket_cache_stats["head_calls"] += 1
         try:
             self.s3.head_bucket(Bucket=bucket)
             logger.info("s3.bucket_exists bucket=%s", bucket)
@@ -63,16 +192,26 @@ class S3Agent:
             return False
 
     # keep interface: upload_fileobj_to_s3(file_obj, object_name, bucket=None) -> bool
-    def upload_fileobj_to_s3(self, file_obj, object_name: str, bucket: Optional[str] = None) -> bool:
+    def upload_fileobj_to_s3(self, file_obj, object_name: str, bucket: Optional[str] = None,
+                             streaming: Optional[bool] = None) -> bool:
         bucket = bucket or self.bucket_name
+        streaming = self.streaming if streaming is None else streaming
         if not self._ensure_bucket_exists(bucket):
             logger.error("s3.upload_abort_bucket_unavailable bucket=%s key=%s", bucket, object_name)
             return False
-        try:
+
+        def _upload():
             file_obj.seek(0)
-            file_like = io.BytesIO(file_obj.read())
-            self.s3.upload_fileobj(file_like, bucket, object_name)
-            logger.info("s3.upload_ok bucket=%s key=%s", bucket, object_name)
+            if streaming:
+                # Django's InMemoryUploadedFile/TemporaryUploadedFile are file-like, boto3 reads them in parts
+                file_like = file_obj
+            else:
+                file_like = io.BytesIO(file_obj.read())
+            self.s3.upload_fileobj(file_like, bucket, object_name, Config=self.transfer_config)
+
+        try:
+            self._call_with_bucket_recheck(bucket, _upload)
+            logger.info("s3.upload_ok bucket=%s key=%s streaming=%s", bucket, object_name, streaming)
             file_obj.seek(0)
             return True
         except Exception:
@@ -85,13 +224,138 @@ class S3Agent:
             logger.error(f"Cannot proceed with deletion - bucket {bucket} is not available")
             return False
         try:
-            self.s3.delete_object(Bucket=bucket, Key =file_key)
+            self._call_with_bucket_recheck(bucket, lambda: self.s3.delete_object(Bucket=bucket, Key=file_key))
+            self._forget_presigned_downloads(bucket, file_key)
             logger.info(f"Successfully deleted {file_key} from {bucket}")
             return True
         except Exception as e:
             logger.error(f"Error deleted {file_key} from {bucket} on S3: {e}")
             return False
 
+    def copy_object_in_s3(self, source_key: str, object_name: str, bucket: Optional[str] = None) -> bool:
+        """Server-side copy inside the bucket; no bytes pass through this process."""
+        bucket = bucket or self.bucket_name
+        if not self._ensure_bucket_exists(bucket):
+            logger.error("s3.copy_abort_bucket_unavailable bucket=%s key=%s", bucket, object_name)
+            return False
+        try:
+            self._call_with_bucket_recheck(bucket, lambda: self.s3.copy_object(
+                Bucket=bucket, Key=object_name, CopySource={"Bucket": bucket, "Key": source_key},
+            ))
+            logger.info("s3.copy_ok bucket=%s source=%s key=%s", bucket, source_key, object_name)
+            return True
+        except Exception:
+            logger.exception("s3.copy_failed bucket=%s source=%s key=%s", bucket, source_key, object_name)
+            return False
+
+    def delete_objects_from_s3(self, file_keys: List[str], bucket: Optional[str] = None) -> Dict[str, Optional[str]]:
+        """
+        Delete many objects with delete_objects, up to 1000 keys per request.
+        Returns key -> None when S3 confirmed the delete, or an error message for that key.
+        """
+        bucket = bucket or self.bucket_name
+        if not file_keys:
+            return {}
+        if not self._ensure_bucket_exists(bucket):
+            logger.error("s3.bulk_delete_abort_bucket_unavailable bucket=%s keys=%s", bucket, len(file_keys))
+            return {key: "Storage bucket unavailable" for key in file_keys}
+
+        results: Dict[str, Optional[str]] = {}
+        for start in range(0, len(file_keys), 1000):
+            batch = file_keys[start:start + 1000]
+            delete_request = {"Objects": [{"Key": key} for key in batch], "Quiet": False}
+            try:
+                resp = self._call_with_bucket_recheck(bucket, lambda: self.s3.delete_objects(Bucket=bucket, Delete=delete_request))
+            except Exception:
+                logger.exception("s3.bulk_delete_failed bucket=%s batch_size=%s", bucket, len(batch))
+                results.update({key: "Delete request failed" for key in batch})
+                continue
+
+            for deleted in resp.get("Deleted", []):
+                results[deleted["Key"]] = None
+                self._forget_presigned_downloads(bucket, deleted["Key"])
+            for error in resp.get("Errors", []):
+                results[error["Key"]] = error.get("Message") or error.get("Code") or "Delete failed"
+                logger.error("s3.bulk_delete_key_failed bucket=%s key=%s code=%s", bucket, error["Key"], error.get("Code"))
+            for key in batch:
+                results.setdefault(key, "No confirmation from storage")
+
+        logger.info("s3.bulk_delete_done bucket=%s requested=%s deleted=%s", bucket, len(file_keys),
+                    sum(1 for error in results.values() if error is None))
+        return results
+
+    def generate_presigned_upload(self, object_name: str, max_bytes: int, content_type: str = "application/pdf",
+                                  expires_in: int = 300, bucket: Optional[str] = None) -> Optional[Dict]:
+        """Presigned POST letting the browser upload one object directly, limited in size and content type."""
+        bucket = bucket or self.bucket_name
+        if not self._ensure_bucket_exists(bucket):
+            logger.error("s3.presign_post_abort_bucket_unavailable bucket=%s key=%s", bucket, object_name)
+            return None
+        try:
+            presigned = self.s3.generate_presigned_post(
+                Bucket=bucket,
+                Key=object_name,
+                Fields={"Content-Type": content_type},
+                Conditions=[
+                    {"Content-Type": content_type},
+                    ["content-length-range", 1, max_bytes],
+                ],
+                ExpiresIn=expires_in,
+            )
+            logger.info("s3.presign_post_ok bucket=%s key=%s max_bytes=%s", bucket, object_name, max_bytes)
+            return presigned
+        except Exception:
+            logger.exception("s3.presign_post_failed bucket=%s key=%s", bucket, object_name)
+            return None
+
+    def generate_presigned_download(self, object_name: str, filename: Optional[str] = None,
+                                    bucket: Optional[str] = None) -> Optional[str]:
+        """Short-lived presigned GET URL (S3 serves Range requests on it), reused until shortly before it expires."""
+        bucket = bucket or self.bucket_name
+        cache_key = (bucket, object_name, filename)
+        now = time.monotonic()
+        with self._presigned_get_lock:
+            cached = self._presigned_get_cache.get(cache_key)
+            if cached and cached[1] > now:
+                return cached[0]
+
+        params = {"Bucket": bucket, "Key": object_name}
+        if filename:
+            params["ResponseContentDisposition"] = attachment_disposition(filename)
+        try:
+            url = self.s3.generate_presigned_url("get_object", Params=params, ExpiresIn=self.presigned_get_expires)
+        except Exception:
+            logger.exception("s3.presign_get_failed bucket=%s key=%s", bucket, object_name)
+            return None
+
+        with self._presigned_get_lock:
+            if len(self._presigned_get_cache) >= 1024:
+                self._presigned_get_cache = {k: v for k, v in self._presigned_get_cache.items() if v[1] > now}
+            self._presigned_get_cache[cache_key] = (url, now + self.presigned_get_expires - self.presigned_get_refresh_margin)
+        logger.info("s3.presign_get_ok bucket=%s key=%s", bucket, object_name)
+        return url
+
+    def _forget_presigned_downloads(self, bucket: str, object_name: str) -> None:
+        with self._presigned_get_lock:
+            for cache_key in [k for k in self._presigned_get_cache if k[0] == bucket and k[1] == object_name]:
+                del self._presigned_get_cache[cache_key]
+
+    def head_object_in_s3(self, object_name: str, bucket: Optional[str] = None) -> Optional[Dict]:
+        """Object metadata (ContentLength, ContentType, ...) or None when the object does not exist."""
+        bucket = bucket or self.bucket_name
+        try:
+            return self._call_with_bucket_recheck(bucket, lambda: self.s3.head_object(Bucket=bucket, Key=object_name))
+        except ClientError as e:
+            code = e.response.get("Error", {}).get("Code", "")
+            if code in ("404", "NoSuchKey", "NotFound"):
+                logger.info("s3.head_no_such_key bucket=%s key=%s", bucket, object_name)
+            else:
+                logger.exception("s3.head_failed bucket=%s key=%s", bucket, object_name)
+            return None
+        except Exception:
+            logger.exception("s3.head_failed bucket=%s key=%s", bucket, object_name)
+            return None
+
     # keep interface: get_object_from_s3(object_name, bucket=None) -> Optional[bytes]
     def get_object_from_s3(self, object_name: str, bucket: Optional[str] = None) -> Optional[bytes]:
         bucket = bucket or self.bucket_name
@@ -100,7 +364,7 @@ class S3Agent:
             return None
 
         try:
-            resp = self.s3.get_object(Bucket=bucket, Key=object_name)
+            resp = self._call_with_bucket_recheck(bucket, lambda: self.s3.get_object(Bucket=bucket, Key=object_name))
             blob = resp["Body"].read()
             logger.info("s3.get_ok bucket=%s key=%s size=%s", bucket, object_name, len(blob))
             return blob
@@ -112,12 +376,68 @@ class S3Agent:
             return None
 
 
+    def get_object_stream(self, object_name: str, bucket: Optional[str] = None, chunk_size: Optional[int] = None,
+                          byte_range: Optional[Tuple[int, Optional[int]]] = None) -> Optional[Tuple[Iterator[bytes], Dict]]:
+        """
+        Open an object for reading in fixed-size chunks, so memory stays flat whatever the object size.
+        byte_range is (start, end) with an inclusive end, None meaning "to the end of the object".
+        Returns (chunk_iterator, info) where info has content_length, content_type and content_range,
+        or None when the object cannot be read. The iterator closes the S3 body when exhausted.
+        """
+        bucket = bucket or self.bucket_name
+        chunk_size = chunk_size or self.stream_chunk_size
+        if not self._ensure_bucket_exists(bucket):
+            logger.error("s3.stream_abort_bucket_unavailable bucket=%s key=%s", bucket, object_name)
+            return None
+
+        params = {"Bucket": bucket, "Key": object_name}
+        if byte_range is not None:
+            start, end = byte_range
+            params["Range"] = f"bytes={start}-{'' if end is None else end}"
+        try:
+            resp = self._call_with_bucket_recheck(bucket, lambda: self.s3.get_object(**params))
+        except self.s3.exceptions.NoSuchKey:
+            logger.error("s3.stream_no_such_key bucket=%s key=%s", bucket, object_name)
+            return None
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") == "InvalidRange":
+                logger.info("s3.stream_invalid_range bucket=%s key=%s range=%s", bucket, object_name, params.get("Range"))
+            else:
+                logger.exception("s3.stream_failed bucket=%s key=%s", bucket, object_name)
+            return None
+        except Exception:
+            logger.exception("s3.stream_failed bucket=%s key=%s", bucket, object_name)
+            return None
+
+        info = {
+            "content_length": resp.get("ContentLength"),
+            "content_type": resp.get("ContentType"),
+            "content_range": resp.get("ContentRange"),
+        }
+        logger.info("s3.stream_open bucket=%s key=%s range=%s length=%s", bucket, object_name, params.get("Range"), info["content_length"])
+        return self._iter_body(resp["Body"], chunk_size), info
+
+    @staticmethod
+    def _iter_body(body, chunk_size: int) -> Iterator[bytes]:
+        try:
+            for chunk in body.iter_chunks(chunk_size):
+                yield chunk
+        finally:
+            body.close()
+
+
 # --------------------------
 # SQS responsibilities only
 # --------------------------
 class SQSAgent:
-    def __init__(self, boto3_config:Config, queue_name: str,region:str=None) -> None:
+    def __init__(self, boto3_config:Config, queue_name: str,region:str=None, delay_seconds: int = 3,
+                 visibility_timeout: int = 30, codec: Optional[SQSEnvelopeCodec] = None) -> None:
         self.queue_name = queue_name
+        self.codec = codec or SQSEnvelopeCodec()
+        # FIFO queues deliver one message at a time per MessageGroupId, which is what fair-share scheduling builds on
+        self.is_fifo = queue_name.endswith(".fifo")
+        self.delay_seconds = delay_seconds
+        self.visibility_timeout = visibility_timeout
         if region is None:
             logger.error("config.region_missing")
             raise ValueError("AWS region missing.")
@@ -136,10 +456,10 @@ class SQSAgent:
 
     def _create_queue(self) -> Optional[str]:
         try:
-            resp = self.sqs.create_queue(
-                QueueName=self.queue_name,
-                tags={"source": "Created_by_Boto3_Agent"},
-            )
+            params = {"QueueName": self.queue_name, "tags": {"source": "Created_by_Boto3_Agent"}}
+            if self.is_fifo:
+                params["Attributes"] = {"FifoQueue": "true"}
+            resp = self.sqs.create_queue(**params)
             url = resp.get("QueueUrl")
             if url:
                 logger.info("sqs.queue_created queue_name=%s url=%s", self.queue_name, url)
@@ -161,18 +481,32 @@ class SQSAgent:
             logger.exception("sqs.get_queue_url_failed queue_name=%s", self.queue_name)
             return None
 
+    def encode_message_body(self, message_content: Dict) -> str:
+        return self.codec.encode(message_content)
+
+    def _message_options(self, body: str, delay_seconds: Optional[int], message_group_id: Optional[str],
+                         deduplication_id: Optional[str]) -> Dict:
+        if not self.is_fifo:
+            return {"DelaySeconds": self.delay_seconds if delay_seconds is None else delay_seconds}
+        # FIFO queues only support a queue-level delay; they need a group and a deduplication id instead
+        return {
+            "MessageGroupId": message_group_id or "default",
+            "MessageDeduplicationId": deduplication_id or hashlib.sha256(body.encode("utf-8")).hexdigest(),
+        }
+
     # keep interface: send_sqs_message(message_content: Dict) -> Optional[str]
-    def send_sqs_message(self, message_content: Dict) -> Optional[str]:
+    def send_sqs_message(self, message_content: Dict, delay_seconds: Optional[int] = None,
+                         message_group_id: Optional[str] = None, deduplication_id: Optional[str] = None) -> Optional[str]:
         try:
-            body = dumps(message_content, ensure_ascii=False, separators=(",", ":"))
+            body = self.encode_message_body(message_content)
             resp = self.sqs.send_message(
                 QueueUrl=self.queue_url,
                 MessageBody=body,
-                DelaySeconds=3,
+                **self._message_options(body, delay_seconds, message_group_id, deduplication_id),
             )
             message_id = resp.get("MessageId")
             if message_id:
-                logger.info("sqs.send_ok queue_url=%s message_id=%s", self.queue_url, message_id)
+                logger.info("sqs.send_ok queue_url=%s message_id=%s group=%s", self.queue_url, message_id, message_group_id)
                 return message_id
             logger.error("sqs.send_missing_message_id queue_url=%s", self.queue_url)
             return None
@@ -180,13 +514,39 @@ class SQSAgent:
             logger.exception("sqs.send_failed queue_url=%s", self.queue_url)
             return None
 
+    def build_batch_entry(self, entry_id: str, message_content: Dict, delay_seconds: Optional[int] = None,
+                          attributes: Optional[Dict[str, str]] = None, message_group_id: Optional[str] = None,
+                          deduplication_id: Optional[str] = None) -> Dict:
+        """One send_message_batch entry, encoded the same way send_sqs_message encodes its body."""
+        body = self.encode_message_body(message_content)
+        entry = {"Id": entry_id, "MessageBody": body}
+        entry.update(self._message_options(body, delay_seconds, message_group_id, deduplication_id))
+        if attributes:
+            entry["MessageAttributes"] = {name: {"DataType": "String", "StringValue": value} for name, value in attributes.items()}
+        return entry
+
+    def send_sqs_message_batch(self, entries: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+        """
+        One send_message_batch call for up to 10 prepared entries (Id, MessageBody, DelaySeconds, ...).
+        Returns (successful, failed) as reported by SQS; a failed call reports every entry as failed.
+        """
+        try:
+            resp = self.sqs.send_message_batch(QueueUrl=self.queue_url, Entries=entries)
+        except Exception as e:
+            logger.exception("sqs.send_batch_failed queue_url=%s entries=%s", self.queue_url, len(entries))
+            return [], [{"Id": entry["Id"], "SenderFault": False, "Code": type(e).__name__, "Message": str(e)} for entry in entries]
+        successful = resp.get("Successful", []) or []
+        failed = resp.get("Failed", []) or []
+        logger.info("sqs.send_batch_done queue_url=%s ok=%s failed=%s", self.queue_url, len(successful), len(failed))
+        return successful, failed
+
     # keep interface: receive_sqs_message() -> Tuple[Optional[str], Optional[Dict]]
     def receive_sqs_message(self) -> Tuple[Optional[str], Optional[Dict]]:
         try:
             resp = self.sqs.receive_message(
                 QueueUrl=self.queue_url,
                 MaxNumberOfMessages=1,
-                VisibilityTimeout=30,
+                VisibilityTimeout=self.visibility_timeout,
             )
             messages = resp.get("Messages", [])
 
@@ -202,10 +562,8 @@ class SQSAgent:
                 logger.error("sqs.receive_missing_fields queue_url=%s", self.queue_url)
                 return None, None
 
-            try:
-                body = loads(body_raw)
-            except (TypeError, JSONDecodeError):
-                logger.exception("sqs.receive_json_decode_failed queue_url=%s body_preview=%s", self.queue_url, str(body_raw)[:200])
+            body = self.decode_message_body(body_raw)
+            if body is None:
                 # Return receipt so the caller can delete/skip if desired
                 return receipt, None
 
@@ -216,6 +574,91 @@ class SQSAgent:
             logger.exception("sqs.receive_failed queue_url=%s", self.queue_url)
             return None, None
 
+    def decode_message_body(self, body_raw: str) -> Optional[Dict]:
+        # Enveloped, compressed, claim-check and bare JSON bodies all come back as the original dict
+        _, body = self.codec.decode(body_raw)
+        if body is None:
+            logger.error("sqs.receive_decode_failed queue_url=%s", self.queue_url)
+        return body
+
+    def receive_sqs_messages(self, max_messages: int = 10, wait_time_seconds: int = 20,
+                             visibility_timeout: Optional[int] = None) -> List[Dict]:
+        """
+        Long-poll for up to max_messages (max 10). Each item has receipt, message_id, body (decoded, or None
+        when the body cannot be decoded), schema_version and receive_count. Returns [] on an empty receive or an error.
+        """
+        try:
+            resp = self.sqs.receive_message(
+                QueueUrl=self.queue_url,
+                MaxNumberOfMessages=min(max_messages, 10),
+                WaitTimeSeconds=wait_time_seconds,
+                VisibilityTimeout=self.visibility_timeout if visibility_timeout is None else visibility_timeout,
+                AttributeNames=["ApproximateReceiveCount"],
+            )
+        except Exception:
+            logger.exception("sqs.receive_batch_failed queue_url=%s", self.queue_url)
+            return []
+
+        received = []
+        for msg in resp.get("Messages", []) or []:
+            receipt = msg.get("ReceiptHandle")
+            if not receipt or msg.get("Body") is None:
+                logger.error("sqs.receive_missing_fields queue_url=%s", self.queue_url)
+                continue
+            schema_version, body = self.codec.decode(msg["Body"])
+            received.append({
+                "receipt": receipt,
+                "message_id": msg.get("MessageId"),
+                "body": body,
+                "schema_version": schema_version,
+                "receive_count": int((msg.get("Attributes") or {}).get("ApproximateReceiveCount", 1)),
+            })
+        logger.info("sqs.receive_batch_ok queue_url=%s count=%s", self.queue_url, len(received))
+        return received
+
+    def delete_sqs_message_batch(self, receipts: List[str]) -> Tuple[List[str], List[str]]:
+        """delete_message_batch for up to 10 receipts; returns (deleted, failed) receipts."""
+        entries = [{"Id": str(index), "ReceiptHandle": receipt} for index, receipt in enumerate(receipts)]
+        try:
+            resp = self.sqs.delete_message_batch(QueueUrl=self.queue_url, Entries=entries)
+        except Exception:
+            logger.exception("sqs.delete_batch_failed queue_url=%s entries=%s", self.queue_url, len(entries))
+            return [], list(receipts)
+        deleted = [receipts[int(entry["Id"])] for entry in resp.get("Successful", []) or []]
+        failed = [receipts[int(entry["Id"])] for entry in resp.get("Failed", []) or []]
+        if failed:
+            logger.error("sqs.delete_batch_partial queue_url=%s failed=%s", self.queue_url, len(failed))
+        return deleted, failed
+
+    def change_visibility_batch(self, receipts: List[str], visibility_timeout: int) -> Tuple[List[str], List[str]]:
+        """change_message_visibility_batch for up to 10 receipts; returns (extended, failed) receipts."""
+        entries = [{"Id": str(index), "ReceiptHandle": receipt, "VisibilityTimeout": visibility_timeout}
+                   for index, receipt in enumerate(receipts)]
+        try:
+            resp = self.sqs.change_message_visibility_batch(QueueUrl=self.queue_url, Entries=entries)
+        except Exception:
+            logger.exception("sqs.visibility_batch_failed queue_url=%s entries=%s", self.queue_url, len(entries))
+            return [], list(receipts)
+        extended = [receipts[int(entry["Id"])] for entry in resp.get("Successful", []) or []]
+        failed = [receipts[int(entry["Id"])] for entry in resp.get("Failed", []) or []]
+        if failed:
+            logger.error("sqs.visibility_batch_partial queue_url=%s failed=%s", self.queue_url, len(failed))
+        return extended, failed
+
+    def get_queue_depth(self) -> Optional[Dict[str, int]]:
+        """Approximate visible, in-flight and delayed message counts of the queue, or None if SQS cannot be read."""
+        names = ["ApproximateNumberOfMessages", "ApproximateNumberOfMessagesNotVisible", "ApproximateNumberOfMessagesDelayed"]
+        try:
+            attributes = self.sqs.get_queue_attributes(QueueUrl=self.queue_url, AttributeNames=names).get("Attributes", {}) or {}
+        except Exception:
+            logger.exception("sqs.queue_depth_failed queue_url=%s", self.queue_url)
+            return None
+        return {
+            "visible": int(attributes.get("ApproximateNumberOfMessages", 0)),
+            "in_flight": int(attributes.get("ApproximateNumberOfMessagesNotVisible", 0)),
+            "delayed": int(attributes.get("ApproximateNumberOfMessagesDelayed", 0)),
+        }
+
     # keep interface: delete_sqs_message(receipt: str) -> bool
     def delete_sqs_message(self, receipt: str) -> bool:
         try:
@@ -236,7 +679,10 @@ class SQSAgent:
 # Bedrock responsibilities
 # --------------------------
 class BedrockAgent:
-    def __init__(self, boto3_config:Config, provider: str = None,region:str=None) -> None:
+    def __init__(self, boto3_config:Config, provider: str = None,region:str=None,
+                 model_cache: Optional[ModelDiscoveryCache] = None, pacer: Optional[TokenBucketPacer] = None,
+                 batch_max_workers: int = 4, batch_max_retries: int = 4,
+                 response_cache: Optional[ResponseCache] = None, router: Optional[ModelRouter] = None) -> None:
         if region is None:
             logger.error("config.region_missing")
             raise ValueError("AWS region missing.")
@@ -249,7 +695,50 @@ class BedrockAgent:
             logger.exception("bedrock.client_create_failed region=%s", self.region)
             raise RuntimeError("Failed to create Bedrock clients.")
 
-        # Load available models
+        # Resolve provider
+        if not provider:
+            cfg = ConfigurationCenter()
+            provider = cfg.get_parameter("aws_configuration", "model_provider")
+
+        if not provider:
+            logger.error("bedrock.no_provider_passed_or_configured")
+            raise ValueError("Model provider must be configured or passed explicitly.")
+
+        self.provider = provider
+        self.model_cache = model_cache
+        # Shared by every ask_batch() call on this agent, so concurrent batches stay inside one quota
+        self.pacer = pacer or TokenBucketPacer(requests_per_minute=60, tokens_per_minute=100000)
+        self.batch_max_workers = batch_max_workers
+        self.batch_max_retries = batch_max_retries
+        self.response_cache = response_cache
+        self.usage = get_usage_aggregator()
+        # Without a router every request goes to the discovered model_id
+        self.router = router
+        self._refresh_lock = threading.Lock()
+        self._refreshing = False
+        self._refresh_failures = 0
+        self._refresh_not_before = 0.0
+
+        # A cached model costs no network call; a stale one is used while a background thread re-discovers it
+        cached = model_cache.get(self._cache_key) if model_cache is not None else None
+        if cached is not None and cached.get("model_id"):
+            self._apply_discovery(cached, source="cache")
+            if cached["stale"]:
+                self.refresh_model_in_background()
+        else:
+            self._apply_discovery(self._discover_and_store(), source="discovery")
+
+    @property
+    def _cache_key(self) -> str:
+        return ModelDiscoveryCache.key(self.region, self.provider)
+
+    def _apply_discovery(self, entry: Dict, source: str) -> None:
+        self.model_id = entry["model_id"]
+        self._model_resolved_at = entry.get("resolved_at", time.time())
+        logger.info("bedrock.model_selected provider=%s model_id=%s source=%s", self.provider, self.model_id, source)
+
+    def _discover_model(self) -> Dict:
+        """List ACTIVE models and inference profiles and pick the provider's latest model."""
         try:
             resp = self.bedrock.list_foundation_models()
             summaries = resp.get("modelSummaries", []) or []
@@ -263,49 +752,93 @@ class BedrockAgent:
             logger.error("bedrock.no_active_providers_found region=%s", self.region)
             raise RuntimeError("No active providers available in Bedrock.")
 
-        # Resolve provider
-        if not provider:
-            cfg = ConfigurationCenter()
-            provider = cfg.get_parameter("aws_configuration", "model_provider")
-
-        if not provider:
-            logger.error("bedrock.no_provider_passed_or_configured")
-            raise ValueError("Model provider must be configured or passed explicitly.")
-
-        if provider not in providers:
-            logger.error("bedrock.invalid_provider provider=%s valid=%s", provider, providers)
-            raise ValueError(f"Invalid provider '{provider}', valid: {providers}")
-
-        self.provider = provider
+        if self.provider not in providers:
+            logger.error("bedrock.invalid_provider provider=%s valid=%s", self.provider, providers)
+            raise ValueError(f"Invalid provider '{self.provider}', valid: {providers}")
 
         # Pick latest model deterministically (max lexicographically)
-        provider_models = [m.get('modelArn') for m in active_models if m.get("providerName") == provider]
+        provider_models = [m.get('modelArn') for m in active_models if m.get("providerName") == self.provider]
         if not provider_models:
-            logger.error("bedrock.no_models_for_provider provider=%s", provider)
-            raise RuntimeError(f"No active models found for provider {provider}")
+            logger.error("bedrock.no_models_for_provider provider=%s", self.provider)
+            raise RuntimeError(f"No active models found for provider {self.provider}")
 
         resp = self.bedrock.list_inference_profiles()
         mapper={sub_arns.get('modelArn'):line.get('inferenceProfileArn') for line in resp.get('inferenceProfileSummaries') for sub_arns in line.get('models')}
 
+        return {"model_arn": provider_models[-1], "model_id": mapper[provider_models[-1]], "profiles": mapper}
+
+    def _discover_and_store(self) -> Dict:
+        entry = self._discover_model()
+        if self.model_cache is not None:
+            entry = self.model_cache.put(self._cache_key, entry)
+        return entry
+
+    def refresh_model_in_background(self) -> None:
+        """
+        Re-run discovery on a daemon thread and switch model_id once it succeeds; a failure keeps the current model.
+        After a failure no new attempt starts for REFRESH_RETRY_SECONDS, doubling per consecutive failure up to the cache TTL.
+        """
+        with self._refresh_lock:
+            if self._refreshing or time.monotonic() < self._refresh_not_before:
+                return
+            self._refreshing = True
+
+        def _refresh():
+            failed = False
+            try:
+                self._apply_discovery(self._discover_and_store(), source="refresh")
+            except Exception:
+                failed = True
+                logger.exception("bedrock.model_refresh_failed provider=%s", self.provider)
+            finally:
+                with self._refresh_lock:
+                    self._refreshing = False
+                    if failed:
+                        self._refresh_failures += 1
+                        ceiling = max(self.model_cache.ttl_seconds if self.model_cache is not None else 0, REFRESH_RETRY_SECONDS)
+                        delay = min(REFRESH_RETRY_SECONDS * 2 ** (self._refresh_failures - 1), ceiling)
+                        self._refresh_not_before = time.monotonic() + delay
+                        logger.warning("bedrock.model_refresh_backoff provider=%s seconds=%.0f", self.provider, delay)
+                    else:
+                        self._refresh_failures = 0
+                        self._refresh_not_before = 0.0
+
+        threading.Thread(target=_refresh, name="bedrock-model-refresh", daemon=True).start()
 
-        self.model_id = mapper[provider_models[-1]]
-        logger.info("bedrock.model_selected provider=%s model_id=%s", provider, self.model_id)
+    def _refresh_if_stale(self) -> None:
+        if self.model_cache is not None and time.time() - self._model_resolved_at >= self.model_cache.ttl_seconds:
+            self.refresh_model_in_background()
 
     # keep interface: ask(user_message) -> str
-    def ask(self, user_message: str, *, max_tokens: int = 2000, temperature: float = 0.3) -> str:
+    def ask(self, user_message: str, *, max_tokens: int = 2000, temperature: float = 0.3,
+            caller: Optional[str] = None) -> str:
+        cache_key = None
+        if self.response_cache is not None:
+            routing_key = self.router.routing_key if self.router is not None else self.model_id
+            cache_key = response_cache_key(routing_key, user_message, max_tokens=max_tokens, temperature=temperature)
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                logger.info("bedrock.response_cache_hit model_id=%s", routing_key)
+                return cached
+
+        detailed = self.ask_detailed(user_message, max_tokens=max_tokens, temperature=temperature, caller=caller)
+        response_text = detailed["text"]
+        # A reply cut off by max_tokens, a guardrail or a content filter must not be served again
+        if cache_key is not None and response_text and detailed["stop_reason"] == "end_turn":
+            self.response_cache.put(cache_key, response_text)
+        return response_text
+
+    def ask_detailed(self, user_message: str, *, max_tokens: int = 2000, temperature: float = 0.3,
+                     caller: Optional[str] = None) -> Dict:
+        """
+        One converse call, returning text, reasoning, stop_reason, usage and both latencies.
+        Every call, failed ones included, is recorded in the usage aggregator under (model_id, caller).
+        """
         conversation = [{"role": "user", "content": [{"text": user_message}]}]
-        try:
-            resp = self.bedrock_runtime.converse(
-                modelId=self.model_id,
-                messages=conversation,
-                inferenceConfig={"maxTokens": max_tokens, "temperature": temperature},
-            )
-        except ClientError:
-            logger.exception("bedrock.invoke_failed model_id=%s", self.model_id)
-            raise
-        except Exception:
-            logger.exception("bedrock.invoke_unexpected_error model_id=%s", self.model_id)
-            raise
+        resp, model_id, client_latency_ms = self._call_routed(
+            "converse", user_message, max_tokens, caller,
+            messages=conversation, inferenceConfig={"maxTokens": max_tokens, "temperature": temperature},
+        )
 
         # Parse response safely
         output = (resp.get("output") or {}).get("message") or {}
@@ -321,8 +854,91 @@ class BedrockAgent:
                 if isinstance(rt, str):
                     reasoning_text += rt
 
-        logger.info("bedrock.response_received model_id=%s response_len=%s", self.model_id, len(response_text))
-        return response_text
+        usage = resp.get("usage") or {}
+        server_latency_ms = (resp.get("metrics") or {}).get("latencyMs")
+        self.usage.record(model_id, caller, client_latency_ms, usage.get("inputTokens", 0), usage.get("outputTokens", 0),
+                          server_latency_ms)
+        logger.info("bedrock.response_received model_id=%s response_len=%s", model_id, len(response_text))
+        return {
+            "model_id": model_id,
+            "text": response_text,
+            "reasoning": reasoning_text,
+            "stop_reason": resp.get("stopReason"),
+            "usage": usage,
+            "server_latency_ms": server_latency_ms,
+            "client_latency_ms": client_latency_ms,
+        }
+
+    def get_response_cache_stats(self) -> Dict[str, int]:
+        return self.response_cache.get_stats() if self.response_cache is not None else {}
+
+    def ask_stream(self, user_message: str, *, max_tokens: int = 2000, temperature: float = 0.3,
+                   caller: Optional[str] = None) -> BedrockStream:
+        """
+        Same request as ask(), sent with converse_stream. Iterate the result for ("text" | "reasoning", delta)
+        pairs as they arrive; its ttft_seconds, text and usage are filled in while iterating.
+        """
+        conversation = [{"role": "user", "content": [{"text": user_message}]}]
+        started_at = time.perf_counter()
+        # Failover only covers starting the stream; an error event mid-stream is raised to the caller
+        resp, model_id, _ = self._call_routed(
+            "converse_stream", user_message, max_tokens, caller,
+            messages=conversation, inferenceConfig={"maxTokens": max_tokens, "temperature": temperature},
+        )
+
+        def _record(stream: BedrockStream, error: Optional[str]) -> None:
+            total_ms = (time.perf_counter() - started_at) * 1000
+            self.usage.record(stream.model_id, caller, total_ms, stream.usage.get("inputTokens", 0),
+                              stream.usage.get("outputTokens", 0), stream.latency_ms, error)
+            if self.router is not None:
+                self.router.record(stream.model_id, total_ms, error=error is not None,
+                                   throttled=error in THROTTLE_CODES)
+
+        return BedrockStream(resp["stream"], model_id, started_at, on_complete=_record)
+
+    def _call_routed(self, operation: str, user_message: str, max_tokens: int, caller: Optional[str], **request):
+        """
+        Run a bedrock-runtime operation on the routed models in order, moving on after throttling or
+        service errors. Returns (response, model_id, client_latency_ms); re-raises the last error.
+        """
+        self._refresh_if_stale()
+        if self.router is None:
+            model_ids = [self.model_id]
+        else:
+            model_ids = self.router.choose(len(user_message) // 4, max_tokens)
+
+        for position, model_id in enumerate(model_ids):
+            started_at = time.perf_counter()
+            try:
+                resp = getattr(self.bedrock_runtime, operation)(modelId=model_id, **request)
+            except Exception as e:
+                latency_ms = (time.perf_counter() - started_at) * 1000
+                code = e.response.get("Error", {}).get("Code", "ClientError") if isinstance(e, ClientError) else type(e).__name__
+                self.usage.record(model_id, caller, latency_ms, error=code)
+                if self.router is not None:
+                    self.router.record(model_id, latency_ms, error=True, throttled=is_throttle(e))
+                if is_failover_error(e) and position + 1 < len(model_ids):
+                    logger.warning("bedrock.failover operation=%s from=%s to=%s error=%s",
+                                   operation, model_id, model_ids[position + 1], code)
+                    continue
+                logger.exception("bedrock.invoke_failed operation=%s model_id=%s", operation, model_id)
+                raise
+            latency_ms = (time.perf_counter() - started_at) * 1000
+            if self.router is not None and operation == "converse":
+                self.router.record(model_id, latency_ms)
+            return resp, model_id, latency_ms
+
+    def ask_batch(self, user_messages: List[str], *, max_tokens: int = 2000, temperature: float = 0.3,
+                  max_workers: Optional[int] = None, caller: Optional[str] = None) -> List[Dict]:
+        """
+        ask() for many prompts on a bounded pool, paced to the configured RPM/TPM and backing off on throttling.
+        Returns one {"response", "error"} dict per prompt, in input order.
+        """
+        return run_batch(
+            lambda message: self.ask(message, max_tokens=max_tokens, temperature=temperature, caller=caller),
+            user_messages, self.pacer, max_tokens,
+            max_workers=max_workers or self.batch_max_workers, max_retries=self.batch_max_retries,
+        )
 
 
 
@@ -362,11 +978,95 @@ class AWSBoto3Agent:
         self.queue_name = queue
 
         provider = cfg.get_parameter("aws_configuration", "model_provider")
+        transfer_config = load_transfer_config(cfg)
+        upload_streaming = _config_bool(cfg.get_parameter("s3_configuration", "upload_streaming"), True)
+        bucket_cache_ttl = _config_int(cfg.get_parameter("s3_configuration", "bucket_cache_ttl_seconds"), 300)
+        presigned_get_expires = _config_int(cfg.get_parameter("s3_configuration", "presigned_get_expires_seconds"), 300)
+        presigned_get_margin = _config_int(cfg.get_parameter("s3_configuration", "presigned_get_refresh_margin_seconds"), 60)
+        stream_chunk_size = _config_int(cfg.get_parameter("s3_configuration", "stream_chunk_size_kb"), 64) * 1024
+        sqs_delay_seconds = _config_int(cfg.get_parameter("sqs_configuration", "delay_seconds"), 3)
+        self._sqs_batch_linger = _config_int(cfg.get_parameter("sqs_configuration", "batch_linger_ms"), 200) / 1000
+        self._sqs_batch_max_retries = _config_int(cfg.get_parameter("sqs_configuration", "batch_max_retries"), 3)
+        self._sqs_receive_wait = _config_int(cfg.get_parameter("sqs_configuration", "receive_wait_seconds"), 20)
+        sqs_visibility_timeout = _config_int(cfg.get_parameter("sqs_configuration", "visibility_timeout_seconds"), 30)
+        self._sqs_lease_margin = _config_int(cfg.get_parameter("sqs_configuration", "lease_extend_margin_seconds"), 10)
+        self._sqs_depth_refresh = _config_int(cfg.get_parameter("sqs_configuration", "depth_probe_refresh_seconds"), 5)
+        self._sqs_lease_manager = None
+        self._sqs_batch_sender = None
+        self._sqs_depth_probe = None
+        self._sqs_batch_sender_lock = threading.Lock()
 
-        # Compose agents
-        self._s3 = S3Agent(boto3_config=self.boto3_my_config, bucket_name=self.bucket_name,region=self.region)
-        self._sqs = SQSAgent(boto3_config=self.boto3_my_config, queue_name=self.queue_name,region=self.region)
-        self._bedrock = BedrockAgent(boto3_config=self.boto3_my_config, provider=provider,region=self.region)
+        # Sub-agents are created on first use: a worker that only uploads never resolves the queue or lists Bedrock models
+        self._s3_options = dict(transfer_config=transfer_config, streaming=upload_streaming,
+                                bucket_cache_ttl=bucket_cache_ttl, presigned_get_expires=presigned_get_expires,
+                                presigned_get_refresh_margin=presigned_get_margin, stream_chunk_size=stream_chunk_size)
+        self._sqs_options = dict(delay_seconds=sqs_delay_seconds, visibility_timeout=sqs_visibility_timeout)
+        self._codec_options = dict(
+            enabled=_config_bool(cfg.get_parameter("sqs_configuration", "envelope_enabled"), False),
+            compress_threshold=_config_int(cfg.get_parameter("sqs_configuration", "envelope_compress_threshold_bytes"), 2048),
+            claim_threshold=_config_int(cfg.get_parameter("sqs_configuration", "envelope_claim_check_threshold_kb"), 200) * 1024,
+            claim_prefix=cfg.get_parameter("sqs_configuration", "envelope_claim_check_prefix") or "sqs-claims/",
+        )
+        self.provider = provider
+        self._model_cache = ModelDiscoveryCache(
+            path=cfg.get_parameter("bedrock_configuration", "model_cache_path") or None,
+            ttl_seconds=_config_int(cfg.get_parameter("bedrock_configuration", "model_cache_ttl_seconds"), 86400),
+        )
+        self._bedrock_rate_limits = dict(
+            requests_per_minute=_config_int(cfg.get_parameter("bedrock_configuration", "requests_per_minute"), 60),
+            tokens_per_minute=_config_int(cfg.get_parameter("bedrock_configuration", "tokens_per_minute"), 100000),
+        )
+        self._bedrock_batch_options = dict(
+            batch_max_workers=_config_int(cfg.get_parameter("bedrock_configuration", "batch_max_workers"), 4),
+            batch_max_retries=_config_int(cfg.get_parameter("bedrock_configuration", "batch_max_retries"), 4),
+        )
+        self._bedrock_routes = cfg.get_parameter("bedrock_configuration", "routed_models")
+        self._bedrock_route_cooldown = _config_int(cfg.get_parameter("bedrock_configuration", "route_cooldown_seconds"), 30)
+        self._response_cache = None
+        if _config_bool(cfg.get_parameter("bedrock_configuration", "response_cache_enabled"), False):
+            self._response_cache = ResponseCache(
+                path=cfg.get_parameter("bedrock_configuration", "response_cache_path") or None,
+                memory_entries=_config_int(cfg.get_parameter("bedrock_configuration", "response_cache_memory_entries"), 256),
+                max_disk_bytes=_config_int(cfg.get_parameter("bedrock_configuration", "response_cache_max_mb"), 100) * MB,
+                ttl_seconds=_config_int(cfg.get_parameter("bedrock_configuration", "response_cache_ttl_seconds"), 604800),
+            )
+        self._s3_agent: Optional[S3Agent] = None
+        self._sqs_agent: Optional[SQSAgent] = None
+        self._bedrock_agent: Optional[BedrockAgent] = None
+        self._agents_lock = threading.RLock()
+
+    @property
+    def _s3(self) -> S3Agent:
+        if self._s3_agent is None:
+            with self._agents_lock:
+                if self._s3_agent is None:
+                    self._s3_agent = S3Agent(boto3_config=self.boto3_my_config, bucket_name=self.bucket_name,
+                                             region=self.region, **self._s3_options)
+        return self._s3_agent
+
+    @property
+    def _sqs(self) -> SQSAgent:
+        if self._sqs_agent is None:
+            with self._agents_lock:
+                if self._sqs_agent is None:
+                    codec = SQSEnvelopeCodec(claim_store=self._s3, **self._codec_options)
+                    self._sqs_agent = SQSAgent(boto3_config=self.boto3_my_config, queue_name=self.queue_name,
+                                               region=self.region, codec=codec, **self._sqs_options)
+        return self._sqs_agent
+
+    @property
+    def _bedrock(self) -> BedrockAgent:
+        if self._bedrock_agent is None:
+            with self._agents_lock:
+                if self._bedrock_agent is None:
+                    pacer = TokenBucketPacer(**self._bedrock_rate_limits)
+                    routes = parse_routes(self._bedrock_routes)
+                    router = ModelRouter(routes, cooldown_seconds=self._bedrock_route_cooldown) if routes else None
+                    self._bedrock_agent = BedrockAgent(boto3_config=self.boto3_my_config, provider=self.provider,
+                                                       region=self.region, model_cache=self._model_cache, pacer=pacer,
+                                                       response_cache=self._response_cache, router=router,
+                                                       **self._bedrock_batch_options)
+        return self._bedrock_agent
 
     # S3 passthrough
     def upload_fileobj_to_s3(self, file_obj, object_name, bucket=None):
@@ -374,13 +1074,55 @@ class AWSBoto3Agent:
 
     def get_object_from_s3(self, object_name, bucket=None):
         return self._s3.get_object_from_s3(object_name, bucket)
+
+    def get_object_stream(self, object_name, bucket=None, chunk_size=None, byte_range=None):
+        return self._s3.get_object_stream(object_name, bucket, chunk_size, byte_range)
     
     def delete_fileobj_from_s3(self, file_key, bucket=None):
         return self._s3.delete_fileobj_from_s3(file_key, bucket)
 
+    def copy_object_in_s3(self, source_key, object_name, bucket=None):
+        return self._s3.copy_object_in_s3(source_key, object_name, bucket)
+
+    def delete_objects_from_s3(self, file_keys, bucket=None):
+        return self._s3.delete_objects_from_s3(file_keys, bucket)
+
+    def generate_presigned_upload(self, object_name, max_bytes, content_type="application/pdf", expires_in=300, bucket=None):
+        return self._s3.generate_presigned_upload(object_name, max_bytes, content_type, expires_in, bucket)
+
+    def generate_presigned_download(self, object_name, filename=None, bucket=None):
+        return self._s3.generate_presigned_download(object_name, filename, bucket)
+
+    def head_object_in_s3(self, object_name, bucket=None):
+        return self._s3.head_object_in_s3(object_name, bucket)
+
+    def invalidate_bucket_cache(self, bucket=None):
+        return self._s3.invalidate_bucket_cache(bucket)
+
+    def get_bucket_cache_stats(self):
+        return self._s3.get_bucket_cache_stats()
+
     # SQS passthrough
-    def send_sqs_message(self, message_content: Dict):
-        return self._sqs.send_sqs_message(message_content)
+    def send_sqs_message(self, message_content: Dict, delay_seconds=None, message_group_id=None, deduplication_id=None):
+        return self._sqs.send_sqs_message(message_content, delay_seconds, message_group_id, deduplication_id)
+
+    def build_sqs_batch_entry(self, entry_id, message_content, delay_seconds=None, attributes=None,
+                              message_group_id=None, deduplication_id=None):
+        return self._sqs.build_batch_entry(entry_id, message_content, delay_seconds, attributes,
+                                           message_group_id, deduplication_id)
+
+    def send_sqs_message_batch(self, entries):
+        return self._sqs.send_sqs_message_batch(entries)
+
+    def get_sqs_batch_sender(self):
+        """Shared SQSBatchSender for producers that emit many messages (bulk imports, bursts)."""
+        if self._sqs_batch_sender is None:
+            with self._sqs_batch_sender_lock:
+                if self._sqs_batch_sender is None:
+                    from helper.sqs_batching import SQSBatchSender
+                    self._sqs_batch_sender = SQSBatchSender(self._sqs, linger_seconds=self._sqs_batch_linger,
+                                                            max_retries=self._sqs_batch_max_retries)
+        return self._sqs_batch_sender
 
     def receive_sqs_message(self):
         return self._sqs.receive_sqs_message()
@@ -388,6 +1130,71 @@ class AWSBoto3Agent:
     def delete_sqs_message(self, receipt: str):
         return self._sqs.delete_sqs_message(receipt)
 
+    def get_sqs_lease_manager(self):
+        """Shared SQSLeaseManager that keeps messages invisible while their handlers run."""
+        if self._sqs_lease_manager is None:
+            with self._sqs_batch_sender_lock:
+                if self._sqs_lease_manager is None:
+                    from helper.sqs_batching import SQSLeaseManager
+                    self._sqs_lease_manager = SQSLeaseManager(self._sqs, visibility_timeout=self._sqs.visibility_timeout,
+                                                              extend_margin=self._sqs_lease_margin)
+        return self._sqs_lease_manager
+
+    def get_sqs_depth_probe(self):
+        """Shared QueueDepthProbe; reading it never calls SQS on the caller's thread."""
+        if self._sqs_depth_probe is None:
+            with self._sqs_batch_sender_lock:
+                if self._sqs_depth_probe is None:
+                    from helper.sqs_backpressure import QueueDepthProbe
+                    self._sqs_depth_probe = QueueDepthProbe(self._sqs, refresh_seconds=self._sqs_depth_refresh)
+        return self._sqs_depth_probe
+
+    def get_sqs_consumer(self, max_messages: int = 10):
+        """New long-polling SQSBatchConsumer; one per consumer loop, it is not shared between threads."""
+        from helper.sqs_batching import SQSBatchConsumer
+        return SQSBatchConsumer(self._sqs, max_messages=max_messages, wait_time_seconds=self._sqs_receive_wait)
+
     # Bedrock passthrough
-    def ask(self, user_message: str):
-        return self._bedrock.ask(user_message)
+    def ask(self, user_message: str, caller=None):
+        return self._bedrock.ask(user_message, caller=caller)
+
+    def ask_detailed(self, user_message: str, **kwargs):
+        return self._bedrock.ask_detailed(user_message, **kwargs)
+
+    def ask_stream(self, user_message: str, **kwargs):
+        return self._bedrock.ask_stream(user_message, **kwargs)
+
+    def ask_batch(self, user_messages, **kwargs):
+        return self._bedrock.ask_batch(user_messages, **kwargs)
+
+    def get_response_cache_stats(self):
+        # Read from the cache itself so asking for stats never builds the Bedrock agent
+        return self._response_cache.get_stats() if self._response_cache is not None else {}
+
+    def get_bedrock_usage(self):
+        return get_usage_aggregator().snapshot()
+
+
+_agent: Optional[AWSBoto3Agent] = None
+_agent_lock = threading.Lock()
+
+
+def get_aws_agent() -> AWSBoto3Agent:
+    """Per-process AWSBoto3Agent, built on first use; each forked worker builds its own boto3 clients."""
+    global _agent
+    if _agent is None:
+        with _agent_lock:
+            if _agent is None:
+                _agent = AWSBoto3Agent()
+    return _agent
+
+
+def _reset_after_fork() -> None:
+    # boto3 clients and held locks must not be shared with the parent of a pre-fork server
+    global _agent, _agent_lock
+    _agent = None
+    _agent_lock = threading.Lock()
+    S3Agent._bucket_cache_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,42 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from helper.logger_setup import setup_logger
+from config.configuration import ConfigurationCenter
+
+logger = setup_logger("helper")
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_aws_executor() -> ThreadPoolExecutor:
+    """Process-wide, bounded pool for blocking boto3 calls made from async views."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                cfg = ConfigurationCenter()
+                max_workers = int(cfg.get_parameter("aws_configuration", "executor_max_workers") or 32)
+                _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="aws-io")
+                logger.info("aws_executor.created max_workers=%s", max_workers)
+    return _executor
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Await a blocking call on the AWS executor instead of Django's single sync thread."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_aws_executor(), partial(fn, *args, **kwargs))
+
+
+def _reset_after_fork() -> None:
+    # Worker threads do not survive fork; the child builds its own pool on first use
+    global _executor, _executor_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
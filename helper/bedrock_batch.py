@@ -0,0 +1,125 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Sequence
+
+from helper.logger_setup import setup_logger
+from helper.bedrock_streaming import error_code
+
+logger = setup_logger("helper")
+
+THROTTLE_CODES = {"ThrottlingException", "TooManyRequestsException", "ServiceQuotaExceededException"}
+# Buckets hold this many seconds of quota, so a fresh pacer does not fire a whole minute's worth at once
+BURST_SECONDS = 10
+
+
+def is_throttle(exc: Exception) -> bool:
+    return error_code(exc) in THROTTLE_CODES
+
+
+def estimate_tokens(prompt: str, max_tokens: int) -> int:
+    # Bedrock reserves max_tokens against the TPM quota up front; ~4 characters per input token
+    return len(prompt) // 4 + max_tokens
+
+
+# -------------------------------------------
+# Request and token pacing
+# -------------------------------------------
+class TokenBucketPacer:
+    """
+    Two token buckets refilled at requests_per_minute and tokens_per_minute. acquire() blocks until both
+    can cover a call. on_throttle() halves the refill rate and empties the request bucket; on_success()
+    earns the rate back in 5% steps, so the pacer settles just under the quota Bedrock actually grants.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int, min_rate_factor: float = 0.1) -> None:
+        self.requests_per_minute = max(requests_per_minute, 1)
+        self.tokens_per_minute = max(tokens_per_minute, 1)
+        self.min_rate_factor = min_rate_factor
+        self._request_capacity = max(self.requests_per_minute * BURST_SECONDS / 60, 1.0)
+        self._token_capacity = max(self.tokens_per_minute * BURST_SECONDS / 60, 1.0)
+        self._requests = self._request_capacity
+        self._tokens = self._token_capacity
+        self._rate_factor = 1.0
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def rate_factor(self) -> float:
+        return self._rate_factor
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated_at
+        self._updated_at = now
+        self._requests = min(self._request_capacity,
+                             self._requests + elapsed * self.requests_per_minute / 60 * self._rate_factor)
+        self._tokens = min(self._token_capacity,
+                           self._tokens + elapsed * self.tokens_per_minute / 60 * self._rate_factor)
+
+    def acquire(self, tokens: int) -> float:
+        """Block until one request and `tokens` tokens are available; returns the seconds waited."""
+        # A call larger than the bucket would otherwise never fit
+        tokens = min(tokens, self._token_capacity)
+        started = time.monotonic()
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self._requests >= 1 and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return time.monotonic() - started
+                request_wait = (1 - self._requests) * 60 / (self.requests_per_minute * self._rate_factor)
+                token_wait = (tokens - self._tokens) * 60 / (self.tokens_per_minute * self._rate_factor)
+            time.sleep(max(request_wait, token_wait, 0.01))
+
+    def on_throttle(self) -> None:
+        with self._lock:
+            self._rate_factor = max(self.min_rate_factor, self._rate_factor / 2)
+            self._requests = min(self._requests, 0.0)
+        logger.warning("bedrock.pacer_throttled rate_factor=%.2f", self._rate_factor)
+
+    def on_success(self) -> None:
+        with self._lock:
+            self._rate_factor = min(1.0, self._rate_factor + 0.05)
+
+
+# -------------------------------------------
+# Batch runner
+# -------------------------------------------
+def run_batch(call: Callable[[str], str], prompts: Sequence[str], pacer: TokenBucketPacer, max_tokens: int,
+              max_workers: int = 4, max_retries: int = 4, backoff_seconds: float = 1.0) -> List[Dict]:
+    """
+    Run call(prompt) for every prompt on at most max_workers threads, paced by `pacer`.
+    Throttled calls are retried up to max_retries times with jittered exponential backoff; other errors are not.
+    Returns one {"response": str | None, "error": str | None} per prompt, in input order.
+    """
+
+    def _one(index: int, prompt: str) -> Dict:
+        attempt = 0
+        while True:
+            pacer.acquire(estimate_tokens(prompt, max_tokens))
+            try:
+                response = call(prompt)
+            except Exception as exc:
+                if is_throttle(exc) and attempt < max_retries:
+                    pacer.on_throttle()
+                    delay = backoff_seconds * (2 ** attempt) * (0.5 + random.random())
+                    attempt += 1
+                    logger.warning("bedrock.batch_throttled index=%s attempt=%s retry_in=%.1fs", index, attempt, delay)
+                    time.sleep(delay)
+                    continue
+                logger.error("bedrock.batch_item_failed index=%s attempts=%s error=%s", index, attempt + 1, exc)
+                return {"response": None, "error": f"{type(exc).__name__}: {exc}"}
+            pacer.on_success()
+            return {"response": response, "error": None}
+
+    if not prompts:
+        return []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(prompts))), thread_name_prefix="bedrock-batch") as pool:
+        futures = [pool.submit(_one, index, prompt) for index, prompt in enumerate(prompts)]
+        results = [future.result() for future in futures]
+    failed = sum(1 for result in results if result["error"])
+    logger.info("bedrock.batch_done prompts=%s failed=%s seconds=%.1f", len(prompts), failed, time.perf_counter() - started)
+    return results
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, Optional
+
+from helper.logger_setup import setup_logger
+
+logger = setup_logger("helper")
+
+DEFAULT_CACHE_PATH = os.path.join(tempfile.gettempdir(), "bedrock_responses.sqlite3")
+
+
+def response_cache_key(model_id: str, prompt: str, **inference) -> str:
+    """sha256 over the model, the prompt and every inference parameter that changes the answer."""
+    material = json.dumps({"model_id": model_id, "prompt": prompt, "inference": inference},
+                          sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+# -------------------------------------------
+# Two-tier response cache
+# -------------------------------------------
+class ResponseCache:
+    """
+    Bedrock responses by response_cache_key: an in-memory LRU of memory_entries in front of a SQLite file.
+    Entries older than ttl_seconds are misses and get dropped. The file is trimmed back to max_disk_bytes
+    by evicting the least recently read rows; memory hits do not touch the file, so its recency is approximate.
+    Each process (and each forked child) opens its own connection to the shared file.
+    """
+
+    def __init__(self, path: Optional[str] = None, memory_entries: int = 256, max_disk_bytes: int = 100 * 1024 * 1024,
+                 ttl_seconds: int = 7 * 86400) -> None:
+        self.path = path or DEFAULT_CACHE_PATH
+        self.memory_entries = memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._stats = Counter()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_pid: Optional[int] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None or self._conn_pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_idx ON responses (accessed_at)")
+            conn.commit()
+            self._conn, self._conn_pid = conn, os.getpid()
+        return self._conn
+
+    def _remember(self, key: str, response: str, created_at: float) -> None:
+        self._memory[key] = (response, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            self._stats["memory_evictions"] += 1
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is not None:
+                if now - cached[1] < self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return cached[0]
+                del self._memory[key]
+
+            try:
+                conn = self._connection()
+                row = conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None and now - row[1] >= self.ttl_seconds:
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    conn.commit()
+                    self._stats["expired"] += 1
+                    row = None
+                if row is not None:
+                    conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                    conn.commit()
+            except sqlite3.Error:
+                logger.exception("bedrock.response_cache_read_failed path=%s", self.path)
+                row = None
+
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["disk_hits"] += 1
+            self._remember(key, row[0], row[1])
+            return row[0]
+
+    def put(self, key: str, response: str) -> None:
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            self._remember(key, response, now)
+            self._stats["stores"] += 1
+            try:
+                conn = self._connection()
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, response, size, now, now),
+                )
+                self._trim(conn)
+                conn.commit()
+            except sqlite3.Error:
+                logger.exception("bedrock.response_cache_write_failed path=%s", self.path)
+
+    def _trim(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+        evict, freed = [], 0
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall():
+            evict.append((key,))
+            freed += size
+            if total - freed <= self.max_disk_bytes:
+                break
+        conn.executemany("DELETE FROM responses WHERE key = ?", evict)
+        self._stats["disk_evictions"] += len(evict)
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        stats["hits"] = stats.get("memory_hits", 0) + stats.get("disk_hits", 0)
+        stats.setdefault("misses", 0)
+        return stats
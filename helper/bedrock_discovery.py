@@ -0,0 +1,74 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Optional
+
+from helper.logger_setup import setup_logger
+
+logger = setup_logger("helper")
+
+# cache/ next to manage.py (/app/cache in the image), where the ECS task mounts a volume that outlives the task
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache",
+                                  "bedrock_model_cache.json")
+
+
+# -------------------------------------------
+# On-disk cache of Bedrock model discovery
+# -------------------------------------------
+class ModelDiscoveryCache:
+    """
+    Resolved Bedrock models per "region:provider", stored as one JSON file.
+    Each entry holds the discovery result plus resolved_at (epoch seconds); an entry older than
+    ttl_seconds is still returned by get() but reported stale so the caller can refresh it in the background.
+    Writes go through a temp file and os.replace, so concurrent workers never read half a file.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl_seconds: int = 86400) -> None:
+        self.path = path or DEFAULT_CACHE_PATH
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(region: str, provider: str) -> str:
+        return f"{region}:{provider}"
+
+    def _read(self) -> Dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as fh:
+                data = json.load(fh)
+            return data if isinstance(data, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError):
+            logger.exception("bedrock.model_cache_read_failed path=%s", self.path)
+            return {}
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Cached entry with a "stale" flag added, or None if there is none."""
+        entry = self._read().get(key)
+        if not isinstance(entry, dict) or "resolved_at" not in entry:
+            return None
+        return dict(entry, stale=self.is_stale(entry))
+
+    def is_stale(self, entry: Dict) -> bool:
+        return time.time() - entry.get("resolved_at", 0) >= self.ttl_seconds
+
+    def put(self, key: str, entry: Dict) -> Dict:
+        entry = dict(entry, resolved_at=time.time())
+        entry.pop("stale", None)
+        with self._lock:
+            data = self._read()
+            data[key] = entry
+            directory = os.path.dirname(os.path.abspath(self.path))
+            try:
+                os.makedirs(directory, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".bedrock_models.")
+                with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                    json.dump(data, fh)
+                os.replace(tmp_path, self.path)
+            except OSError:
+                # The agent still works without the cache, it just pays for discovery again next start
+                logger.exception("bedrock.model_cache_write_failed path=%s", self.path)
+        return entry
@@ -0,0 +1,123 @@
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+from helper.logger_setup import setup_logger
+from helper.bedrock_streaming import error_code
+
+logger = setup_logger("helper")
+
+# Errors after which the same prompt is worth sending to the next model
+FAILOVER_CODES = {"ThrottlingException", "TooManyRequestsException", "ServiceUnavailableException",
+                  "ModelNotReadyException", "ModelTimeoutException", "InternalServerException"}
+
+# Moving-average error rate from which a profile ranks behind every healthy one, whatever its latency
+UNHEALTHY_ERROR_RATE = 0.5
+
+
+def is_failover_error(exc: Exception) -> bool:
+    return error_code(exc) in FAILOVER_CODES
+
+
+class RouteCandidate:
+    __slots__ = ("model_id", "max_input_tokens", "max_output_tokens", "ewma_latency_ms", "ewma_error_rate",
+                 "cooldown_until", "throttle_streak")
+
+    def __init__(self, model_id: str, max_input_tokens: int, max_output_tokens: int) -> None:
+        self.model_id = model_id
+        self.max_input_tokens = max_input_tokens
+        self.max_output_tokens = max_output_tokens
+        self.ewma_latency_ms: Optional[float] = None
+        self.ewma_error_rate = 0.0
+        self.cooldown_until = 0.0
+        self.throttle_streak = 0
+
+    def fits(self, prompt_tokens: int, max_tokens: int) -> bool:
+        return prompt_tokens <= self.max_input_tokens and max_tokens <= self.max_output_tokens
+
+
+def parse_routes(value: Optional[str]) -> List[RouteCandidate]:
+    """Parse "model_id|max_input_tokens|max_output_tokens, ..." (ARNs contain colons, hence the pipes)."""
+    candidates = []
+    for item in (value or "").split(","):
+        parts = [part.strip() for part in item.split("|")]
+        if not parts[0]:
+            continue
+        try:
+            max_input = int(parts[1]) if len(parts) > 1 and parts[1] else 200000
+            max_output = int(parts[2]) if len(parts) > 2 and parts[2] else 8192
+        except ValueError:
+            logger.error("bedrock.route_invalid entry=%s", item)
+            continue
+        candidates.append(RouteCandidate(parts[0], max_input, max_output))
+    return candidates
+
+
+# -------------------------------------------
+# Latency- and size-aware model routing
+# -------------------------------------------
+class ModelRouter:
+    """
+    Orders the configured inference profiles for one request, best first:
+    profiles whose limits fit the prompt and max_tokens, scored by moving-average latency inflated by the
+    moving-average error rate; config order breaks ties and ranks models with no history yet.
+    Profiles that have failed without ever succeeding, or whose error rate reached UNHEALTHY_ERROR_RATE,
+    rank behind the healthy ones.
+    A throttled profile cools down (cooldown_seconds, doubling per consecutive throttle up to 8x) and is
+    only tried after every other profile.
+    """
+
+    def __init__(self, candidates: Sequence[RouteCandidate], alpha: float = 0.2, cooldown_seconds: float = 30.0) -> None:
+        if not candidates:
+            raise ValueError("ModelRouter needs at least one model.")
+        self.candidates = list(candidates)
+        self.alpha = alpha
+        self.cooldown_seconds = cooldown_seconds
+        self._lock = threading.Lock()
+
+    @property
+    def routing_key(self) -> str:
+        return "router:" + ",".join(candidate.model_id for candidate in self.candidates)
+
+    def choose(self, prompt_tokens: int, max_tokens: int) -> List[str]:
+        now = time.monotonic()
+        with self._lock:
+            fitting = [c for c in self.candidates if c.fits(prompt_tokens, max_tokens)]
+            if not fitting:
+                # Nothing claims to fit; let the largest model try rather than failing locally
+                fitting = [max(self.candidates, key=lambda c: c.max_input_tokens)]
+
+            def _score(item):
+                order, candidate = item
+                cooling = candidate.cooldown_until > now
+                # Only successes update the latency, so a profile that has only errored still reads 0 ms
+                unhealthy = candidate.ewma_error_rate >= UNHEALTHY_ERROR_RATE or \
+                    (candidate.ewma_latency_ms is None and candidate.ewma_error_rate > 0)
+                latency = candidate.ewma_latency_ms or 0.0
+                return cooling, unhealthy, latency * (1 + 4 * candidate.ewma_error_rate), order
+
+            ranked = sorted(enumerate(fitting), key=_score)
+        return [candidate.model_id for _, candidate in ranked]
+
+    def record(self, model_id: str, latency_ms: float, error: bool = False, throttled: bool = False) -> None:
+        with self._lock:
+            candidate = next((c for c in self.candidates if c.model_id == model_id), None)
+            if candidate is None:
+                return
+            if not error:
+                candidate.ewma_latency_ms = latency_ms if candidate.ewma_latency_ms is None else \
+                    (1 - self.alpha) * candidate.ewma_latency_ms + self.alpha * latency_ms
+            candidate.ewma_error_rate = (1 - self.alpha) * candidate.ewma_error_rate + self.alpha * (1.0 if error else 0.0)
+            if throttled:
+                candidate.throttle_streak += 1
+                candidate.cooldown_until = time.monotonic() + self.cooldown_seconds * min(2 ** (candidate.throttle_streak - 1), 8)
+                logger.warning("bedrock.route_cooldown model_id=%s seconds=%.0f", model_id,
+                               candidate.cooldown_until - time.monotonic())
+            elif not error:
+                candidate.throttle_streak = 0
+
+    def get_stats(self) -> List[Dict]:
+        now = time.monotonic()
+        with self._lock:
+            return [{"model_id": c.model_id, "ewma_latency_ms": c.ewma_latency_ms, "ewma_error_rate": round(c.ewma_error_rate, 3),
+                     "cooling_down": c.cooldown_until > now} for c in self.candidates]
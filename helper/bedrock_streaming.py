@@ -0,0 +1,126 @@
+import time
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from botocore.exceptions import ClientError, EventStreamError
+
+from helper.logger_setup import setup_logger
+
+logger = setup_logger("helper")
+
+DELTA_TEXT = "text"
+DELTA_REASONING = "reasoning"
+
+# Error events converse_stream can emit after the response has started
+_STREAM_ERRORS = ("internalServerException", "modelStreamErrorException", "validationException",
+                  "throttlingException", "serviceUnavailableException")
+
+
+class BedrockStreamError(RuntimeError):
+    """An error event arrived in the middle of a converse_stream response."""
+
+    def __init__(self, kind: str, message: str) -> None:
+        super().__init__(f"{kind}: {message}")
+        self.kind = kind
+
+
+def normalise_error_code(code: Optional[str]) -> Optional[str]:
+    # Stream error events spell codes in lower camel case ("throttlingException"), API errors do not
+    return code[:1].upper() + code[1:] if code else code
+
+
+def error_code(exc: Exception) -> Optional[str]:
+    """Bedrock error code of a ClientError (EventStreamError included) or BedrockStreamError, as "ThrottlingException"."""
+    if isinstance(exc, ClientError):
+        return normalise_error_code(exc.response.get("Error", {}).get("Code"))
+    if isinstance(exc, BedrockStreamError):
+        return normalise_error_code(exc.kind)
+    return None
+
+
+# -------------------------------------------
+# converse_stream consumer
+# -------------------------------------------
+class BedrockStream:
+    """
+    Iterates (kind, delta) pairs of a converse_stream response as they arrive, kind being "text" or "reasoning".
+    After the first delta ttft_seconds holds the time from the request to that delta; once the stream is
+    exhausted text, reasoning, stop_reason, usage and server latency_ms are filled in as well.
+    on_complete(stream, error_code) runs exactly once when the stream ends, fails or is abandoned;
+    error events, botocore EventStreamErrors included, are raised as BedrockStreamError.
+    """
+
+    def __init__(self, events, model_id: str, started_at: float,
+                 on_complete: Optional[Callable[["BedrockStream", Optional[str]], None]] = None) -> None:
+        self._events = events
+        self._on_complete = on_complete
+        self.model_id = model_id
+        self.started_at = started_at
+        self.ttft_seconds: Optional[float] = None
+        self.total_seconds: Optional[float] = None
+        self.text = ""
+        self.reasoning = ""
+        self.stop_reason: Optional[str] = None
+        self.usage: Dict = {}
+        self.latency_ms: Optional[int] = None
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        error_kind = None
+        try:
+            for event in self._events:
+                if "contentBlockDelta" in event:
+                    delta = event["contentBlockDelta"].get("delta") or {}
+                    if isinstance(delta.get("text"), str):
+                        yield self._record(DELTA_TEXT, delta["text"])
+                    elif "reasoningContent" in delta:
+                        text = (delta.get("reasoningContent") or {}).get("text")
+                        if isinstance(text, str):
+                            yield self._record(DELTA_REASONING, text)
+                elif "messageStop" in event:
+                    self.stop_reason = event["messageStop"].get("stopReason")
+                elif "metadata" in event:
+                    self.usage = event["metadata"].get("usage") or {}
+                    self.latency_ms = (event["metadata"].get("metrics") or {}).get("latencyMs")
+                else:
+                    for kind in _STREAM_ERRORS:
+                        if kind in event:
+                            error_kind = kind
+                            raise BedrockStreamError(kind, (event[kind] or {}).get("message", ""))
+        except EventStreamError as e:
+            # botocore raises most error events itself while parsing the stream, before they reach the loop
+            error = e.response.get("Error", {})
+            error_kind = error.get("Code") or type(e).__name__
+            raise BedrockStreamError(error_kind, error.get("Message", str(e))) from e
+        except Exception as e:
+            # Connection resets and read timeouts end the stream as well
+            error_kind = error_kind or type(e).__name__
+            raise
+        finally:
+            # Also reached when the caller stops iterating early; that is not the model's fault
+            self._finish(error_kind)
+
+    def _finish(self, error_kind: Optional[str]) -> None:
+        if self.total_seconds is not None:
+            return
+        self.total_seconds = time.perf_counter() - self.started_at
+        if error_kind is not None:
+            logger.error("bedrock.stream_error model_id=%s kind=%s total_ms=%.0f", self.model_id, error_kind,
+                         self.total_seconds * 1000)
+        else:
+            logger.info("bedrock.stream_done model_id=%s ttft_ms=%s total_ms=%.0f stop_reason=%s response_len=%s",
+                        self.model_id, None if self.ttft_seconds is None else round(self.ttft_seconds * 1000),
+                        self.total_seconds * 1000, self.stop_reason, len(self.text))
+        if self._on_complete is not None:
+            try:
+                self._on_complete(self, normalise_error_code(error_kind))
+            except Exception:
+                logger.exception("bedrock.stream_on_complete_failed model_id=%s", self.model_id)
+
+    def _record(self, kind: str, delta: str) -> Tuple[str, str]:
+        if self.ttft_seconds is None:
+            self.ttft_seconds = time.perf_counter() - self.started_at
+            logger.info("bedrock.stream_first_token model_id=%s ttft_ms=%.0f", self.model_id, self.ttft_seconds * 1000)
+        if kind == DELTA_TEXT:
+            self.text += delta
+        else:
+            self.reasoning += delta
+        return kind, delta
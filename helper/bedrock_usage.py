@@ -0,0 +1,122 @@
+import os
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from helper.logger_setup import setup_logger
+
+logger = setup_logger("helper")
+
+DEFAULT_CALLER = "default"
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(sorted_values: Sequence[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class _ModelCallerStats:
+    __slots__ = ("calls", "errors", "input_tokens", "output_tokens", "client_latency_ms", "server_latency_ms")
+
+    def __init__(self, window: int) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        # Percentiles cover the most recent `window` calls so a model switch shows up quickly
+        self.client_latency_ms: deque = deque(maxlen=window)
+        self.server_latency_ms: deque = deque(maxlen=window)
+
+
+# -------------------------------------------
+# Per-call usage and latency accounting
+# -------------------------------------------
+class UsageAggregator:
+    """
+    Totals and latency percentiles of Bedrock calls per (model_id, caller).
+    record() also hands every call to the registered sinks (e.g. a DB writer); a failing sink is logged and skipped.
+    """
+
+    def __init__(self, window: int = 1000) -> None:
+        self.window = window
+        self._stats: Dict[Tuple[str, str], _ModelCallerStats] = {}
+        self._sinks: List[Callable[[Dict], None]] = []
+        self._lock = threading.Lock()
+
+    def add_sink(self, sink: Callable[[Dict], None]) -> None:
+        with self._lock:
+            if sink not in self._sinks:
+                self._sinks.append(sink)
+
+    def record(self, model_id: str, caller: Optional[str], client_latency_ms: float, input_tokens: int = 0,
+               output_tokens: int = 0, server_latency_ms: Optional[float] = None, error: Optional[str] = None) -> Dict:
+        call = {
+            "model_id": model_id,
+            "caller": caller or DEFAULT_CALLER,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "server_latency_ms": server_latency_ms,
+            "client_latency_ms": round(client_latency_ms),
+            "error": error,
+        }
+        with self._lock:
+            stats = self._stats.get((call["model_id"], call["caller"]))
+            if stats is None:
+                stats = self._stats[(call["model_id"], call["caller"])] = _ModelCallerStats(self.window)
+            stats.calls += 1
+            stats.errors += 1 if error else 0
+            stats.input_tokens += input_tokens
+            stats.output_tokens += output_tokens
+            stats.client_latency_ms.append(call["client_latency_ms"])
+            if server_latency_ms is not None:
+                stats.server_latency_ms.append(server_latency_ms)
+            sinks = list(self._sinks)
+
+        logger.info("bedrock.usage model_id=%s caller=%s input_tokens=%s output_tokens=%s server_ms=%s client_ms=%s error=%s",
+                    model_id, call["caller"], input_tokens, output_tokens, server_latency_ms, call["client_latency_ms"], error)
+        for sink in sinks:
+            try:
+                sink(call)
+            except Exception:
+                logger.exception("bedrock.usage_sink_failed sink=%s", getattr(sink, "__name__", sink))
+        return call
+
+    def snapshot(self) -> List[Dict]:
+        """One dict per (model_id, caller) with call/error counts, token totals and latency percentiles."""
+        with self._lock:
+            items = [(key, stats.calls, stats.errors, stats.input_tokens, stats.output_tokens,
+                      sorted(stats.client_latency_ms), sorted(stats.server_latency_ms))
+                     for key, stats in self._stats.items()]
+        rows = []
+        for (model_id, caller), calls, errors, input_tokens, output_tokens, client, server in items:
+            row = {"model_id": model_id, "caller": caller, "calls": calls, "errors": errors,
+                   "input_tokens": input_tokens, "output_tokens": output_tokens}
+            for pct in PERCENTILES:
+                row[f"client_p{pct}_ms"] = percentile(client, pct)
+                row[f"server_p{pct}_ms"] = percentile(server, pct)
+            rows.append(row)
+        return rows
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+_aggregator = UsageAggregator()
+
+
+def get_usage_aggregator() -> UsageAggregator:
+    """Process-wide aggregator shared by every BedrockAgent."""
+    return _aggregator
+
+
+def _reset_after_fork() -> None:
+    # The parent's lock may have been held by another thread at fork time
+    _aggregator._lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,79 @@
+import threading
+import time
+from typing import Optional
+
+from helper.aws_executor import get_aws_executor
+from helper.logger_setup import setup_logger
+
+logger = setup_logger("helper")
+
+MODE_NORMAL = "normal"
+MODE_DEFERRED = "deferred"
+MODE_RATE_LIMITED = "rate_limited"
+
+
+# -------------------------------------------
+# Cached queue depth
+# -------------------------------------------
+class QueueDepthProbe:
+    """
+    Last known backlog (visible + delayed messages) of the processing queue.
+    backlog() only reads the cached value; once it is older than refresh_seconds one
+    get_queue_attributes call is started on the AWS executor, so no request waits on SQS
+    and the queue is read at most once per refresh interval per process.
+    None means the depth is not known yet, or could not be read for longer than two intervals.
+    """
+
+    def __init__(self, sqs_agent, refresh_seconds: float = 5.0) -> None:
+        self.sqs_agent = sqs_agent
+        self.refresh_seconds = refresh_seconds
+        self._backlog: Optional[int] = None
+        self._updated_at = 0.0
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def backlog(self) -> Optional[int]:
+        now = time.monotonic()
+        with self._lock:
+            stale = now - self._updated_at >= self.refresh_seconds
+            if stale and not self._refreshing:
+                self._refreshing = True
+                get_aws_executor().submit(self._refresh)
+            if now - self._updated_at >= 2 * self.refresh_seconds:
+                return None
+            return self._backlog
+
+    def _refresh(self) -> None:
+        try:
+            depth = self.sqs_agent.get_queue_depth()
+        finally:
+            with self._lock:
+                self._refreshing = False
+        if depth is None:
+            return
+        with self._lock:
+            self._backlog = depth["visible"] + depth["delayed"]
+            self._updated_at = time.monotonic()
+        logger.info("sqs.depth_probe backlog=%s in_flight=%s", self._backlog, depth["in_flight"])
+
+
+class BackpressurePolicy:
+    """Maps a queue backlog to normal, deferred or rate-limited intake and estimates the processing delay."""
+
+    def __init__(self, defer_backlog: int, rate_limit_backlog: int, drain_per_minute: int) -> None:
+        self.defer_backlog = defer_backlog
+        self.rate_limit_backlog = rate_limit_backlog
+        self.drain_per_minute = max(drain_per_minute, 1)
+
+    def mode(self, backlog: Optional[int]) -> str:
+        # An unknown depth must not block uploads
+        if backlog is None or backlog < self.defer_backlog:
+            return MODE_NORMAL
+        if backlog < self.rate_limit_backlog:
+            return MODE_DEFERRED
+        return MODE_RATE_LIMITED
+
+    def expected_delay_minutes(self, backlog: Optional[int]) -> int:
+        if not backlog:
+            return 0
+        return -(-backlog // self.drain_per_minute)
@@ -0,0 +1,361 @@
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, wait
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+from helper.logger_setup import setup_logger
+
+logger = setup_logger("helper")
+
+SQS_MAX_BATCH_ENTRIES = 10
+SQS_MAX_BATCH_BYTES = 256 * 1024
+
+
+class _PendingMessage:
+    __slots__ = ("body", "size", "options", "future", "enqueued_at", "attempts")
+
+    def __init__(self, body: str, options: Dict) -> None:
+        self.body = body
+        self.size = len(body.encode("utf-8"))
+        # DelaySeconds, or MessageGroupId/MessageDeduplicationId on FIFO queues
+        self.options = options
+        self.future: Future = Future()
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+
+
+# -------------------------------------------
+# Buffered producer on top of SQSAgent
+# -------------------------------------------
+class SQSBatchSender:
+    """
+    Collects messages and sends them with send_message_batch once 10 entries or 256 KB are
+    buffered, or the oldest message has waited linger_seconds, whichever comes first.
+    submit() returns a Future resolving to the MessageId, or None once the entry failed for good.
+    Entries that SQS rejects are retried on their own with exponential backoff; sender faults are not retried.
+    """
+
+    def __init__(self, sqs_agent, linger_seconds: float = 0.2, max_retries: int = 3,
+                 retry_backoff_seconds: float = 0.2) -> None:
+        self.sqs_agent = sqs_agent
+        self.linger_seconds = linger_seconds
+        self.max_retries = max_retries
+        self.retry_backoff_seconds = retry_backoff_seconds
+
+        self._pending: List[_PendingMessage] = []
+        self._pending_bytes = 0
+        self._cond = threading.Condition()
+        self._flush_requested = False
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, message_content: Dict, delay_seconds: Optional[int] = None,
+               message_group_id: Optional[str] = None, deduplication_id: Optional[str] = None) -> Future:
+        body = self.sqs_agent.encode_message_body(message_content)
+        options = self.sqs_agent._message_options(body, delay_seconds, message_group_id, deduplication_id)
+        message = _PendingMessage(body, options)
+        if message.size > SQS_MAX_BATCH_BYTES:
+            logger.error("sqs.batch_message_too_large size=%s limit=%s", message.size, SQS_MAX_BATCH_BYTES)
+            message.future.set_result(None)
+            return message.future
+
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("SQSBatchSender is closed.")
+            self._pending.append(message)
+            self._pending_bytes += message.size
+            self._ensure_thread()
+            self._cond.notify()
+        return message.future
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Send everything buffered now; True when all of it has been sent or given up on."""
+        with self._cond:
+            futures = [message.future for message in self._pending]
+            self._flush_requested = True
+            self._cond.notify()
+        done, not_done = wait(futures, timeout=timeout)
+        return not not_done
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="sqs-batch-sender", daemon=True)
+            self._thread.start()
+
+    def _batch_full(self) -> bool:
+        return len(self._pending) >= SQS_MAX_BATCH_ENTRIES or self._pending_bytes >= SQS_MAX_BATCH_BYTES
+
+    def _take_batch(self) -> List[_PendingMessage]:
+        batch, batch_bytes = [], 0
+        while self._pending and len(batch) < SQS_MAX_BATCH_ENTRIES:
+            if batch and batch_bytes + self._pending[0].size > SQS_MAX_BATCH_BYTES:
+                break
+            message = self._pending.pop(0)
+            batch.append(message)
+            batch_bytes += message.size
+        self._pending_bytes -= batch_bytes
+        if not self._pending:
+            self._flush_requested = False
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                deadline = self._pending[0].enqueued_at + self.linger_seconds
+                while not (self._batch_full() or self._flush_requested or self._closed):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._take_batch()
+            try:
+                self._send(batch)
+            except Exception:
+                logger.exception("sqs.batch_sender_unexpected_error entries=%s", len(batch))
+                for message in batch:
+                    if not message.future.done():
+                        message.future.set_result(None)
+
+    def _send(self, batch: List[_PendingMessage]) -> None:
+        while batch:
+            entries = [
+                dict(message.options, Id=str(index), MessageBody=message.body)
+                for index, message in enumerate(batch)
+            ]
+            successful, failed = self.sqs_agent.send_sqs_message_batch(entries)
+            for entry in successful:
+                batch[int(entry["Id"])].future.set_result(entry.get("MessageId"))
+
+            retry = []
+            for entry in failed:
+                message = batch[int(entry["Id"])]
+                message.attempts += 1
+                if entry.get("SenderFault") or message.attempts > self.max_retries:
+                    logger.error("sqs.batch_entry_failed code=%s message=%s attempts=%s",
+                                 entry.get("Code"), entry.get("Message"), message.attempts)
+                    message.future.set_result(None)
+                else:
+                    retry.append(message)
+            for message in batch:
+                if not message.future.done() and message not in retry:
+                    message.future.set_result(None)
+
+            if retry:
+                attempt = max(message.attempts for message in retry)
+                time.sleep(self.retry_backoff_seconds * 2 ** (attempt - 1))
+            batch = retry
+
+
+# -------------------------------------------
+# Long-polling consumer on top of SQSAgent
+# -------------------------------------------
+class SQSBatchConsumer:
+    """
+    Long-polls up to 10 messages per receive and yields them as dicts with receipt, message_id,
+    body (already decoded) and receive_count. ack() buffers receipts and deletes them with
+    delete_message_batch once 10 are pending, before the next receive and on close().
+    get_stats() reports how long receives waited and how large the batches were.
+    """
+
+    def __init__(self, sqs_agent, max_messages: int = 10, wait_time_seconds: int = 20,
+                 visibility_timeout: Optional[int] = None) -> None:
+        self.sqs_agent = sqs_agent
+        self.max_messages = min(max_messages, SQS_MAX_BATCH_ENTRIES)
+        self.wait_time_seconds = wait_time_seconds
+        self.visibility_timeout = visibility_timeout
+
+        self._acks: List[str] = []
+        self._acks_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._receive_waits = deque(maxlen=1000)
+        self._batch_sizes = Counter()
+        self._acked = 0
+        self._ack_failures = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def receive(self) -> List[Dict]:
+        started = time.monotonic()
+        messages = self.sqs_agent.receive_sqs_messages(
+            max_messages=self.max_messages,
+            wait_time_seconds=self.wait_time_seconds,
+            visibility_timeout=self.visibility_timeout,
+        )
+        waited = time.monotonic() - started
+        for message in messages:
+            # Visibility runs from the moment SQS handed the message out
+            message["received_at"] = started
+        with self._stats_lock:
+            self._receive_waits.append(waited)
+            self._batch_sizes[len(messages)] += 1
+        return messages
+
+    def messages(self, stop_event: Optional[threading.Event] = None) -> Iterator[Dict]:
+        """Yield messages until stop_event is set; pending acks are sent before every blocking receive."""
+        while stop_event is None or not stop_event.is_set():
+            self.flush_acks()
+            for message in self.receive():
+                yield message
+
+    __iter__ = messages
+
+    def process(self, handler: Callable[[Optional[Dict]], None], lease_manager=None,
+                stop_event: Optional[threading.Event] = None) -> None:
+        """
+        Run handler(body) for every message, acking it on success. With a lease_manager the message
+        stays invisible for as long as the handler runs; a failing handler leaves it for redelivery.
+        """
+        for message in self.messages(stop_event):
+            try:
+                if lease_manager is None:
+                    handler(message["body"])
+                else:
+                    with lease_manager.lease(message):
+                        handler(message["body"])
+            except Exception:
+                logger.exception("sqs.handler_failed message_id=%s receive_count=%s",
+                                 message.get("message_id"), message.get("receive_count"))
+                continue
+            self.ack(message)
+
+    def ack(self, message: Dict) -> None:
+        with self._acks_lock:
+            self._acks.append(message["receipt"])
+            full = len(self._acks) >= SQS_MAX_BATCH_ENTRIES
+        if full:
+            self.flush_acks()
+
+    def flush_acks(self) -> int:
+        """Delete every buffered receipt; returns how many SQS confirmed."""
+        with self._acks_lock:
+            receipts, self._acks = self._acks, []
+        deleted = 0
+        for start in range(0, len(receipts), SQS_MAX_BATCH_ENTRIES):
+            ok, failed = self.sqs_agent.delete_sqs_message_batch(receipts[start:start + SQS_MAX_BATCH_ENTRIES])
+            deleted += len(ok)
+            with self._stats_lock:
+                self._acked += len(ok)
+                self._ack_failures += len(failed)
+        return deleted
+
+    def close(self) -> None:
+        self.flush_acks()
+
+    def get_stats(self) -> Dict:
+        with self._stats_lock:
+            waits = sorted(self._receive_waits)
+            batch_sizes = dict(self._batch_sizes)
+            acked, ack_failures = self._acked, self._ack_failures
+        receives = sum(batch_sizes.values())
+        return {
+            "receives": receives,
+            "empty_receives": batch_sizes.get(0, 0),
+            "messages": sum(size * count for size, count in batch_sizes.items()),
+            "batch_size_histogram": batch_sizes,
+            "avg_batch_size": (sum(size * count for size, count in batch_sizes.items()) / receives) if receives else 0.0,
+            "avg_wait_seconds": (sum(waits) / len(waits)) if waits else 0.0,
+            "p95_wait_seconds": waits[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+            "acked": acked,
+            "ack_failures": ack_failures,
+        }
+
+
+# -------------------------------------------
+# Visibility heartbeat for long-running work
+# -------------------------------------------
+class SQSLeaseManager:
+    """
+    Extends the visibility timeout of messages whose handlers are still running, so a long
+    Bedrock extraction does not let the message reappear and get processed twice.
+    One background thread serves every concurrent lease and extends them with
+    change_message_visibility_batch, up to 10 receipts per call.
+    """
+
+    def __init__(self, sqs_agent, visibility_timeout: int = 30, extend_margin: int = 10) -> None:
+        self.sqs_agent = sqs_agent
+        self.visibility_timeout = visibility_timeout
+        self.extend_margin = min(extend_margin, max(visibility_timeout // 2, 1))
+        # receipt -> monotonic time at which the message becomes visible again
+        self._leases: Dict[str, float] = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self.extensions = 0
+
+    @contextmanager
+    def lease(self, message: Dict):
+        receipt = message["receipt"]
+        with self._cond:
+            self._leases[receipt] = message.get("received_at", time.monotonic()) + self.visibility_timeout
+            self._ensure_thread()
+            self._cond.notify()
+        try:
+            yield
+        finally:
+            # Completion or failure both end the heartbeat
+            with self._cond:
+                self._leases.pop(receipt, None)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="sqs-lease-manager", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+                now = time.monotonic()
+                due = [receipt for receipt, expires in self._leases.items() if expires - now <= self.extend_margin]
+                if not due:
+                    next_due = min(self._leases.values(), default=now + self.visibility_timeout) - self.extend_margin
+                    self._cond.wait(max(next_due - now, 0.5))
+                    continue
+            self._extend(due)
+
+    def _extend(self, receipts: List[str]) -> None:
+        for start in range(0, len(receipts), SQS_MAX_BATCH_ENTRIES):
+            batch = receipts[start:start + SQS_MAX_BATCH_ENTRIES]
+            extended, failed = self.sqs_agent.change_visibility_batch(batch, self.visibility_timeout)
+            now = time.monotonic()
+            with self._cond:
+                for receipt in extended:
+                    if receipt in self._leases:
+                        self._leases[receipt] = now + self.visibility_timeout
+                        self.extensions += 1
+                for receipt in failed:
+                    # Usually an expired receipt; the message may already be with another consumer
+                    if self._leases.pop(receipt, None) is not None:
+                        logger.error("sqs.lease_extend_failed receipt_preview=%s", receipt[:20])
@@ -0,0 +1,102 @@
+import base64
+import hashlib
+import io
+import zlib
+from json import JSONDecodeError, dumps, loads
+from typing import Dict, Optional, Tuple
+
+from helper.logger_setup import setup_logger
+
+logger = setup_logger("helper")
+
+ENVELOPE_VERSION = 1
+# Bumped whenever the fields of the processing payload change
+PAYLOAD_SCHEMA_VERSION = 1
+
+ENCODING_JSON = "json"
+ENCODING_ZLIB = "zlib"
+ENCODING_CLAIM = "s3"
+
+
+def _compact(content: Dict) -> str:
+    return dumps(content, ensure_ascii=False, separators=(",", ":"))
+
+
+# -------------------------------------------
+# Versioned message envelope
+# -------------------------------------------
+class SQSEnvelopeCodec:
+    """
+    Wraps message bodies as {"v": envelope version, "s": schema version, "e": encoding, "d"/"k": data}.
+    Payloads of compress_threshold bytes or more are zlib-compressed (base64) when that is smaller;
+    envelopes still at or above claim_threshold are stored in S3 and only their key is sent (claim check).
+    Claim objects are keyed by content hash, so resending the same payload reuses the object and keeps
+    FIFO content deduplication stable. Bare JSON bodies from before the envelope decode unchanged.
+    With enabled=False encode() sends bare JSON as before, so every consumer can run the decoder
+    before producers switch to the envelope; decode() accepts both either way.
+    """
+
+    def __init__(self, claim_store=None, compress_threshold: int = 2048, claim_threshold: int = 200 * 1024,
+                 claim_prefix: str = "sqs-claims/", enabled: bool = True) -> None:
+        self.claim_store = claim_store
+        self.enabled = enabled
+        self.compress_threshold = compress_threshold
+        self.claim_threshold = claim_threshold
+        self.claim_prefix = claim_prefix
+
+    def encode(self, content: Dict, schema_version: int = PAYLOAD_SCHEMA_VERSION) -> str:
+        if not self.enabled:
+            return _compact(content)
+        raw = _compact(content).encode("utf-8")
+        envelope = {"v": ENVELOPE_VERSION, "s": schema_version, "e": ENCODING_JSON, "d": content}
+        if len(raw) >= self.compress_threshold:
+            packed = base64.b64encode(zlib.compress(raw, 6)).decode("ascii")
+            if len(packed) < len(raw):
+                envelope = {"v": ENVELOPE_VERSION, "s": schema_version, "e": ENCODING_ZLIB, "d": packed}
+
+        body = _compact(envelope)
+        if len(body.encode("utf-8")) < self.claim_threshold:
+            return body
+        if self.claim_store is None:
+            logger.error("sqs.envelope_oversize_no_claim_store bytes=%s", len(body.encode("utf-8")))
+            return body
+
+        key = f"{self.claim_prefix}{hashlib.sha256(raw).hexdigest()}.json.z"
+        if not self.claim_store.upload_fileobj_to_s3(io.BytesIO(zlib.compress(raw, 6)), key):
+            raise RuntimeError(f"Failed to store SQS claim-check payload {key}.")
+        logger.info("sqs.envelope_claim_check key=%s bytes=%s", key, len(raw))
+        return _compact({"v": ENVELOPE_VERSION, "s": schema_version, "e": ENCODING_CLAIM, "k": key})
+
+    def decode(self, body_raw: str) -> Tuple[Optional[int], Optional[Dict]]:
+        """Returns (schema_version, content); schema_version is None for bare JSON, content is None if unreadable."""
+        try:
+            envelope = loads(body_raw)
+        except (TypeError, JSONDecodeError):
+            logger.exception("sqs.envelope_json_decode_failed body_preview=%s", str(body_raw)[:200])
+            return None, None
+        if not (isinstance(envelope, dict) and "v" in envelope and "e" in envelope):
+            return None, envelope
+
+        encoding = envelope["e"]
+        try:
+            if encoding == ENCODING_JSON:
+                return envelope.get("s"), envelope["d"]
+            if encoding == ENCODING_ZLIB:
+                return envelope.get("s"), loads(zlib.decompress(base64.b64decode(envelope["d"])))
+            if encoding == ENCODING_CLAIM:
+                return envelope.get("s"), self._fetch_claim(envelope["k"])
+        except (KeyError, ValueError, zlib.error):
+            logger.exception("sqs.envelope_decode_failed encoding=%s", encoding)
+            return envelope.get("s"), None
+        logger.error("sqs.envelope_unknown_encoding encoding=%s version=%s", encoding, envelope.get("v"))
+        return envelope.get("s"), None
+
+    def _fetch_claim(self, key: str) -> Optional[Dict]:
+        if self.claim_store is None:
+            logger.error("sqs.envelope_claim_no_store key=%s", key)
+            return None
+        blob = self.claim_store.get_object_from_s3(key)
+        if blob is None:
+            logger.error("sqs.envelope_claim_missing key=%s", key)
+            return None
+        return loads(zlib.decompress(blob))
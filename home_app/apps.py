@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class HomeAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'home_app'
+
+    def ready(self):
+        from config.configuration import ConfigurationCenter
+        from helper.bedrock_usage import get_usage_aggregator
+
+        flag = ConfigurationCenter().get_parameter('bedrock_configuration', 'usage_db_logging') or ''
+        if flag.strip().lower() in ('1', 'true', 'yes', 'on'):
+            from .usage import log_bedrock_call
+            get_usage_aggregator().add_sink(log_bedrock_call)
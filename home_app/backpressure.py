@@ -0,0 +1,53 @@
+from datetime import timedelta
+from typing import Optional, Tuple
+from django.utils import timezone
+
+from config.configuration import ConfigurationCenter
+from helper.logger_setup import setup_logger
+from helper.sqs_backpressure import BackpressurePolicy, MODE_NORMAL, MODE_RATE_LIMITED
+from .models import UploadEventOutbox, UploadedFile
+
+logger = setup_logger('home_app')
+
+_minicenter = ConfigurationCenter()
+UPLOADS_PER_MINUTE = int(_minicenter.get_parameter('sqs_configuration', 'backpressure_uploads_per_minute') or 2)
+_policy = BackpressurePolicy(
+    defer_backlog=int(_minicenter.get_parameter('sqs_configuration', 'backpressure_defer_backlog') or 500),
+    rate_limit_backlog=int(_minicenter.get_parameter('sqs_configuration', 'backpressure_rate_limit_backlog') or 2000),
+    drain_per_minute=int(_minicenter.get_parameter('sqs_configuration', 'processing_rate_per_minute') or 60),
+)
+
+
+def _uploads_last_minute(user_id) -> int:
+    # Counted in the database so the limit holds across Uvicorn workers and ECS tasks, not per process
+    since = timezone.now() - timedelta(minutes=1)
+    return UploadedFile.objects.filter(user_id=user_id, uploadtime__gte=since).count()
+
+
+def _unrelayed_events() -> int:
+    # Accepted uploads the outbox relay has not handed to SQS yet; served by the partial outbox_unsent_idx
+    return UploadEventOutbox.objects.filter(sent_at__isnull=True, dead_at__isnull=True).count()
+
+
+def upload_admission(boto3_agent, user_id) -> Tuple[bool, Optional[str]]:
+    """
+    Decide whether a new upload is accepted while the processing queue is backed up.
+    Returns (accepted, notice); notice tells the user the expected processing delay and is None when the queue keeps up.
+    The backlog is the cached queue depth plus the outbox rows still waiting for the relay, so this never calls SQS itself.
+    While the depth is unknown (before the first refresh, or SQS unreachable) only the outbox rows count.
+    """
+    depth = boto3_agent.get_sqs_depth_probe().backlog()
+    backlog = (depth or 0) + _unrelayed_events()
+    mode = _policy.mode(backlog)
+    if mode == MODE_NORMAL:
+        return True, None
+
+    minutes = _policy.expected_delay_minutes(backlog)
+    # The upload being admitted is not stored yet, so reaching the limit already rejects it
+    if mode == MODE_RATE_LIMITED and _uploads_last_minute(user_id) >= UPLOADS_PER_MINUTE:
+        logger.warning("Upload rate limited for user %s, queue backlog %s", user_id, backlog)
+        return False, (f'Document processing is heavily backed up (about {minutes} minutes). '
+                       f'Uploads are limited to {UPLOADS_PER_MINUTE} per minute, please try again shortly.')
+
+    logger.info("Upload accepted in %s mode for user %s, queue backlog %s", mode, user_id, backlog)
+    return True, f'Processing is running behind; your document should be processed in about {minutes} minutes.'
@@ -0,0 +1,221 @@
+import json
+import re
+from collections import Counter
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from config.configuration import ConfigurationCenter
+from helper.logger_setup import setup_logger
+from .models import LebenslaufMetadata
+
+logger = setup_logger('home_app')
+
+'''
+Map-reduce extraction of CV data for long documents.
+The text is split into token-budgeted chunks, every chunk is extracted concurrently through
+BedrockAgent.ask_batch, and the partial results are merged into one dict shaped like
+LebenslaufMetadata. Merging is deterministic: the same chunk answers always give the same result.
+'''
+
+_minicenter = ConfigurationCenter()
+CHUNK_TOKENS = int(_minicenter.get_parameter('bedrock_configuration', 'extraction_chunk_tokens') or 3000)
+CHUNK_OVERLAP_TOKENS = int(_minicenter.get_parameter('bedrock_configuration', 'extraction_chunk_overlap_tokens') or 150)
+CHUNK_MAX_TOKENS = int(_minicenter.get_parameter('bedrock_configuration', 'extraction_max_tokens') or 2000)
+CHARS_PER_TOKEN = 4
+
+CONTACT_FIELDS = ['name', 'primary_phone', 'primary_email', 'urls', 'linkedin', 'github',
+                  'fulladdress', 'city', 'postal_code', 'country', 'birthday']
+EXPERIENCE_KEYS = ['company', 'title', 'start_date', 'end_date', 'location', 'description']
+
+PROMPT_TEMPLATE = """You extract data from part {part} of {parts} of a CV (Lebenslauf).
+Return only one JSON object with these keys, using null for anything this part does not state:
+{contact_keys}, "urls" as a list of strings, "birthday" as YYYY-MM-DD,
+and "workexperiance" as a list of objects with {experience_keys} (dates as YYYY-MM or YYYY-MM-DD).
+Only report what appears in this part; do not guess.
+
+CV text:
+<<<
+{text}
+>>>"""
+
+_blank_lines = re.compile(r"\n\s*\n")
+_iso_date = re.compile(r"^(\d{4})(?:-(\d{1,2}))?(?:-(\d{1,2}))?")
+_month_year = re.compile(r"^(\d{1,2})[./](\d{4})")
+
+
+def split_into_chunks(text: str, chunk_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> List[str]:
+    """
+    Split on paragraph, then line boundaries into chunks of at most chunk_tokens; each chunk repeats the tail
+    of the previous one, and that overlap counts against the budget.
+    """
+    limit = max(chunk_tokens, 1) * CHARS_PER_TOKEN
+    overlap = min(overlap_tokens * CHARS_PER_TOKEN, limit // 4)
+    # Any piece must still fit after a chunk that starts with the overlap and a paragraph break
+    piece_limit = max(limit - overlap - 2, 1)
+
+    pieces = []
+    for paragraph in _blank_lines.split(text.strip()):
+        if len(paragraph) <= piece_limit:
+            pieces.append(paragraph)
+            continue
+        for line in paragraph.splitlines():
+            # A single line longer than a piece is cut hard
+            pieces.extend(line[start:start + piece_limit] for start in range(0, len(line), piece_limit))
+
+    chunks, current = [], ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 2 > limit:
+            chunks.append(current)
+            current = current[-overlap:] if overlap else ""
+        current = f"{current}\n\n{piece}" if current else piece
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+
+def _parse_chunk_answer(answer: str) -> Optional[Dict]:
+    start, end = answer.find("{"), answer.rfind("}")
+    if start < 0 or end <= start:
+        return None
+    try:
+        parsed = json.loads(answer[start:end + 1])
+    except ValueError:
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
+
+def _clean(value) -> Optional[str]:
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value if value and value.lower() not in ('null', 'none', 'n/a', '-') else None
+
+
+def _comparison_key(field: str, value: str) -> str:
+    if field == 'primary_phone':
+        return re.sub(r"[^\d+]", "", value)
+    if field in ('primary_email', 'urls', 'linkedin', 'github'):
+        return value.lower().rstrip('/')
+    return " ".join(value.lower().split())
+
+
+def _merge_contact_field(field: str, candidates: List[Tuple[int, str]]) -> Optional[str]:
+    """Most frequent value across chunks; ties go to the earliest chunk, where CV headers usually are."""
+    if not candidates:
+        return None
+    votes = Counter(_comparison_key(field, value) for _, value in candidates)
+    first_seen = {}
+    for index, value in candidates:
+        first_seen.setdefault(_comparison_key(field, value), (index, value))
+    best = min(votes, key=lambda key: (-votes[key], first_seen[key][0], key))
+    return first_seen[best][1]
+
+
+def _fit_to_model(field: str, value: Optional[str]) -> Optional[str]:
+    if value is None:
+        return None
+    if field == 'birthday':
+        try:
+            return date.fromisoformat(value[:10]).isoformat()
+        except ValueError:
+            return None
+    max_length = LebenslaufMetadata._meta.get_field(field).max_length
+    return value[:max_length] if max_length else value
+
+
+def _merge_experience(partials: List[Tuple[int, List]]) -> List[Dict]:
+    """Union of all positions; overlapping chunks report the same position, which is merged key by key."""
+    merged: Dict[Tuple, Dict] = {}
+    for _, entries in partials:
+        for entry in entries or []:
+            if not isinstance(entry, dict):
+                continue
+            item = {key: _clean(entry.get(key)) for key in EXPERIENCE_KEYS}
+            if not (item['company'] or item['title']):
+                continue
+            identity = tuple(" ".join((item[key] or "").lower().split()) for key in ('company', 'title', 'start_date'))
+            existing = merged.get(identity)
+            if existing is None:
+                merged[identity] = item
+                continue
+            for key in EXPERIENCE_KEYS:
+                # Keep the earlier chunk's value, except that a longer description wins
+                if existing[key] is None or (key == 'description' and item[key] and len(item[key]) > len(existing[key])):
+                    existing[key] = item[key] if item[key] is not None else existing[key]
+    # Most recent first; fully ordered so the result does not depend on chunk completion order
+    def _order(item):
+        parsed = _date_parts(item['start_date'])
+        newest_first = tuple(-part for part in parsed) if parsed else ()
+        return (item['start_date'] is None, parsed is None, newest_first, item['start_date'] or '',
+                item['company'] or '', item['title'] or '')
+
+    return sorted(merged.values(), key=_order)
+
+
+def _date_parts(value: Optional[str]) -> Optional[Tuple[int, int, int]]:
+    """(year, month, day) of "YYYY", "YYYY-MM", "YYYY-MM-DD" or "MM/YYYY"; a missing month or day is 0."""
+    if not value:
+        return None
+    match = _iso_date.match(value)
+    if match:
+        return tuple(int(part or 0) for part in match.groups())
+    match = _month_year.match(value)
+    if match:
+        return int(match.group(2)), int(match.group(1)), 0
+    return None
+
+
+def merge_partials(partials: List[Tuple[int, Dict]]) -> Dict:
+    """Merge per-chunk answers (chunk index, parsed JSON) into one LebenslaufMetadata-shaped dict."""
+    partials = sorted(partials, key=lambda item: item[0])
+    result = {}
+    for field in CONTACT_FIELDS:
+        if field == 'urls':
+            seen = {}
+            for _, partial in partials:
+                urls = partial.get('urls') or []
+                for url in urls if isinstance(urls, list) else [urls]:
+                    url = _clean(url)
+                    if url:
+                        seen.setdefault(_comparison_key('urls', url), url)
+            result['urls'] = "\n".join(seen.values()) or None
+            continue
+        candidates = [(index, value) for index, partial in partials if (value := _clean(partial.get(field)))]
+        result[field] = _fit_to_model(field, _merge_contact_field(field, candidates))
+    result['workexperiance'] = _merge_experience([(index, partial.get('workexperiance')) for index, partial in partials])
+    return result
+
+
+def extract_lebenslauf(boto3_agent, text: str, chunk_tokens: int = CHUNK_TOKENS,
+                       max_tokens: int = CHUNK_MAX_TOKENS) -> Tuple[Dict, List[str]]:
+    """
+    Extract LebenslaufMetadata fields from a CV's text with one Bedrock call per chunk, run concurrently.
+    Returns (fields, errors); fields merges every chunk that answered with valid JSON, errors names the ones that did not.
+    """
+    chunks = split_into_chunks(text, chunk_tokens)
+    if not chunks:
+        return merge_partials([]), []
+    prompts = [
+        PROMPT_TEMPLATE.format(part=index + 1, parts=len(chunks), text=chunk,
+                               contact_keys=", ".join(f'"{field}"' for field in CONTACT_FIELDS if field != 'urls'),
+                               experience_keys=", ".join(f'"{key}"' for key in EXPERIENCE_KEYS))
+        for index, chunk in enumerate(chunks)
+    ]
+    answers = boto3_agent.ask_batch(prompts, max_tokens=max_tokens, temperature=0.0, caller='cv_extraction')
+
+    partials, errors = [], []
+    for index, answer in enumerate(answers):
+        if answer['error']:
+            errors.append(f"chunk {index + 1}: {answer['error']}")
+            continue
+        parsed = _parse_chunk_answer(answer['response'] or "")
+        if parsed is None:
+            errors.append(f"chunk {index + 1}: response was not a JSON object")
+            continue
+        partials.append((index, parsed))
+
+    if errors:
+        logger.warning("CV extraction: %s of %s chunks failed: %s", len(errors), len(chunks), errors)
+    fields = merge_partials(partials)
+    logger.info("CV extraction merged %s of %s chunks, %s work experience entries", len(partials), len(chunks), len(fields['workexperiance']))
+    return fields, errors
@@ -16,3 +16,9 @@ class lebenslaufMetadataForm(forms.ModelForm):
             'user': forms.HiddenInput(),
             'file_key': forms.HiddenInput(),
         }
+
+class PresignedUploadForm(forms.Form):
+    filename = forms.CharField(max_length=150)
+    filetype = forms.ChoiceField(choices=UploadedFile.FILE_TYPES)
+    size = forms.IntegerField(min_value=1)
+    content_type = forms.CharField(max_length=100)
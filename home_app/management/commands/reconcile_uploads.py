@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from home_app.models import UploadedFile
+from home_app.storage import get_document_storage, reconcile_local_uploads
+
+
+class Command(BaseCommand):
+    help = "Upload local copies of documents missing from S3, then remove the local copies under MEDIA_ROOT."
+
+    def handle(self, *args, **options):
+        reconciled, uploaded, missing = reconcile_local_uploads(UploadedFile, get_document_storage(), settings.MEDIA_ROOT)
+        self.stdout.write(f"reconciled={reconciled} uploaded={uploaded} missing={missing}")
@@ -0,0 +1,34 @@
+import time
+from django.core.management.base import BaseCommand
+
+from helper.aws_boto3_agent import get_aws_agent
+from helper.logger_setup import setup_logger
+from home_app.outbox import relay_pending_events
+
+logger = setup_logger('home_app')
+
+
+class Command(BaseCommand):
+    help = "Relay unsent upload events from the outbox table to SQS in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Drain the outbox once and exit.")
+        parser.add_argument("--interval", type=float, default=1.0, help="Seconds to sleep when the outbox is empty.")
+        parser.add_argument("--batch-size", type=int, default=10, help="Events per SQS batch (max 10).")
+
+    def handle(self, *args, **options):
+        agent = get_aws_agent()
+        total = 0
+        while True:
+            try:
+                sent = relay_pending_events(agent, batch_size=options["batch_size"])
+            except Exception:
+                logger.exception("Outbox relay iteration failed")
+                sent = 0
+            total += sent
+            if sent:
+                continue
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
+        self.stdout.write(f"relayed={total}")
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.5 on 2026-10-17 10:02
+
+from django.db import migrations, models
+from django.db.models import F
+
+import home_app.storage
+
+
+def point_filelocation_at_s3_key(apps, schema_editor):
+    UploadedFile = apps.get_model('home_app', 'UploadedFile')
+    # DB only: the local copies are re-uploaded if needed and removed by `manage.py reconcile_uploads`
+    (UploadedFile.objects.using(schema_editor.connection.alias)
+     .exclude(filelocation=F('file_address_key'))
+     .update(legacy_filelocation=F('filelocation'), filelocation=F('file_address_key')))
+
+
+def restore_local_filelocation(apps, schema_editor):
+    UploadedFile = apps.get_model('home_app', 'UploadedFile')
+    (UploadedFile.objects.using(schema_editor.connection.alias)
+     .filter(legacy_filelocation__isnull=False)
+     .update(filelocation=F('legacy_filelocation'), legacy_filelocation=None))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home_app', '0002_uploadedfile_file_hash'),
+    ]
+
+    operations = [
+        # Widened to file_address_key's length before the UPDATE below copies the keys in
+        migrations.AlterField(
+            model_name='uploadedfile',
+            name='filelocation',
+            field=models.FileField(max_length=200, storage=home_app.storage.get_document_storage, upload_to='uploaded_documents/%Y/%m/%d/'),
+        ),
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='legacy_filelocation',
+            field=models.CharField(blank=True, editable=False, max_length=255, null=True),
+        ),
+        migrations.RunPython(point_filelocation_at_s3_key, restore_local_filelocation),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-17 11:40
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home_app', '0003_s3_document_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadEventOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('file_key', models.CharField(max_length=200)),
+                ('payload', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('sqs_message_id', models.CharField(blank=True, max_length=100, null=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'upload_event_outbox',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(condition=models.Q(('sent_at__isnull', True)), fields=['created_at'], name='outbox_unsent_idx')],
+            },
+        ),
+    ]
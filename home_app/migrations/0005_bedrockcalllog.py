@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-17 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home_app', '0004_uploadeventoutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BedrockCallLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_id', models.CharField(max_length=255)),
+                ('caller', models.CharField(max_length=100)),
+                ('input_tokens', models.PositiveIntegerField(default=0)),
+                ('output_tokens', models.PositiveIntegerField(default=0)),
+                ('server_latency_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('client_latency_ms', models.PositiveIntegerField()),
+                ('error', models.CharField(blank=True, max_length=100, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'bedrock_call_log',
+                'indexes': [models.Index(fields=['model_id', 'created_at'], name='bedrock_call_model_idx'), models.Index(fields=['caller', 'created_at'], name='bedrock_call_caller_idx')],
+            },
+        ),
+    ]
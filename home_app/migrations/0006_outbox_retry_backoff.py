@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-17 16:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home_app', '0005_bedrockcalllog'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='uploadeventoutbox',
+            name='outbox_unsent_idx',
+        ),
+        migrations.AddField(
+            model_name='uploadeventoutbox',
+            name='dead_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='uploadeventoutbox',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='uploadeventoutbox',
+            index=models.Index(condition=models.Q(('dead_at__isnull', True), ('sent_at__isnull', True)), fields=['created_at'], name='outbox_unsent_idx'),
+        ),
+    ]
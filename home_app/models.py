@@ -1,5 +1,7 @@
+import uuid
 from django.db import models
 from accounts_app.models import User
+from .storage import get_document_storage
 
 
 class UploadedFile(models.Model):
@@ -11,8 +13,13 @@ class UploadedFile(models.Model):
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="uploads")
     filetype = models.CharField(max_length=20, choices=FILE_TYPES)
-    filelocation = models.FileField(upload_to="uploaded_documents/%Y/%m/%d/")
+    # S3 is the only storage; views set the name to file_address_key so the file is never written twice
+    filelocation = models.FileField(upload_to="uploaded_documents/%Y/%m/%d/", storage=get_document_storage, max_length=200)
+    # Pre-S3 path under MEDIA_ROOT, kept by migration 0003 until `manage.py reconcile_uploads` cleans it up
+    legacy_filelocation = models.CharField(max_length=255, blank=True, null=True, editable=False)
     file_address_key = models.CharField(max_length=200,primary_key=True)
+    # SHA-256 hex digest of the uploaded bytes, used to skip re-processing identical uploads
+    file_hash = models.CharField(max_length=64, blank=True, null=True)
     uploadtime = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -22,6 +29,7 @@ class UploadedFile(models.Model):
         indexes = [
             models.Index(fields=["user"]),
             models.Index(fields=["-uploadtime"]),
+            models.Index(fields=["user", "file_hash"], name="home_app_up_user_hash_idx"),
         ]
 
     def __str__(self):
@@ -64,3 +72,52 @@ class LebenslaufMetadata(models.Model):
         constraints = [
             models.UniqueConstraint(fields=["file_key"], name="uq_lebenslauf_metadata_file_key")
         ]
+
+
+class UploadEventOutbox(models.Model):
+    """Upload events written in the upload's DB transaction and relayed to SQS by `manage.py relay_outbox`."""
+    # Sent with every delivery attempt so consumers can drop duplicates
+    event_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    file_key = models.CharField(max_length=200)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+    sqs_message_id = models.CharField(max_length=100, blank=True, null=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, null=True)
+    # A failed event is retried with exponential backoff and given up on after outbox_max_attempts
+    next_attempt_at = models.DateTimeField(blank=True, null=True)
+    dead_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = "upload_event_outbox"
+        ordering = ["created_at"]
+        indexes = [
+            models.Index(fields=["created_at"], name="outbox_unsent_idx",
+                         condition=models.Q(sent_at__isnull=True, dead_at__isnull=True)),
+        ]
+
+    def __str__(self):
+        return f"{self.event_id} ({self.file_key})"
+
+
+class BedrockCallLog(models.Model):
+    """One Bedrock call with its token usage and latency, written when usage_db_logging is enabled."""
+    model_id = models.CharField(max_length=255)
+    caller = models.CharField(max_length=100)
+    input_tokens = models.PositiveIntegerField(default=0)
+    output_tokens = models.PositiveIntegerField(default=0)
+    server_latency_ms = models.PositiveIntegerField(blank=True, null=True)
+    client_latency_ms = models.PositiveIntegerField()
+    error = models.CharField(max_length=100, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "bedrock_call_log"
+        indexes = [
+            models.Index(fields=["model_id", "created_at"], name="bedrock_call_model_idx"),
+            models.Index(fields=["caller", "created_at"], name="bedrock_call_caller_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.caller} via {self.model_id} ({self.input_tokens}+{self.output_tokens} tokens)"
@@ -0,0 +1,89 @@
+from datetime import timedelta
+from typing import List
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from config.configuration import ConfigurationCenter
+from helper.logger_setup import setup_logger
+from .models import UploadEventOutbox, UploadedFile
+from .services import Local_Supporter
+
+logger = setup_logger('home_app')
+
+SQS_BATCH_SIZE = 10
+
+_minicenter = ConfigurationCenter()
+MAX_ATTEMPTS = int(_minicenter.get_parameter('sqs_configuration', 'outbox_max_attempts') or 20)
+RETRY_BASE_SECONDS = float(_minicenter.get_parameter('sqs_configuration', 'outbox_retry_base_seconds') or 5)
+RETRY_MAX_SECONDS = float(_minicenter.get_parameter('sqs_configuration', 'outbox_retry_max_seconds') or 900)
+
+
+def enqueue_upload_event(instance: UploadedFile) -> UploadEventOutbox:
+    """Record the processing event for an upload; call inside the transaction that saves the upload."""
+    event = UploadEventOutbox(file_key=instance.file_address_key)
+    payload = Local_Supporter.clean_dict_for_sqs(instance)
+    payload["event_id"] = str(event.event_id)
+    event.payload = payload
+    event.save()
+    return event
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Backoff before the next try of an event that has failed `attempts` times."""
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS))
+
+
+def relay_pending_events(boto3_agent, batch_size: int = SQS_BATCH_SIZE, max_attempts: int = MAX_ATTEMPTS) -> int:
+    """
+    Send one batch of unsent events to SQS and mark what SQS accepted; returns how many were sent.
+    Rows are locked with SKIP LOCKED so several relays can run side by side. Delivery is at-least-once:
+    if marking fails after SQS accepted the batch the events go out again with the same event_id.
+    A failed event waits out its backoff while newer events go ahead, and is marked dead after max_attempts.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        events: List[UploadEventOutbox] = list(
+            UploadEventOutbox.objects.select_for_update(skip_locked=True)
+            .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now),
+                    sent_at__isnull=True, dead_at__isnull=True)
+            .order_by("created_at")[:min(batch_size, SQS_BATCH_SIZE)]
+        )
+        if not events:
+            return 0
+
+        entries, unbuildable = [], []
+        for index, event in enumerate(events):
+            # One event that cannot be encoded (e.g. its claim-check upload fails) must not hold back the rest
+            try:
+                entries.append(boto3_agent.build_sqs_batch_entry(
+                    str(index), event.payload, attributes={"event_id": str(event.event_id)},
+                    message_group_id=Local_Supporter.message_group_id(event.payload),
+                    deduplication_id=str(event.event_id),
+                ))
+            except Exception as e:
+                unbuildable.append({"Id": str(index), "Code": type(e).__name__, "Message": str(e)})
+        successful, failed = boto3_agent.send_sqs_message_batch(entries) if entries else ([], [])
+        failed = unbuildable + list(failed)
+
+        now = timezone.now()
+        for entry in successful:
+            event = events[int(entry["Id"])]
+            event.sent_at = now
+            event.sqs_message_id = entry.get("MessageId")
+            event.attempts += 1
+        for entry in failed:
+            event = events[int(entry["Id"])]
+            event.attempts += 1
+            event.last_error = f"{entry.get('Code')}: {entry.get('Message')}"
+            if event.attempts >= max_attempts:
+                event.dead_at = now
+                logger.error("Outbox event %s given up after %s attempts: %s", event.event_id, event.attempts, event.last_error)
+            else:
+                event.next_attempt_at = now + retry_delay(event.attempts)
+                logger.error("Outbox event %s failed to send (attempt %s): %s", event.event_id, event.attempts, event.last_error)
+        UploadEventOutbox.objects.bulk_update(
+            events, ["sent_at", "sqs_message_id", "attempts", "last_error", "next_attempt_at", "dead_at"])
+
+    logger.info("Outbox relayed %s of %s events", len(successful), len(events))
+    return len(successful)
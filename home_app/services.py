@@ -1,7 +1,8 @@
 from config.configuration import ConfigurationCenter
 config_center = ConfigurationCenter()
 from helper.logger_setup import setup_logger
-from typing import List,Dict
+from typing import List,Dict,Optional
+import hashlib
 import re
 from django.forms.models import model_to_dict
 from .models import UploadedFile
@@ -10,6 +11,8 @@ from .models import UploadedFile
 
 logger = setup_logger('home_app')
 extention_compiler=re.compile(r".*\.([A-z]*)")
+# none | user | user_filetype: how processing messages are split into FIFO message groups
+FAIR_SHARE_MODE=(config_center.get_parameter("sqs_configuration","fair_share_mode") or "none").strip().lower()
 
 class Local_Supporter:
 
@@ -27,11 +30,29 @@ class Local_Supporter:
              return True
         return False
          
+    @staticmethod
+    def file_sha256(uploaded_file)->str:
+        digest=hashlib.sha256()
+        uploaded_file.seek(0)
+        for chunk in uploaded_file.chunks():
+            digest.update(chunk)
+        uploaded_file.seek(0)
+        return digest.hexdigest()
+
     @staticmethod
     def clean_dict_for_sqs(message_to_clean:UploadedFile)->Dict:
         converted_to_dict=model_to_dict(message_to_clean)
         converted_to_dict.pop("filelocation",None)
         return converted_to_dict
+
+    @staticmethod
+    def message_group_id(message_dict:Dict)->Optional[str]:
+        """FIFO message group for a processing message, so one user's bulk upload only holds up their own group."""
+        if FAIR_SHARE_MODE=="user":
+            return f"user-{message_dict.get('user')}"
+        if FAIR_SHARE_MODE=="user_filetype":
+            return f"user-{message_dict.get('user')}:{message_dict.get('filetype')}"
+        return None
          
          
         
@@ -69,10 +69,10 @@ class FileUploadService:
     """Service for handling file uploads."""
     
     def __init__(self):
-        from helper.aws_boto3_agent import AWSBoto3Agent
+        from helper.aws_boto3_agent import get_aws_agent
         from config.configuration import ConfigurationCenter
         
-        self.aws_agent = AWSBoto3Agent()
+        self.aws_agent = get_aws_agent()
         self.config_center = ConfigurationCenter()
     
     def upload_to_s3(self, file_obj, filename: str) -> Dict[str, Any]:
@@ -107,7 +107,11 @@ class FileUploadService:
             from .services import Local_Supporter  # Your existing service
             
             message_dict = Local_Supporter.clean_dict_for_sqs(file_instance)
-            success = self.aws_agent.send_sqs_message(message_dict)
+            success = self.aws_agent.send_sqs_message(
+                message_dict,
+                message_group_id=Local_Supporter.message_group_id(message_dict),
+                deduplication_id=file_instance.file_address_key,
+            )
             
             if success:
                 return {
@@ -0,0 +1,104 @@
+from pathlib import Path
+from django.core.files.base import ContentFile
+from django.core.files.storage import Storage
+from django.utils.deconstruct import deconstructible
+
+from helper.logger_setup import setup_logger
+
+logger = setup_logger('home_app')
+
+
+@deconstructible
+class S3AgentStorage(Storage):
+    """
+    Storage backend that keeps documents in S3 only, through AWSBoto3Agent.
+    Names are S3 object keys; nothing is ever written to MEDIA_ROOT.
+    """
+
+    def __init__(self, agent=None):
+        self._agent = agent
+
+    @property
+    def agent(self):
+        if self._agent is not None:
+            return self._agent
+        # Not cached here: get_aws_agent() owns the process-wide instance, so a replaced agent is picked up
+        from helper.aws_boto3_agent import get_aws_agent
+        return get_aws_agent()
+
+    def _open(self, name, mode='rb'):
+        blob = self.agent.get_object_from_s3(name)
+        if blob is None:
+            raise FileNotFoundError(f"S3 object not found: {name}")
+        return ContentFile(blob, name=name)
+
+    def _save(self, name, content):
+        if not self.agent.upload_fileobj_to_s3(content, name):
+            raise OSError(f"Failed to store {name} in S3.")
+        return name
+
+    def delete(self, name):
+        self.agent.delete_fileobj_from_s3(file_key=name)
+
+    def exists(self, name):
+        return self.agent.head_object_in_s3(name) is not None
+
+    def size(self, name):
+        head = self.agent.head_object_in_s3(name)
+        if head is None:
+            raise FileNotFoundError(f"S3 object not found: {name}")
+        return head.get('ContentLength', 0)
+
+    def url(self, name):
+        return self.agent.generate_presigned_download(name)
+
+    def get_modified_time(self, name):
+        head = self.agent.head_object_in_s3(name)
+        if head is None:
+            raise FileNotFoundError(f"S3 object not found: {name}")
+        return head.get('LastModified')
+
+
+_document_storage = None
+
+
+def get_document_storage():
+    """Callable storage for UploadedFile.filelocation, so the AWS agent is only built when first used."""
+    global _document_storage
+    if _document_storage is None:
+        _document_storage = S3AgentStorage()
+    return _document_storage
+
+
+def reconcile_local_uploads(uploaded_file_model, storage, media_root, using='default'):
+    """
+    Finish the move to S3 for rows migration 0003 left with a legacy_filelocation: upload the local copy
+    under media_root when the S3 object is missing, then remove the local copy and clear the column.
+    Rows that are neither in S3 nor on disk keep their legacy_filelocation and are counted as missing.
+    Returns (reconciled, uploaded, missing) counts.
+    """
+    reconciled = uploaded = missing = 0
+    media_root = Path(media_root)
+    for row in uploaded_file_model.objects.using(using).filter(legacy_filelocation__isnull=False).iterator():
+        local_path = media_root / row.legacy_filelocation if row.legacy_filelocation else None
+        has_local = local_path is not None and local_path.is_file()
+
+        if not storage.exists(row.file_address_key):
+            if not has_local:
+                logger.error("Reconcile: %s is neither in S3 nor in %s", row.file_address_key, media_root)
+                missing += 1
+                continue
+            with open(local_path, 'rb') as fh:
+                if not storage.agent.upload_fileobj_to_s3(fh, row.file_address_key):
+                    logger.error("Reconcile: failed to upload local copy %s to %s", local_path, row.file_address_key)
+                    missing += 1
+                    continue
+            uploaded += 1
+
+        uploaded_file_model.objects.using(using).filter(pk=row.pk).update(legacy_filelocation=None)
+        if has_local:
+            local_path.unlink()
+        reconciled += 1
+
+    logger.info("Reconcile done: reconciled=%s uploaded=%s missing=%s", reconciled, uploaded, missing)
+    return reconciled, uploaded, missing
@@ -1,3 +1,1370 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from botocore.exceptions import ClientError, EventStreamError
+from django.contrib.messages import get_messages
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.utils import timezone
+
+from accounts_app.models import User
+
+from helper import aws_boto3_agent, aws_executor, bedrock_batch, bedrock_cache, bedrock_routing
+from helper.aws_boto3_agent import BedrockAgent, S3Agent, attachment_disposition
+from helper.bedrock_batch import BURST_SECONDS, TokenBucketPacer, is_throttle, run_batch
+from helper.bedrock_cache import ResponseCache
+from helper.bedrock_discovery import ModelDiscoveryCache
+from helper.bedrock_routing import ModelRouter, is_failover_error, parse_routes
+from helper.bedrock_streaming import BedrockStream, BedrockStreamError
+from helper.sqs_batching import SQSBatchConsumer, SQSBatchSender, SQSLeaseManager
+from helper.sqs_envelope import ENCODING_CLAIM, ENCODING_JSON, ENCODING_ZLIB, PAYLOAD_SCHEMA_VERSION, SQSEnvelopeCodec
+
+from . import backpressure, outbox, upload_handlers, views
+from .extraction import extract_lebenslauf, merge_partials, split_into_chunks
+from .models import BedrockCallLog, LebenslaufMetadata, UploadEventOutbox, UploadedFile
+from .usage import BedrockCallLogWriter
+
+
+def _client_error(code, operation="HeadBucket"):
+    return ClientError({"Error": {"Code": code, "Message": code}}, operation)
+
+
+class S3BucketCacheTests(SimpleTestCase):
+    def setUp(self):
+        S3Agent.invalidate_bucket_cache()
+        self.client = mock.Mock()
+        patcher = mock.patch.object(aws_boto3_agent.boto3, "client", return_value=self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(S3Agent.invalidate_bucket_cache)
+
+    def _agent(self, ttl=300):
+        return S3Agent(None, "bucket-a", region="eu-central-1", bucket_cache_ttl=ttl)
+
+    def test_bucket_is_checked_once_within_the_ttl(self):
+        agent = self._agent()
+        for n in range(3):
+            self.assertTrue(agent.upload_fileobj_to_s3(SimpleUploadedFile("cv.pdf", b"%PDF-1.7"), f"k{n}"))
+        self.assertEqual(self.client.head_bucket.call_count, 1)
+        # Other S3Agents in the process share the cached state
+        self.assertTrue(self._agent().copy_object_in_s3("k0", "k9"))
+        self.assertEqual(self.client.head_bucket.call_count, 1)
+
+    def test_zero_ttl_checks_the_bucket_every_time(self):
+        agent = self._agent(ttl=0)
+        agent.copy_object_in_s3("k0", "k1")
+        agent.copy_object_in_s3("k0", "k2")
+        self.assertEqual(self.client.head_bucket.call_count, 2)
+
+    def test_failed_check_is_not_cached(self):
+        self.client.head_bucket.side_effect = [_client_error("AccessDenied"), {}]
+        agent = self._agent()
+        self.assertFalse(agent.copy_object_in_s3("k0", "k1"))
+        self.assertTrue(agent.copy_object_in_s3("k0", "k1"))
+        self.assertEqual(self.client.head_bucket.call_count, 2)
+
+    def test_no_such_bucket_drops_the_cache_recreates_and_retries_once(self):
+        agent = self._agent()
+        agent.copy_object_in_s3("k0", "k1")
+        self.client.copy_object.side_effect = [_client_error("NoSuchBucket", "CopyObject"), {}]
+        self.client.head_bucket.side_effect = _client_error("404")
+        rechecks = S3Agent.get_bucket_cache_stats()["rechecks"]
+        self.assertTrue(agent.copy_object_in_s3("k0", "k2"))
+        self.client.create_bucket.assert_called_once_with(
+            Bucket="bucket-a", CreateBucketConfiguration={"LocationConstraint": "eu-central-1"})
+        self.assertEqual(self.client.copy_object.call_count, 3)
+        self.assertEqual(S3Agent.get_bucket_cache_stats()["rechecks"], rechecks + 1)
+
+    def test_no_such_bucket_is_not_retried_when_the_recheck_fails(self):
+        agent = self._agent()
+        agent.copy_object_in_s3("k0", "k1")
+        self.client.copy_object.side_effect = _client_error("NoSuchBucket", "CopyObject")
+        self.client.head_bucket.side_effect = _client_error("AccessDenied")
+        self.assertFalse(agent.copy_object_in_s3("k0", "k2"))
+        self.assertEqual(self.client.copy_object.call_count, 2)
+
+
+
+class GetAwsAgentTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(aws_boto3_agent, "_agent", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = mock.patch.object(aws_boto3_agent.boto3, "client").start()
+        self.addCleanup(mock.patch.stopall)
+
+    def _services(self):
+        return [call.args[0] for call in self.client.call_args_list]
+
+    def test_agent_is_built_without_aws_clients(self):
+        agent = aws_boto3_agent.get_aws_agent()
+        self.assertIs(aws_boto3_agent.get_aws_agent(), agent)
+        self.assertEqual(self._services(), [])
+
+    def test_upload_builds_only_the_s3_client(self):
+        S3Agent.invalidate_bucket_cache()
+        self.addCleanup(S3Agent.invalidate_bucket_cache)
+        for n in range(2):
+            self.assertTrue(aws_boto3_agent.get_aws_agent().upload_fileobj_to_s3(
+                SimpleUploadedFile("cv.pdf", b"%PDF-1.7"), f"k{n}"))
+        self.assertEqual(self._services(), ["s3"])
+
+
+class _FakeSQSAgent:
+    """Stands in for SQSAgent; failures maps MessageBody -> list of failure entries to report, one per call."""
+
+    delay_seconds = 3
+
+    def __init__(self, failures=None):
+        self.failures = failures or {}
+        self.calls = []
+
+    def encode_message_body(self, message_content):
+        return json.dumps(message_content)
+
+    def _message_options(self, body, delay_seconds, message_group_id, deduplication_id):
+        return {"DelaySeconds": self.delay_seconds if delay_seconds is None else delay_seconds}
+
+    def send_sqs_message_batch(self, entries):
+        self.calls.append(entries)
+        successful, failed = [], []
+        for entry in entries:
+            pending = self.failures.get(entry["MessageBody"])
+            if pending:
+                failed.append(dict(pending.pop(0), Id=entry["Id"]))
+            else:
+                successful.append({"Id": entry["Id"], "MessageId": f"mid-{entry['MessageBody']}"})
+        return successful, failed
+
+
+class SQSBatchSenderTests(SimpleTestCase):
+    def _sender(self, agent, max_retries=3):
+        return SQSBatchSender(agent, linger_seconds=0.01, max_retries=max_retries, retry_backoff_seconds=0)
+
+    def test_flush_sends_buffered_messages_in_one_batch(self):
+        agent = _FakeSQSAgent()
+        with self._sender(agent) as sender:
+            futures = [sender.submit({"n": n}) for n in range(3)]
+            self.assertTrue(sender.flush(timeout=5))
+        self.assertEqual([f.result(timeout=1) for f in futures], [f'mid-{{"n": {n}}}' for n in range(3)])
+        self.assertEqual(sum(len(call) for call in agent.calls), 3)
+
+    def test_batches_hold_at_most_ten_entries(self):
+        agent = _FakeSQSAgent()
+        with self._sender(agent) as sender:
+            futures = [sender.submit({"n": n}) for n in range(25)]
+            sender.flush(timeout=5)
+        self.assertTrue(all(f.result(timeout=1) for f in futures))
+        self.assertLessEqual(max(len(call) for call in agent.calls), 10)
+
+    def test_failed_entry_is_retried_alone_until_it_succeeds(self):
+        body = json.dumps({"n": 1})
+        agent = _FakeSQSAgent({body: [{"SenderFault": False, "Code": "InternalError"}]})
+        with self._sender(agent) as sender:
+            ok, retried = sender.submit({"n": 0}), sender.submit({"n": 1})
+            sender.flush(timeout=5)
+        self.assertEqual(retried.result(timeout=1), f"mid-{body}")
+        self.assertIsNotNone(ok.result(timeout=1))
+        self.assertEqual([entry["MessageBody"] for entry in agent.calls[-1]], [body])
+
+    def test_sender_fault_is_not_retried(self):
+        body = json.dumps({"n": 1})
+        agent = _FakeSQSAgent({body: [{"SenderFault": True, "Code": "InvalidParameterValue"}]})
+        with self._sender(agent) as sender:
+            future = sender.submit({"n": 1})
+            sender.flush(timeout=5)
+        self.assertIsNone(future.result(timeout=1))
+        self.assertEqual(len(agent.calls), 1)
+
+    def test_gives_up_after_max_retries(self):
+        body = json.dumps({"n": 1})
+        agent = _FakeSQSAgent({body: [{"SenderFault": False, "Code": "InternalError"}] * 5})
+        with self._sender(agent, max_retries=2) as sender:
+            future = sender.submit({"n": 1})
+            sender.flush(timeout=5)
+        self.assertIsNone(future.result(timeout=1))
+        self.assertEqual(len(agent.calls), 3)
+
+
+
+class _FakeSQSQueue:
+    """Hands out the given batches of bodies, then sets stop_event; receipts in refuse fail to delete."""
+
+    def __init__(self, batches, stop_event=None, refuse=()):
+        self.batches = list(batches)
+        self.stop_event = stop_event
+        self.refuse = set(refuse)
+        self.deletes = []
+        self.log = []
+
+    def receive_sqs_messages(self, max_messages, wait_time_seconds, visibility_timeout):
+        self.log.append("receive")
+        if not self.batches:
+            if self.stop_event is not None:
+                self.stop_event.set()
+            return []
+        return [{"receipt": f"r-{body}", "message_id": f"m-{body}", "body": body, "receive_count": 1}
+                for body in self.batches.pop(0)]
+
+    def delete_sqs_message_batch(self, receipts):
+        self.log.append("delete")
+        self.deletes.append(list(receipts))
+        return [r for r in receipts if r not in self.refuse], [r for r in receipts if r in self.refuse]
+
+
+class SQSBatchConsumerTests(SimpleTestCase):
+    def test_process_acks_handled_messages_and_leaves_failures_for_redelivery(self):
+        stop = threading.Event()
+        queue = _FakeSQSQueue([["a", "bad", "b"]], stop_event=stop)
+
+        def handler(body):
+            if body == "bad":
+                raise ValueError(body)
+
+        with SQSBatchConsumer(queue, wait_time_seconds=0) as consumer:
+            consumer.process(handler, stop_event=stop)
+        self.assertEqual(queue.deletes, [["r-a", "r-b"]])
+        # Acks of one batch are deleted before the next long poll
+        self.assertEqual(queue.log, ["receive", "delete", "receive"])
+        self.assertEqual(consumer.get_stats()["acked"], 2)
+
+    def test_ack_deletes_once_ten_receipts_are_pending(self):
+        queue = _FakeSQSQueue([])
+        consumer = SQSBatchConsumer(queue)
+        for n in range(12):
+            consumer.ack({"receipt": f"r-{n}"})
+        self.assertEqual(queue.deletes, [[f"r-{n}" for n in range(10)]])
+        consumer.close()
+        self.assertEqual(queue.deletes[1:], [["r-10", "r-11"]])
+
+    def test_partial_batch_delete_counts_only_confirmed_receipts(self):
+        queue = _FakeSQSQueue([], refuse={"r-1"})
+        consumer = SQSBatchConsumer(queue)
+        for n in range(3):
+            consumer.ack({"receipt": f"r-{n}"})
+        self.assertEqual(consumer.flush_acks(), 2)
+        stats = consumer.get_stats()
+        self.assertEqual((stats["acked"], stats["ack_failures"]), (2, 1))
+        # A refused receipt is not retried; the message becomes visible again instead
+        self.assertEqual(consumer.flush_acks(), 0)
+        self.assertEqual(len(queue.deletes), 1)
+
+    def test_receive_stamps_messages_and_records_batch_sizes(self):
+        queue = _FakeSQSQueue([["a", "b"], []])
+        consumer = SQSBatchConsumer(queue)
+        before = time.monotonic()
+        received = consumer.receive()
+        consumer.receive()
+        self.assertTrue(all(message["received_at"] >= before for message in received))
+        stats = consumer.get_stats()
+        self.assertEqual((stats["receives"], stats["empty_receives"], stats["messages"]), (2, 1, 2))
+
+
+
+class _FakeVisibilityAgent:
+    def __init__(self, refuse=()):
+        self.refuse = set(refuse)
+        self.calls = []
+        self.called = threading.Event()
+
+    def change_visibility_batch(self, receipts, visibility_timeout):
+        self.calls.append((list(receipts), visibility_timeout))
+        self.called.set()
+        return [r for r in receipts if r not in self.refuse], [r for r in receipts if r in self.refuse]
+
+
+class SQSLeaseManagerTests(SimpleTestCase):
+    def _manager(self, agent):
+        manager = SQSLeaseManager(agent, visibility_timeout=2, extend_margin=1)
+        self.addCleanup(manager.close)
+        return manager
+
+    @staticmethod
+    def _due_message(receipt="r-1"):
+        # Handed out a visibility timeout ago, so the lease is due at once
+        return {"receipt": receipt, "received_at": time.monotonic() - 2}
+
+    def test_running_handler_gets_its_visibility_extended(self):
+        agent = _FakeVisibilityAgent()
+        manager = self._manager(agent)
+        with manager.lease(self._due_message()):
+            self.assertTrue(agent.called.wait(2))
+        self.assertEqual(agent.calls[0], (["r-1"], 2))
+        self.assertEqual(manager.extensions, 1)
+
+    def test_finished_handler_is_not_extended(self):
+        agent = _FakeVisibilityAgent()
+        manager = self._manager(agent)
+        with manager.lease({"receipt": "r-1", "received_at": time.monotonic()}):
+            pass
+        with manager.lease(self._due_message("r-2")):
+            self.assertTrue(agent.called.wait(2))
+        manager.close()
+        self.assertEqual([receipts for receipts, _ in agent.calls], [["r-2"]])
+
+    def test_failed_extension_ends_the_lease(self):
+        agent = _FakeVisibilityAgent(refuse={"r-1"})
+        manager = self._manager(agent)
+        with manager.lease(self._due_message()):
+            self.assertTrue(agent.called.wait(2))
+            time.sleep(0.1)
+        # A kept lease would still be due and be retried in a tight loop
+        self.assertEqual(len(agent.calls), 1)
+        self.assertEqual(manager.extensions, 0)
+
+    def test_close_stops_the_heartbeat_thread(self):
+        manager = self._manager(_FakeVisibilityAgent())
+        with manager.lease({"receipt": "r-1", "received_at": time.monotonic()}):
+            thread = manager._thread
+        manager.close()
+        self.assertFalse(thread.is_alive())
+
+
+class _FakeClaimStore:
+    """In-memory stand-in for the S3 side of the claim check."""
+
+    def __init__(self, fail_uploads=False):
+        self.objects = {}
+        self.fail_uploads = fail_uploads
+
+    def upload_fileobj_to_s3(self, fileobj, key):
+        if self.fail_uploads:
+            return False
+        self.objects[key] = fileobj.read()
+        return True
+
+    def get_object_from_s3(self, key):
+        return self.objects.get(key)
+
+
+class SQSEnvelopeCodecTests(SimpleTestCase):
+    payload = {"file_key": "user_1/cv.pdf", "filetype": "lebenslauf", "user": 1}
+
+    def test_small_payload_round_trips_as_json(self):
+        codec = SQSEnvelopeCodec()
+        body = codec.encode(self.payload)
+        self.assertEqual(json.loads(body)["e"], ENCODING_JSON)
+        self.assertEqual(codec.decode(body), (PAYLOAD_SCHEMA_VERSION, self.payload))
+
+    def test_large_payload_is_compressed(self):
+        codec = SQSEnvelopeCodec(compress_threshold=256)
+        payload = dict(self.payload, text="Berufserfahrung " * 200)
+        body = codec.encode(payload)
+        self.assertEqual(json.loads(body)["e"], ENCODING_ZLIB)
+        self.assertLess(len(body), len(json.dumps(payload)))
+        self.assertEqual(codec.decode(body), (PAYLOAD_SCHEMA_VERSION, payload))
+
+    def test_oversized_payload_goes_through_the_claim_check(self):
+        store = _FakeClaimStore()
+        codec = SQSEnvelopeCodec(claim_store=store, compress_threshold=256, claim_threshold=512)
+        payload = dict(self.payload, text="".join(f"{n:x}" for n in range(2000)))
+        body = codec.encode(payload)
+        envelope = json.loads(body)
+        self.assertEqual(envelope["e"], ENCODING_CLAIM)
+        self.assertIn(envelope["k"], store.objects)
+        self.assertEqual(codec.decode(body), (PAYLOAD_SCHEMA_VERSION, payload))
+        # Same content, same claim object
+        self.assertEqual(codec.encode(payload), body)
+        self.assertEqual(len(store.objects), 1)
+
+    def test_failed_claim_upload_raises(self):
+        codec = SQSEnvelopeCodec(claim_store=_FakeClaimStore(fail_uploads=True), compress_threshold=256, claim_threshold=512)
+        with self.assertRaises(RuntimeError):
+            codec.encode(dict(self.payload, text="".join(f"{n:x}" for n in range(2000))))
+
+    def test_missing_claim_object_decodes_to_none(self):
+        store = _FakeClaimStore()
+        codec = SQSEnvelopeCodec(claim_store=store, compress_threshold=256, claim_threshold=512)
+        body = codec.encode(dict(self.payload, text="".join(f"{n:x}" for n in range(2000))))
+        store.objects.clear()
+        self.assertEqual(codec.decode(body), (PAYLOAD_SCHEMA_VERSION, None))
+
+    def test_bare_json_from_before_the_envelope_still_decodes(self):
+        self.assertEqual(SQSEnvelopeCodec().decode(json.dumps(self.payload)), (None, self.payload))
+
+    def test_unreadable_body_decodes_to_none(self):
+        self.assertEqual(SQSEnvelopeCodec().decode("not json"), (None, None))
+
+    def test_disabled_codec_sends_bare_json_that_enabled_consumers_decode(self):
+        payload = dict(self.payload, text="Berufserfahrung " * 200)
+        body = SQSEnvelopeCodec(enabled=False, compress_threshold=256).encode(payload)
+        self.assertEqual(json.loads(body), payload)
+        self.assertEqual(SQSEnvelopeCodec().decode(body), (None, payload))
+
+
+class _FakeClock:
+    """Replaces the time module inside helper.bedrock_batch; sleep() advances the clock instead of blocking."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    perf_counter = monotonic
+
+    def sleep(self, seconds):
+        self.now += seconds
+        self.slept += seconds
+
+
+def _throttling_error():
+    return ClientError({"Error": {"Code": "ThrottlingException", "Message": "slow down"}}, "Converse")
+
+
+class TokenBucketPacerTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = _FakeClock()
+        patcher = mock.patch.object(bedrock_batch, "time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_burst_is_free_then_calls_are_spaced_at_the_request_rate(self):
+        pacer = TokenBucketPacer(requests_per_minute=60, tokens_per_minute=1_000_000)
+        # The bucket holds BURST_SECONDS of quota
+        waits = [pacer.acquire(1) for _ in range(BURST_SECONDS)]
+        self.assertEqual(waits, [0.0] * BURST_SECONDS)
+        self.assertAlmostEqual(pacer.acquire(1), 1.0, places=2)
+
+    def test_token_quota_limits_large_calls(self):
+        pacer = TokenBucketPacer(requests_per_minute=6000, tokens_per_minute=6000)
+        self.assertEqual(pacer.acquire(1000), 0.0)
+        # The bucket is empty; 1000 tokens at 100 tokens per second take 10 seconds
+        self.assertAlmostEqual(pacer.acquire(1000), 10.0, places=1)
+
+    def test_call_larger_than_the_bucket_still_fits(self):
+        pacer = TokenBucketPacer(requests_per_minute=60, tokens_per_minute=600)
+        self.assertEqual(pacer.acquire(10_000), 0.0)
+
+    def test_throttle_halves_the_rate_and_success_earns_it_back(self):
+        pacer = TokenBucketPacer(requests_per_minute=60, tokens_per_minute=1_000_000)
+        pacer.on_throttle()
+        self.assertEqual(pacer.rate_factor, 0.5)
+        # The request bucket was emptied, and it now refills at half the rate
+        self.assertAlmostEqual(pacer.acquire(1), 2.0, places=2)
+        for _ in range(20):
+            pacer.on_success()
+        self.assertEqual(pacer.rate_factor, 1.0)
+
+    def test_rate_never_drops_below_the_floor(self):
+        pacer = TokenBucketPacer(requests_per_minute=60, tokens_per_minute=1_000_000, min_rate_factor=0.1)
+        for _ in range(10):
+            pacer.on_throttle()
+        self.assertEqual(pacer.rate_factor, 0.1)
+
+
+class RunBatchTests(SimpleTestCase):
+    def _pacer(self):
+        return TokenBucketPacer(requests_per_minute=60_000, tokens_per_minute=100_000_000)
+
+    def test_results_come_back_in_input_order(self):
+        results = run_batch(str.upper, ["a", "b", "c", "d"], self._pacer(), max_tokens=10, max_workers=3)
+        self.assertEqual(results, [{"response": p, "error": None} for p in "ABCD"])
+
+    def test_throttled_calls_are_retried(self):
+        attempts = []
+
+        def call(prompt):
+            attempts.append(prompt)
+            if len(attempts) < 3:
+                raise _throttling_error()
+            return "ok"
+
+        pacer = self._pacer()
+        results = run_batch(call, ["p"], pacer, max_tokens=10, backoff_seconds=0)
+        self.assertEqual(results, [{"response": "ok", "error": None}])
+        self.assertEqual(len(attempts), 3)
+        self.assertLess(pacer.rate_factor, 1.0)
+
+    def test_other_errors_are_reported_without_retry(self):
+        attempts = []
+
+        def call(prompt):
+            attempts.append(prompt)
+            raise ValueError("bad prompt")
+
+        results = run_batch(call, ["p"], self._pacer(), max_tokens=10, backoff_seconds=0)
+        self.assertEqual(results, [{"response": None, "error": "ValueError: bad prompt"}])
+        self.assertEqual(len(attempts), 1)
+
+    def test_throttling_past_max_retries_is_reported(self):
+        def call(prompt):
+            raise _throttling_error()
+
+        results = run_batch(call, ["p"], self._pacer(), max_tokens=10, max_retries=2, backoff_seconds=0)
+        self.assertIsNone(results[0]["response"])
+        self.assertIn("ThrottlingException", results[0]["error"])
+
+
+class ModelRouterTests(SimpleTestCase):
+    @staticmethod
+    def _at(now):
+        return mock.patch.object(bedrock_routing, "time", mock.Mock(monotonic=mock.Mock(return_value=now)))
+
+    def _router(self):
+        return ModelRouter(parse_routes("fast|1000|512, big|100000|4096, mid|8000|2048"), alpha=0.5, cooldown_seconds=30)
+
+    def test_parse_routes_reads_limits_and_skips_invalid_entries(self):
+        routes = parse_routes("arn:aws:bedrock:eu-central-1:1:inference-profile/a|5000|1000, b, c|x|1, ")
+        self.assertEqual([(r.model_id, r.max_input_tokens, r.max_output_tokens) for r in routes],
+                         [("arn:aws:bedrock:eu-central-1:1:inference-profile/a", 5000, 1000), ("b", 200000, 8192)])
+
+    def test_config_order_ranks_models_without_history(self):
+        self.assertEqual(self._router().choose(prompt_tokens=100, max_tokens=100), ["fast", "big", "mid"])
+
+    def test_models_too_small_for_the_request_are_skipped(self):
+        router = self._router()
+        self.assertEqual(router.choose(prompt_tokens=5000, max_tokens=100), ["big", "mid"])
+        self.assertEqual(router.choose(prompt_tokens=100, max_tokens=4000), ["big"])
+
+    def test_largest_model_is_tried_when_nothing_fits(self):
+        self.assertEqual(self._router().choose(prompt_tokens=500000, max_tokens=100), ["big"])
+
+    def test_faster_model_ranks_first(self):
+        router = self._router()
+        router.record("fast", 900)
+        router.record("big", 300)
+        router.record("mid", 600)
+        self.assertEqual(router.choose(100, 100), ["big", "mid", "fast"])
+
+    def test_errors_push_a_model_down(self):
+        router = self._router()
+        for model_id in ("fast", "big", "mid"):
+            router.record(model_id, 500)
+        router.record("fast", 0, error=True)
+        self.assertEqual(router.choose(100, 100)[-1], "fast")
+
+    def test_model_that_only_ever_errored_ranks_last(self):
+        router = self._router()
+        for _ in range(20):
+            router.record("fast", 0, error=True)
+        router.record("big", 900)
+        self.assertEqual(router.choose(100, 100), ["mid", "big", "fast"])
+
+    def test_mostly_failing_model_ranks_behind_slower_healthy_ones(self):
+        router = self._router()
+        router.record("fast", 10)
+        router.record("big", 2000)
+        router.record("mid", 2000)
+        for _ in range(2):
+            router.record("fast", 0, error=True)
+        self.assertEqual(router.choose(100, 100)[-1], "fast")
+
+    def test_throttled_model_cools_down_and_comes_back(self):
+        router = self._router()
+        with self._at(100.0):
+            router.record("fast", 0, error=True, throttled=True)
+            self.assertEqual(router.choose(100, 100), ["big", "mid", "fast"])
+        with self._at(131.0):
+            router.record("big", 100)
+            router.record("mid", 100)
+            router.record("fast", 20)
+            self.assertEqual(router.choose(100, 100)[0], "fast")
+
+    def test_consecutive_throttles_lengthen_the_cooldown(self):
+        router = self._router()
+        with self._at(100.0):
+            router.record("fast", 0, error=True, throttled=True)
+            router.record("fast", 0, error=True, throttled=True)
+        with self._at(131.0):
+            self.assertEqual(router.choose(100, 100)[-1], "fast")
+
+    def test_only_failover_codes_move_to_the_next_model(self):
+        self.assertTrue(is_failover_error(ClientError({"Error": {"Code": "ServiceUnavailableException"}}, "Converse")))
+        self.assertFalse(is_failover_error(ClientError({"Error": {"Code": "ValidationException"}}, "Converse")))
+        self.assertFalse(is_failover_error(ValueError("x")))
+
+
+def _delta(text):
+    return {"contentBlockDelta": {"delta": {"text": text}}}
+
+
+def _failing_events(events, exc):
+    yield from events
+    raise exc
+
+
+class BedrockStreamTests(SimpleTestCase):
+    def setUp(self):
+        self.completions = []
+
+    def _stream(self, events):
+        return BedrockStream(events, "model-a", time.perf_counter(),
+                             on_complete=lambda stream, error: self.completions.append(error))
+
+    def test_complete_stream_reports_once_without_error(self):
+        stream = self._stream([_delta("Hallo "), _delta("Welt"), {"messageStop": {"stopReason": "end_turn"}},
+                               {"metadata": {"usage": {"inputTokens": 3, "outputTokens": 2}, "metrics": {"latencyMs": 40}}}])
+        self.assertEqual([delta for _, delta in stream], ["Hallo ", "Welt"])
+        self.assertEqual((stream.text, stream.stop_reason, stream.latency_ms), ("Hallo Welt", "end_turn", 40))
+        self.assertEqual(self.completions, [None])
+
+    def test_error_event_raises_and_reports_the_normalised_code(self):
+        stream = self._stream([_delta("Hallo"), {"throttlingException": {"message": "slow down"}}])
+        with self.assertRaises(BedrockStreamError) as raised:
+            list(stream)
+        self.assertTrue(is_throttle(raised.exception))
+        self.assertEqual(self.completions, ["ThrottlingException"])
+
+    def test_botocore_event_stream_error_is_mapped(self):
+        error = EventStreamError({"Error": {"Code": "throttlingException", "Message": "slow down"}}, "ConverseStream")
+        stream = self._stream(_failing_events([_delta("Hallo")], error))
+        with self.assertRaises(BedrockStreamError) as raised:
+            list(stream)
+        self.assertEqual(raised.exception.kind, "throttlingException")
+        self.assertIs(raised.exception.__cause__, error)
+        self.assertTrue(is_throttle(error) and is_failover_error(error))
+        self.assertEqual(self.completions, ["ThrottlingException"])
+
+    def test_connection_failure_is_reraised_and_reported(self):
+        stream = self._stream(_failing_events([_delta("Hallo")], ConnectionResetError("reset")))
+        with self.assertRaises(ConnectionResetError):
+            list(stream)
+        self.assertEqual(self.completions, ["ConnectionResetError"])
+
+    def test_abandoned_stream_still_reports_once(self):
+        iterator = iter(self._stream([_delta("Hallo"), _delta("Welt")]))
+        next(iterator)
+        iterator.close()
+        self.assertEqual(self.completions, [None])
+
+    def test_failing_callback_does_not_mask_the_stream_result(self):
+        stream = BedrockStream([_delta("Hallo")], "model-a", time.perf_counter(),
+                               on_complete=mock.Mock(side_effect=RuntimeError("usage store down")))
+        self.assertEqual(list(stream), [("text", "Hallo")])
+
+
+class SplitIntoChunksTests(SimpleTestCase):
+    def test_short_text_is_one_chunk(self):
+        self.assertEqual(split_into_chunks("Max Mustermann\n\nBerlin", chunk_tokens=100), ["Max Mustermann\n\nBerlin"])
+
+    def test_empty_text_has_no_chunks(self):
+        self.assertEqual(split_into_chunks("  \n\n ", chunk_tokens=100), [])
+
+    def test_long_text_is_split_on_paragraphs_with_overlap(self):
+        paragraphs = [f"Position {n}: " + "x" * 60 for n in range(20)]
+        chunks = split_into_chunks("\n\n".join(paragraphs), chunk_tokens=50, overlap_tokens=5)
+        self.assertGreater(len(chunks), 1)
+        for paragraph in paragraphs:
+            self.assertTrue(any(paragraph in chunk for chunk in chunks))
+        for previous, chunk in zip(chunks, chunks[1:]):
+            self.assertTrue(chunk.startswith(previous[-20:]))
+
+    def test_overlong_line_is_cut(self):
+        chunks = split_into_chunks("y" * 1000, chunk_tokens=50, overlap_tokens=0)
+        self.assertEqual("".join(chunks), "y" * 1000)
+
+    def test_chunks_stay_within_the_budget_including_the_overlap(self):
+        text = "\n\n".join(["z" * 195, "y" * 600, "x" * 150, "w" * 199])
+        chunks = split_into_chunks(text, chunk_tokens=50, overlap_tokens=10)
+        self.assertGreater(len(chunks), 3)
+        self.assertTrue(all(len(chunk) <= 50 * 4 for chunk in chunks), [len(chunk) for chunk in chunks])
+
+
+class MergePartialsTests(SimpleTestCase):
+    def test_contact_fields_take_the_majority_and_ties_go_to_the_first_chunk(self):
+        fields = merge_partials([
+            (2, {"name": "Erika Muster", "city": "Hamburg"}),
+            (0, {"name": "Max Mustermann", "city": "Berlin", "primary_phone": "+49 30 1234"}),
+            (1, {"name": "max  mustermann", "city": "null", "primary_phone": "+49301234"}),
+        ])
+        self.assertEqual(fields["name"], "Max Mustermann")
+        self.assertEqual(fields["city"], "Berlin")
+        self.assertEqual(fields["primary_phone"], "+49 30 1234")
+        self.assertIsNone(fields["primary_email"])
+
+    def test_urls_are_deduplicated_across_chunks(self):
+        fields = merge_partials([(0, {"urls": ["https://example.com/", "https://b.example"]}),
+                                 (1, {"urls": "https://EXAMPLE.com"})])
+        self.assertEqual(fields["urls"], "https://example.com/\nhttps://b.example")
+
+    def test_invalid_birthday_is_dropped(self):
+        self.assertIsNone(merge_partials([(0, {"birthday": "sometime in 1990"})])["birthday"])
+        self.assertEqual(merge_partials([(0, {"birthday": "1990-05-01"})])["birthday"], "1990-05-01")
+
+    def test_overlapping_positions_are_merged_and_the_longer_description_wins(self):
+        fields = merge_partials([
+            (0, {"workexperiance": [{"company": "ACME", "title": "Dev", "start_date": "2019-01", "description": "Backend"}]}),
+            (1, {"workexperiance": [{"company": "acme", "title": "dev", "start_date": "2019-01",
+                                     "end_date": "2021-06", "description": "Backend and data pipelines"}]}),
+        ])
+        self.assertEqual(fields["workexperiance"], [{"company": "ACME", "title": "Dev", "start_date": "2019-01",
+                                                     "end_date": "2021-06", "location": None,
+                                                     "description": "Backend and data pipelines"}])
+
+    def test_positions_are_ordered_most_recent_first_regardless_of_chunk_order(self):
+        positions = [{"company": "A", "start_date": "2015-03"}, {"company": "B", "start_date": "2021-09"},
+                     {"company": "C"}, {"company": "D", "start_date": "2018-01"}]
+        forward = merge_partials([(0, {"workexperiance": positions[:2]}), (1, {"workexperiance": positions[2:]})])
+        backward = merge_partials([(1, {"workexperiance": positions[2:]}), (0, {"workexperiance": positions[:2]})])
+        self.assertEqual([p["company"] for p in forward["workexperiance"]], ["B", "D", "A", "C"])
+        self.assertEqual(forward, backward)
+
+    def test_dates_of_different_precision_are_ordered_by_year_month_and_day(self):
+        positions = [{"company": "A", "start_date": "2020-05"}, {"company": "B", "start_date": "2020-05-20"},
+                     {"company": "C", "start_date": "2020-11"}, {"company": "D", "start_date": "2019"},
+                     {"company": "E", "start_date": "09/2020"}, {"company": "F", "start_date": "seit Kurzem"}]
+        fields = merge_partials([(0, {"workexperiance": positions})])
+        self.assertEqual([p["company"] for p in fields["workexperiance"]], ["C", "E", "B", "A", "D", "F"])
+
+
+class _FakeBatchAgent:
+    def __init__(self, answers):
+        self.answers = answers
+        self.prompts = []
+
+    def ask_batch(self, prompts, **kwargs):
+        self.prompts = prompts
+        return [self.answers[index % len(self.answers)] for index in range(len(prompts))]
+
+
+class ExtractLebenslaufTests(SimpleTestCase):
+    def test_failed_and_unparseable_chunks_are_reported(self):
+        agent = _FakeBatchAgent([
+            {"response": 'Here you go: {"name": "Max Mustermann"}', "error": None},
+            {"response": "I cannot help with that.", "error": None},
+            {"response": None, "error": "ClientError: throttled"},
+        ])
+        text = "\n\n".join(f"Abschnitt {n} " + "z" * 150 for n in range(3))
+        fields, errors = extract_lebenslauf(agent, text, chunk_tokens=60)
+        self.assertEqual(len(agent.prompts), 3)
+        self.assertEqual(fields["name"], "Max Mustermann")
+        self.assertEqual(errors, ["chunk 2: response was not a JSON object", "chunk 3: ClientError: throttled"])
+
+
+class _InlineThread:
+    """Stands in for threading.Thread so background refreshes run inside the test."""
+
+    def __init__(self, target, name=None, daemon=None):
+        self._target = target
+
+    def start(self):
+        self._target()
+
+
+class ModelRefreshBackoffTests(SimpleTestCase):
+    def setUp(self):
+        workdir = tempfile.mkdtemp()
+        self.cache = ModelDiscoveryCache(path=os.path.join(workdir, "models.json"), ttl_seconds=3600)
+        self.cache.put(ModelDiscoveryCache.key("eu-central-1", "Anthropic"), {"model_id": "cached-profile"})
+        self.client = mock.Mock()
+        self.client.list_foundation_models.side_effect = RuntimeError("bedrock unavailable")
+        patches = [mock.patch.object(aws_boto3_agent.boto3, "client", return_value=self.client),
+                   mock.patch.object(aws_boto3_agent.threading, "Thread", _InlineThread)]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _stale_agent(self):
+        with mock.patch.object(self.cache, "is_stale", return_value=True):
+            return BedrockAgent(None, provider="Anthropic", region="eu-central-1", model_cache=self.cache)
+
+    def test_failed_refresh_is_not_retried_on_every_call(self):
+        agent = self._stale_agent()
+        self.assertEqual(agent.model_id, "cached-profile")
+        self.assertEqual(self.client.list_foundation_models.call_count, 1)
+        agent._model_resolved_at = 0
+        for _ in range(5):
+            agent._refresh_if_stale()
+        self.assertEqual(self.client.list_foundation_models.call_count, 1)
+
+    def test_backoff_doubles_and_resets_after_success(self):
+        agent = self._stale_agent()
+        first_wait = agent._refresh_not_before - time.monotonic()
+        agent._refresh_not_before = 0.0
+        agent.refresh_model_in_background()
+        self.assertGreater(agent._refresh_not_before - time.monotonic(), first_wait * 1.5)
+
+        self.client.list_foundation_models.side_effect = None
+        self.client.list_foundation_models.return_value = {"modelSummaries": [
+            {"providerName": "Anthropic", "modelArn": "arn:model-b", "modelLifecycle": {"status": "ACTIVE"}}]}
+        self.client.list_inference_profiles.return_value = {"inferenceProfileSummaries": [
+            {"inferenceProfileArn": "arn:profile-b", "models": [{"modelArn": "arn:model-b"}]}]}
+        agent._refresh_not_before = 0.0
+        agent.refresh_model_in_background()
+        self.assertEqual(agent.model_id, "arn:profile-b")
+        self.assertEqual((agent._refresh_failures, agent._refresh_not_before), (0, 0.0))
+
+
+
+class ResponseCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "responses.sqlite3")
+        self.now = 1000.0
+        patcher = mock.patch.object(bedrock_cache.time, "time", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _cache(self, **options):
+        return ResponseCache(path=self.path, **options)
+
+    def test_memory_tier_evicts_the_least_recently_used_entry(self):
+        cache = self._cache(memory_entries=2)
+        cache.put("a", "A")
+        cache.put("b", "B")
+        self.assertEqual(cache.get("a"), "A")
+        cache.put("c", "C")
+        stats = cache.get_stats()
+        self.assertEqual((stats["memory_entries"], stats["memory_evictions"], stats["memory_hits"]), (2, 1, 1))
+        # b left memory but is still on disk
+        self.assertEqual(cache.get("b"), "B")
+        self.assertEqual(cache.get_stats()["disk_hits"], 1)
+
+    def test_entries_expire_after_the_ttl(self):
+        cache = self._cache(ttl_seconds=60)
+        cache.put("a", "A")
+        self.now += 59
+        self.assertEqual(cache.get("a"), "A")
+        self.now += 1
+        self.assertIsNone(cache.get("a"))
+        stats = cache.get_stats()
+        self.assertEqual((stats["expired"], stats["misses"], stats["memory_entries"]), (1, 1, 0))
+        self.assertIsNone(self._cache(ttl_seconds=60).get("a"))
+
+    def test_disk_tier_evicts_the_least_recently_read_rows(self):
+        cache = self._cache(memory_entries=1, max_disk_bytes=10)
+        cache.put("a", "12345")
+        self.now += 1
+        cache.put("b", "12345")
+        self.now += 1
+        # A disk read makes a the most recently used row
+        self.assertEqual(cache.get("a"), "12345")
+        self.now += 1
+        cache.put("c", "12345")
+        self.assertEqual(cache.get_stats()["disk_evictions"], 1)
+        reopened = self._cache()
+        self.assertIsNone(reopened.get("b"))
+        self.assertEqual((reopened.get("a"), reopened.get("c")), ("12345", "12345"))
+
+    def test_stats_count_hits_and_misses(self):
+        cache = self._cache(memory_entries=1)
+        self.assertIsNone(cache.get("a"))
+        cache.put("a", "A")
+        cache.put("b", "B")
+        cache.get("b")
+        cache.get("a")
+        stats = cache.get_stats()
+        self.assertEqual((stats["hits"], stats["memory_hits"], stats["disk_hits"], stats["misses"], stats["stores"]),
+                         (2, 1, 1, 1, 2))
+
+
+class AskResponseCacheTests(SimpleTestCase):
+    def setUp(self):
+        workdir = tempfile.mkdtemp()
+        models = ModelDiscoveryCache(path=os.path.join(workdir, "models.json"), ttl_seconds=3600)
+        models.put(ModelDiscoveryCache.key("eu-central-1", "Anthropic"), {"model_id": "cached-profile"})
+        self.cache = ResponseCache(path=os.path.join(workdir, "responses.sqlite3"))
+        with mock.patch.object(aws_boto3_agent.boto3, "client"):
+            self.agent = BedrockAgent(None, provider="Anthropic", region="eu-central-1", model_cache=models,
+                                      response_cache=self.cache)
+
+    def _ask(self, stop_reason):
+        reply = {"text": "Antwort", "stop_reason": stop_reason}
+        with mock.patch.object(self.agent, "ask_detailed", return_value=reply) as ask_detailed:
+            self.assertEqual(self.agent.ask("Frage"), "Antwort")
+            self.assertEqual(self.agent.ask("Frage"), "Antwort")
+        return ask_detailed.call_count
+
+    def test_complete_answer_is_served_from_the_cache(self):
+        self.assertEqual(self._ask("end_turn"), 1)
+
+    def test_truncated_or_filtered_answer_is_not_cached(self):
+        for stop_reason in ("max_tokens", "guardrail_intervened", "content_filtered"):
+            self.assertEqual(self._ask(stop_reason), 2)
+        self.assertNotIn("stores", self.cache.get_stats())
+
+
+class BedrockCallLogWriterTests(SimpleTestCase):
+    call = {"model_id": "model-a", "caller": "cv_extraction", "input_tokens": 12, "output_tokens": None,
+            "server_latency_ms": 40, "client_latency_ms": 55, "error": None}
+
+    def test_calls_are_written_in_batches_off_the_calling_thread(self):
+        writers = []
+
+        def bulk_create(rows):
+            writers.append((threading.current_thread().name, len(rows)))
+            return rows
+
+        writer = BedrockCallLogWriter(batch_size=2)
+        with mock.patch.object(BedrockCallLog.objects, "bulk_create", side_effect=bulk_create), \
+                mock.patch("home_app.usage.close_old_connections"):
+            for _ in range(5):
+                writer(self.call)
+            writer.flush()
+            writer.stop()
+        self.assertEqual(sum(count for _, count in writers), 5)
+        self.assertTrue(all(count <= 2 and name == "bedrock-call-log" for name, count in writers))
+        self.assertFalse(writer._thread.is_alive())
+
+    def test_failed_write_is_logged_and_the_writer_keeps_going(self):
+        writer = BedrockCallLogWriter()
+        with mock.patch.object(BedrockCallLog.objects, "bulk_create", side_effect=[RuntimeError("db down"), []]) as bulk_create, \
+                mock.patch("home_app.usage.close_old_connections"):
+            writer(self.call)
+            writer.flush()
+            writer(self.call)
+            writer.flush()
+            writer.stop()
+        self.assertEqual(bulk_create.call_count, 2)
+
+
+class AttachmentDispositionTests(SimpleTestCase):
+    def test_non_ascii_name_is_percent_encoded_with_an_ascii_fallback(self):
+        self.assertEqual(attachment_disposition("Lebenslauf Müller.pdf"),
+                         "attachment; filename=\"Lebenslauf Muller.pdf\"; filename*=UTF-8''Lebenslauf%20M%C3%BCller.pdf")
+
+    def test_quotes_and_separators_cannot_break_the_header(self):
+        header = attachment_disposition('cv"; filename="evil.exe\r\n.pdf')
+        self.assertNotIn("\r", header)
+        self.assertEqual(header.count('"'), 2)
+        self.assertTrue(header.endswith("filename*=UTF-8''cv%22%3B%20filename%3D%22evil.exe%0D%0A.pdf"))
+
+    def test_name_without_ascii_characters_falls_back_to_download(self):
+        self.assertTrue(attachment_disposition("履歴書.pdf").startswith('attachment; filename="download.pdf";'))
+
+
+class InspectingUploadHandlerTests(SimpleTestCase):
+    def _post(self, content, limit):
+        upload = SimpleUploadedFile("cv.pdf", content, content_type="application/pdf")
+        request = RequestFactory().post("/upload", {"csrfmiddlewaretoken": "token", "filetype": "lebenslauf", "filelocation": upload})
+        request.upload_handlers = [upload_handlers.InspectingMemoryFileUploadHandler(request),
+                                   upload_handlers.InspectingTemporaryFileUploadHandler(request)]
+        with mock.patch.object(upload_handlers, "MAX_UPLOAD_BYTES", limit):
+            request.POST
+        return request
+
+    def test_accepted_upload_is_hashed_and_sniffed(self):
+        content = b"%PDF-1.7 " + b"x" * 5000
+        request = self._post(content, limit=10_000)
+        uploaded = request.FILES["filelocation"]
+        self.assertEqual(uploaded.sha256, hashlib.sha256(content).hexdigest())
+        self.assertEqual(uploaded.detected_mime, "application/pdf")
+        self.assertFalse(hasattr(request, "upload_rejections"))
+
+    def test_file_crossing_the_limit_stops_the_upload_and_keeps_earlier_fields(self):
+        request = self._post(b"%PDF-" + b"x" * 5000, limit=1024)
+        self.assertNotIn("filelocation", request.FILES)
+        self.assertEqual(request.POST["csrfmiddlewaretoken"], "token")
+        self.assertEqual(request.upload_rejections, {"filelocation": "File size exceeded 1 KB."})
+
+    def test_oversized_content_length_is_rejected_before_the_file_is_read(self):
+        with mock.patch.object(upload_handlers._InspectingUploadMixin, "_inspect") as inspect:
+            request = self._post(b"%PDF-" + b"x" * (upload_handlers.MULTIPART_OVERHEAD_BYTES + 5000), limit=1024)
+        inspect.assert_not_called()
+        self.assertNotIn("filelocation", request.FILES)
+        self.assertIn("filelocation", request.upload_rejections)
+
+
+def _stub_agent(backlog=0):
+    """AWSBoto3Agent stand-in for view tests: every S3 call succeeds, the queue holds `backlog` messages."""
+    agent = mock.Mock()
+    agent.get_sqs_depth_probe.return_value.backlog.return_value = backlog
+    agent.upload_fileobj_to_s3.return_value = True
+    agent.copy_object_in_s3.return_value = True
+    agent.delete_fileobj_from_s3.return_value = True
+    agent.delete_objects_from_s3.side_effect = lambda keys: {key: None for key in keys}
+    return agent
+
+
+class _ViewTestCase(TestCase):
+    """Logged-in user plus a stubbed process-wide AWS agent (get_aws_agent() returns self.agent)."""
+
+    backlog = 0
+
+    def setUp(self):
+        self.agent = _stub_agent(self.backlog)
+        patcher = mock.patch.object(aws_boto3_agent, "_agent", self.agent)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user("erika", email="erika@example.com", password="pw", phonenumber="0301234")
+        self.other_user = User.objects.create_user("max", email="max@example.com", password="pw", phonenumber="0405678")
+        self.client.force_login(self.user)
+
+    def _stored(self, name, user=None, filetype="lebenslauf", file_hash=None):
+        user = user or self.user
+        key = f"uploads/user-{user.id}/20250101120000-{len(name):032x}-{name}"
+        return UploadedFile.objects.create(user=user, filetype=filetype, file_address_key=key, filelocation=key,
+                                           file_hash=file_hash)
+
+    def _call(self, view, path, data):
+        """Run a view function directly on a POST request; returns (response, message texts)."""
+        request = RequestFactory().post(path, data)
+        request.user = self.user
+        request.session = SessionStore()
+        request._messages = FallbackStorage(request)
+        response = view(request)
+        return response, [str(message) for message in request._messages]
+
+
+class BulkDeleteTests(_ViewTestCase):
+    def test_deletes_confirmed_keys_and_reports_every_selected_key(self):
+        deleted, kept = self._stored("a.pdf"), self._stored("b.pdf")
+        foreign = self._stored("c.pdf", user=self.other_user)
+        self.agent.delete_objects_from_s3.side_effect = lambda keys: {
+            key: None if key == deleted.pk else "Access Denied" for key in keys}
+
+        response, texts = self._call(views.my_documents, "/mydocuments", {
+            "action": "bulk_delete", "file_keys": [deleted.pk, kept.pk, foreign.pk, deleted.pk]})
+
+        self.assertEqual(response.status_code, 302)
+        # Keys of other users never reach S3
+        self.agent.delete_objects_from_s3.assert_called_once_with([deleted.pk, kept.pk])
+        self.assertEqual(set(UploadedFile.objects.values_list("pk", flat=True)), {kept.pk, foreign.pk})
+        self.assertEqual(texts, [f"{deleted.pk.rsplit('/', 1)[-1]}: deleted.", f"{kept.pk.rsplit('/', 1)[-1]}: Access Denied",
+                                 f"{foreign.pk.rsplit('/', 1)[-1]}: document not found."])
+
+    def test_empty_selection_reports_an_error_without_calling_s3(self):
+        _, texts = self._call(views.my_documents, "/mydocuments", {"action": "bulk_delete"})
+        self.assertEqual(texts, ["No documents selected."])
+        self.agent.delete_objects_from_s3.assert_not_called()
+
+
+class _DuplicateUploadTestCase(_ViewTestCase):
+    """An earlier upload of `pdf` whose CV data was already extracted."""
+
+    pdf = b"%PDF-1.7\n Lebenslauf Erika Muster"
+
+    def setUp(self):
+        super().setUp()
+        self.original = self._stored("cv.pdf", file_hash=hashlib.sha256(self.pdf).hexdigest())
+        LebenslaufMetadata.objects.create(file_key=self.original, user=self.user, name="Erika Muster")
+
+    def _form(self, filetype="lebenslauf"):
+        return {"user": self.user.id, "filetype": filetype,
+                "filelocation": SimpleUploadedFile("cv-again.pdf", self.pdf, content_type="application/pdf")}
+
+    def _assert_reused(self, texts):
+        self.agent.upload_fileobj_to_s3.assert_not_called()
+        (source, copy_key), _ = self.agent.copy_object_in_s3.call_args
+        self.assertEqual(source, self.original.pk)
+        self.assertTrue(copy_key.endswith("-cv-again.pdf"))
+        copy = UploadedFile.objects.get(pk=copy_key)
+        self.assertEqual(copy.metadatas.get().name, "Erika Muster")
+        # Reused data is not queued for processing again
+        self.assertFalse(UploadEventOutbox.objects.exists())
+        self.assertIn(views.DUPLICATE_REUSED_MESSAGE, texts)
+
+
+class DuplicateUploadTests(_DuplicateUploadTestCase):
+    def test_sync_upload_of_known_bytes_reuses_the_metadata(self):
+        response, texts = self._call(views.upload_file, "/upload", self._form())
+        self.assertEqual(response.status_code, 302)
+        self._assert_reused(texts)
+
+    def test_async_upload_of_known_bytes_reuses_the_metadata(self):
+        response = self.client.post("/upload", self._form())
+        self.assertEqual(response.status_code, 302)
+        self._assert_reused([str(message) for message in get_messages(response.wsgi_request)])
+
+    def test_other_document_type_is_processed_normally(self):
+        _, texts = self._call(views.upload_file, "/upload", self._form(filetype="rechnung"))
+        self.agent.copy_object_in_s3.assert_not_called()
+        self.agent.upload_fileobj_to_s3.assert_called_once()
+        self.assertEqual(UploadEventOutbox.objects.count(), 1)
+        self.assertEqual(texts, ["File uploaded successfully."])
+
+    def test_same_bytes_of_another_user_are_processed_normally(self):
+        self.user, self.other_user = self.other_user, self.user
+        self._call(views.upload_file, "/upload", self._form())
+        self.agent.copy_object_in_s3.assert_not_called()
+        self.assertEqual(UploadEventOutbox.objects.count(), 1)
+
+
+class DuplicateUploadUnderBackpressureTests(_DuplicateUploadTestCase):
+    backlog = 600
+
+    def _assert_notice(self, texts):
+        self._assert_reused(texts)
+        self.assertTrue(any(text.startswith("Processing is running behind") for text in texts), texts)
+
+    def test_sync_duplicate_shows_the_admission_notice(self):
+        self._assert_notice(self._call(views.upload_file, "/upload", self._form())[1])
+
+    def test_async_duplicate_shows_the_admission_notice(self):
+        response = self.client.post("/upload", self._form())
+        self._assert_notice([str(message) for message in get_messages(response.wsgi_request)])
+
+
+class LongFilenameUploadTests(_ViewTestCase):
+    def test_long_filename_fits_the_key_columns_and_keeps_its_extension(self):
+        name = "Lebenslauf_" + "Erika_Mustermann_" * 10 + ".pdf"
+        response, texts = self._call(views.upload_file, "/upload", {
+            "user": self.user.id, "filetype": "lebenslauf",
+            "filelocation": SimpleUploadedFile(name, b"%PDF-1.7 long name", content_type="application/pdf")})
+        self.assertEqual(texts, ["File uploaded successfully."])
+        stored = UploadedFile.objects.get()
+        self.assertLessEqual(len(stored.file_address_key), UploadedFile._meta.get_field("file_address_key").max_length)
+        self.assertEqual(stored.filelocation.name, stored.file_address_key)
+        self.assertTrue(stored.file_address_key.endswith(".pdf"))
+
+
+class AwsExecutorTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(aws_executor, "_executor", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_blocking_calls_run_on_a_pool_bounded_by_the_config(self):
+        running, peak, lock = [0], [0], threading.Lock()
+
+        def blocking(n):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+            return n, threading.current_thread().name
+
+        with mock.patch.object(aws_executor, "ConfigurationCenter") as config:
+            config.return_value.get_parameter.return_value = "3"
+            results = await asyncio.gather(*(aws_executor.run_blocking(blocking, n) for n in range(9)))
+        self.addCleanup(aws_executor._executor.shutdown)
+
+        self.assertEqual([n for n, _ in results], list(range(9)))
+        self.assertTrue(all(name.startswith("aws-io") for _, name in results))
+        self.assertEqual(peak[0], 3)
+
+
+class AsyncViewTests(_ViewTestCase):
+    def setUp(self):
+        super().setUp()
+        self.async_client.force_login(self.user)
+
+    def _form(self, content=b"%PDF-1.7 async upload"):
+        return {"user": self.user.id, "filetype": "lebenslauf",
+                "filelocation": SimpleUploadedFile("cv.pdf", content, content_type="application/pdf")}
+
+    @staticmethod
+    def _texts(response):
+        return [str(message) for message in get_messages(response.asgi_request)]
+
+    async def test_upload_goes_to_s3_on_the_aws_executor_and_is_queued(self):
+        threads = []
+        self.agent.upload_fileobj_to_s3.side_effect = lambda fileobj, key: threads.append(threading.current_thread().name) or True
+
+        response = await self.async_client.post("/upload", self._form())
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self._texts(response), ["File uploaded successfully."])
+        self.assertTrue(threads[0].startswith("aws-io"))
+        stored = await UploadedFile.objects.aget()
+        self.assertEqual(stored.file_hash, hashlib.sha256(b"%PDF-1.7 async upload").hexdigest())
+        self.assertEqual(await UploadEventOutbox.objects.filter(file_key=stored.pk).acount(), 1)
+
+    async def test_failed_s3_upload_stores_nothing(self):
+        self.agent.upload_fileobj_to_s3.return_value = False
+        response = await self.async_client.post("/upload", self._form())
+        self.assertEqual(self._texts(response), ["Internal error during upload."])
+        self.assertFalse(await UploadedFile.objects.aexists())
+
+    async def test_non_pdf_bytes_are_rejected(self):
+        response = await self.async_client.post("/upload", self._form(content=b"MZ not a pdf"))
+        self.assertEqual(self._texts(response), ["Unsupported file type. Only PDF is allowed."])
+        self.agent.upload_fileobj_to_s3.assert_not_called()
+
+    async def test_delete_removes_the_row_only_after_s3_confirmed(self):
+        kept, deleted = await sync_to_async(self._stored)("a.pdf"), await sync_to_async(self._stored)("b.pdf")
+        self.agent.delete_fileobj_from_s3.side_effect = lambda file_key: file_key == deleted.pk
+
+        refused = await self.async_client.post("/mydocuments", {"action": "delete", "file_key": kept.pk})
+        self.assertEqual(self._texts(refused), ["Failed to delete the document from S3."])
+        # The redirect is not followed, so drop the unread messages cookie
+        del self.async_client.cookies["messages"]
+        response = await self.async_client.post("/mydocuments", {"action": "delete", "file_key": deleted.pk})
+
+        self.assertEqual(self._texts(response), ["Document deleted successfully."])
+        self.assertEqual([key async for key in UploadedFile.objects.values_list("pk", flat=True)], [kept.pk])
+
+    async def test_delete_of_another_users_document_is_refused(self):
+        foreign = await sync_to_async(self._stored)("c.pdf", user=self.other_user)
+        response = await self.async_client.post("/mydocuments", {"action": "delete", "file_key": foreign.pk})
+        self.assertEqual(self._texts(response), ["Document not found."])
+        self.agent.delete_fileobj_from_s3.assert_not_called()
+
+    async def test_bulk_delete_reports_every_key(self):
+        own = await sync_to_async(self._stored)("a.pdf")
+        foreign = await sync_to_async(self._stored)("c.pdf", user=self.other_user)
+        response = await self.async_client.post("/mydocuments", {"action": "bulk_delete", "file_keys": [own.pk, foreign.pk]})
+        self.assertEqual(self._texts(response), [f"{own.pk.rsplit('/', 1)[-1]}: deleted.",
+                                                 f"{foreign.pk.rsplit('/', 1)[-1]}: document not found."])
+        self.agent.delete_objects_from_s3.assert_called_once_with([own.pk])
+        self.assertEqual(await UploadedFile.objects.acount(), 1)
+
+
+class _FakeRelayAgent:
+    """Builds entries like SQSAgent; events whose payload names a key in refuse are failed by SQS."""
+
+    def __init__(self, refuse=()):
+        self.refuse = set(refuse)
+        self.sent = []
+
+    def build_sqs_batch_entry(self, entry_id, message_content, delay_seconds=None, attributes=None,
+                              message_group_id=None, deduplication_id=None):
+        return {"Id": entry_id, "MessageBody": json.dumps(message_content)}
+
+    def send_sqs_message_batch(self, entries):
+        successful, failed = [], []
+        for entry in entries:
+            name = json.loads(entry["MessageBody"])["name"]
+            if name in self.refuse:
+                failed.append({"Id": entry["Id"], "SenderFault": True, "Code": "InvalidParameterValue", "Message": name})
+            else:
+                self.sent.append(name)
+                successful.append({"Id": entry["Id"], "MessageId": f"mid-{name}"})
+        return successful, failed
+
+
+class OutboxRelayTests(TestCase):
+    @staticmethod
+    def _event(name):
+        return UploadEventOutbox.objects.create(file_key=f"uploads/user-1/{name}", payload={"name": name})
+
+    def test_sends_pending_events_oldest_first_and_marks_them_sent(self):
+        for name in ("a", "b", "c"):
+            self._event(name)
+        agent = _FakeRelayAgent()
+        self.assertEqual(outbox.relay_pending_events(agent), 3)
+        self.assertEqual(agent.sent, ["a", "b", "c"])
+        self.assertEqual(list(UploadEventOutbox.objects.values_list("sqs_message_id", "attempts")),
+                         [("mid-a", 1), ("mid-b", 1), ("mid-c", 1)])
+        self.assertEqual(outbox.relay_pending_events(agent), 0)
+
+    def test_failed_event_backs_off_while_the_rest_of_the_batch_is_sent(self):
+        self._event("a")
+        refused = self._event("bad")
+        self._event("b")
+        agent = _FakeRelayAgent(refuse={"bad"})
+
+        before = timezone.now()
+        self.assertEqual(outbox.relay_pending_events(agent), 2)
+        refused.refresh_from_db()
+        self.assertIsNone(refused.sent_at)
+        self.assertEqual((refused.attempts, refused.last_error), (1, "InvalidParameterValue: bad"))
+        self.assertGreaterEqual(refused.next_attempt_at, before + outbox.retry_delay(1))
+        # Not retried before its backoff is over
+        self.assertEqual(outbox.relay_pending_events(agent), 0)
+        self.assertEqual(agent.sent, ["a", "b"])
+
+    def test_poison_event_does_not_block_newer_events(self):
+        self._event("bad")
+        agent = _FakeRelayAgent(refuse={"bad"})
+        self.assertEqual(outbox.relay_pending_events(agent, batch_size=1), 0)
+        self._event("a")
+        self._event("b")
+        self.assertEqual(outbox.relay_pending_events(agent, batch_size=1), 1)
+        self.assertEqual(outbox.relay_pending_events(agent, batch_size=1), 1)
+        self.assertEqual(agent.sent, ["a", "b"])
+
+    def test_event_is_marked_dead_after_max_attempts(self):
+        refused = self._event("bad")
+        agent = _FakeRelayAgent(refuse={"bad"})
+        for _ in range(2):
+            UploadEventOutbox.objects.update(next_attempt_at=None)
+            outbox.relay_pending_events(agent, max_attempts=2)
+        refused.refresh_from_db()
+        self.assertEqual(refused.attempts, 2)
+        self.assertIsNotNone(refused.dead_at)
+        UploadEventOutbox.objects.update(next_attempt_at=None)
+        self.assertEqual(outbox.relay_pending_events(agent, max_attempts=2), 0)
+        self.assertEqual(UploadEventOutbox.objects.get().attempts, 2)
+        # A dead event is no longer backlog for upload admission
+        self.assertEqual(backpressure._unrelayed_events(), 0)
+
+    def test_retry_delay_doubles_up_to_the_cap(self):
+        self.assertEqual(outbox.retry_delay(2), 2 * outbox.retry_delay(1))
+        self.assertEqual(outbox.retry_delay(40), timedelta(seconds=outbox.RETRY_MAX_SECONDS))
+
+
+class _AdmissionTestCase(_ViewTestCase):
+    """Drives the sync and async upload views and upload_presign at the class's queue backlog."""
+
+    def setUp(self):
+        super().setUp()
+        self.agent.generate_presigned_upload.return_value = {"url": "https://bucket.s3.amazonaws.com", "fields": {}}
+
+    def _form(self):
+        return {"user": self.user.id, "filetype": "lebenslauf",
+                "filelocation": SimpleUploadedFile("cv.pdf", b"%PDF-1.7 admission", content_type="application/pdf")}
+
+    def _sync_upload(self):
+        response, texts = self._call(views.upload_file, "/upload", self._form())
+        return response.status_code, texts
+
+    def _async_upload(self):
+        response = self.client.post("/upload", self._form())
+        return response.status_code, [str(message) for message in get_messages(response.wsgi_request)]
+
+    def _presign(self):
+        response = self.client.post("/upload/presign", {
+            "filename": "cv.pdf", "filetype": "lebenslauf", "size": 1024, "content_type": "application/pdf"})
+        return response.status_code, response.json(), [str(message) for message in get_messages(response.wsgi_request)]
+
+
+class UploadAdmissionUnknownDepthTests(_AdmissionTestCase):
+    # Before the probe's first refresh, or while SQS cannot be read
+    backlog = None
+
+    def test_uploads_are_accepted_without_notice(self):
+        status, body, texts = self._presign()
+        self.assertEqual((status, body["success"], texts), (200, True, []))
+        self.assertEqual(self._sync_upload(), (302, ["File uploaded successfully."]))
+        self.assertEqual(self._async_upload(), (302, ["File uploaded successfully."]))
+
+    def test_unrelayed_outbox_events_still_count(self):
+        UploadEventOutbox.objects.bulk_create(
+            UploadEventOutbox(file_key=f"k{n}", payload={}) for n in range(backpressure._policy.defer_backlog))
+        status, texts = self._sync_upload()
+        self.assertEqual(status, 302)
+        self.assertTrue(texts[-1].startswith("Processing is running behind"), texts)
+
+
+class UploadAdmissionDeferredTests(_AdmissionTestCase):
+    backlog = 600
+
+    def test_uploads_are_accepted_with_the_expected_delay(self):
+        for status, texts in (self._sync_upload(), self._async_upload()):
+            self.assertEqual(status, 302)
+            self.assertEqual(texts[0], "File uploaded successfully.")
+            self.assertTrue(texts[1].startswith("Processing is running behind"), texts)
+        self.assertEqual(UploadEventOutbox.objects.count(), 2)
+
+    def test_presign_is_issued_with_the_notice(self):
+        status, body, texts = self._presign()
+        self.assertEqual((status, body["success"]), (200, True))
+        self.assertEqual(len(texts), 1)
+        self.assertTrue(texts[0].startswith("Processing is running behind"), texts)
+
+
+class UploadAdmissionRateLimitedTests(_AdmissionTestCase):
+    backlog = 2500
+
+    def test_user_within_the_limit_is_accepted(self):
+        status, texts = self._sync_upload()
+        self.assertEqual(status, 302)
+        self.assertEqual(texts[0], "File uploaded successfully.")
+
+    def test_user_over_the_limit_is_rejected_everywhere(self):
+        for n in range(backpressure.UPLOADS_PER_MINUTE):
+            self._stored(f"{n}.pdf")
+        for status, texts in (self._sync_upload(), self._async_upload()):
+            self.assertEqual(status, 302)
+            self.assertEqual(len(texts), 1)
+            self.assertTrue(texts[0].startswith("Document processing is heavily backed up"), texts)
+        status, body, _ = self._presign()
+        self.assertEqual((status, body["success"]), (429, False))
+        self.assertTrue(body["error"].startswith("Document processing is heavily backed up"))
+        self.agent.upload_fileobj_to_s3.assert_not_called()
+        self.agent.generate_presigned_upload.assert_not_called()
+        self.assertEqual(UploadedFile.objects.count(), backpressure.UPLOADS_PER_MINUTE)
@@ -0,0 +1,85 @@
+import hashlib
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler, StopUpload
+
+from config.configuration import ConfigurationCenter
+from helper.logger_setup import setup_logger
+
+logger = setup_logger('home_app')
+
+PDF_MAGIC = b"%PDF-"
+MAX_UPLOAD_BYTES = int(ConfigurationCenter().get_parameter('general_configuration', 'max_filesize_kb') or 0) * 1024
+# Room for the multipart boundaries and the small form fields sent along with the file
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+class _InspectingUploadMixin:
+    """
+    Hash, sniff and size-check every file while Django parses it, so the view never has to re-read it.
+    The finished upload carries .sha256, .detected_mime and .bytes_inspected. An upload over
+    max_filesize_kb stops parsing with StopUpload(connection_reset=True), noted in request.upload_rejections:
+    at the first file when the request's Content-Length is already too large, otherwise once the limit is crossed.
+    Fields sent before the file (the CSRF token among them) are kept. Under ASGI the server has already
+    received the whole body by then; what is saved is the hashing and temp-file writing of the rest.
+    """
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self._request_too_large = bool(MAX_UPLOAD_BYTES and content_length > MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES)
+        return super().handle_raw_input(input_data, META, content_length, boundary, encoding)
+
+    def _start_inspection(self, field_name, file_name, content_length):
+        self._digest = hashlib.sha256()
+        self._head = b""
+        self._received = 0
+        if MAX_UPLOAD_BYTES and (getattr(self, '_request_too_large', False) or (content_length or 0) > MAX_UPLOAD_BYTES):
+            self._reject(field_name, file_name)
+
+    def _inspect(self, raw_data):
+        self._received += len(raw_data)
+        if MAX_UPLOAD_BYTES and self._received > MAX_UPLOAD_BYTES:
+            self._reject(self.field_name, self.file_name)
+        if len(self._head) < len(PDF_MAGIC):
+            self._head += raw_data[:len(PDF_MAGIC) - len(self._head)]
+        self._digest.update(raw_data)
+
+    def _reject(self, field_name, file_name):
+        if not hasattr(self.request, 'upload_rejections'):
+            self.request.upload_rejections = {}
+        self.request.upload_rejections[field_name] = f'File size exceeded {MAX_UPLOAD_BYTES // 1024} KB.'
+        logger.warning("Upload %s aborted after %s bytes, limit is %s", file_name, self._received, MAX_UPLOAD_BYTES)
+        # Unlike SkipFile, this does not make the parser read the rest of the body
+        raise StopUpload(connection_reset=True)
+
+    def _annotate(self, uploaded_file):
+        if uploaded_file is not None:
+            uploaded_file.sha256 = self._digest.hexdigest()
+            uploaded_file.detected_mime = 'application/pdf' if self._head.startswith(PDF_MAGIC) else 'application/octet-stream'
+            uploaded_file.bytes_inspected = self._received
+        return uploaded_file
+
+
+class InspectingMemoryFileUploadHandler(_InspectingUploadMixin, MemoryFileUploadHandler):
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        # The parent raises StopFutureHandlers once it takes the file, so inspection must be set up first
+        self._start_inspection(field_name, file_name, content_length)
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.activated:
+            self._inspect(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        return self._annotate(super().file_complete(file_size))
+
+
+class InspectingTemporaryFileUploadHandler(_InspectingUploadMixin, TemporaryFileUploadHandler):
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        self._start_inspection(field_name, file_name, content_length)
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+
+    def receive_data_chunk(self, raw_data, start):
+        self._inspect(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        return self._annotate(super().file_complete(file_size))
@@ -1,12 +1,16 @@
 from django.urls import path,include
-from . import views
+from . import views, views_async
 
 app_name = "home_app"
 
 urlpatterns = [
     path('',views.home_page,name='home_page'),
-    path('upload',views.upload_file,name='upload'),
-    path('mydocuments',views.my_documents,name='mydocuments'),
+    path('upload',views_async.upload_file,name='upload'),
+    path('upload/presign',views.upload_presign,name='upload_presign'),
+    path('upload/complete',views.upload_complete,name='upload_complete'),
+    path('mydocuments',views_async.my_documents,name='mydocuments'),
+    path('download/<path:file_key_passed>',views.download_document,name='download'),
+    path('stream/<path:file_key_passed>',views.stream_document,name='stream'),
     path('editdocument/<path:file_key_passed>',views.editdocument,name='editdocument'),
 ]
 
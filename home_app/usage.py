@@ -0,0 +1,108 @@
+import atexit
+import os
+import queue
+import threading
+from django.db import close_old_connections, connection
+
+from helper.logger_setup import setup_logger
+from .models import BedrockCallLog
+
+logger = setup_logger('home_app')
+
+_STOP = object()
+
+
+class BedrockCallLogWriter:
+    """
+    Usage-aggregator sink that stores Bedrock calls in bedrock_call_log from one background thread.
+    Calls are queued, so no request or ask_batch() pool thread waits for an INSERT or opens a DB connection
+    of its own; the writer inserts whatever has queued up in one bulk_create. When the queue is full
+    (database down or slow) new calls are dropped and logged rather than blocking the caller.
+    """
+
+    def __init__(self, batch_size: int = 100, max_queue: int = 10000) -> None:
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self._reset()
+
+    def _reset(self) -> None:
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._dropped = 0
+
+    def __call__(self, call) -> None:
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(call)
+        except queue.Full:
+            self._dropped += 1
+            if self._dropped == 1 or self._dropped % 1000 == 0:
+                logger.warning("Bedrock call log queue full, %s calls dropped", self._dropped)
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="bedrock-call-log", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            calls = [self._queue.get()]
+            while len(calls) < self.batch_size:
+                try:
+                    calls.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if _STOP in calls:
+                stopping = True
+                calls = [call for call in calls if call is not _STOP]
+            if calls:
+                self._write(calls)
+            for _ in range(len(calls) + (1 if stopping else 0)):
+                self._queue.task_done()
+        connection.close()
+
+    def _write(self, calls) -> None:
+        # The thread lives as long as the process, so drop a connection the DB or CONN_MAX_AGE has ended
+        close_old_connections()
+        try:
+            BedrockCallLog.objects.bulk_create([
+                BedrockCallLog(
+                    model_id=call["model_id"],
+                    caller=call["caller"],
+                    input_tokens=call["input_tokens"] or 0,
+                    output_tokens=call["output_tokens"] or 0,
+                    server_latency_ms=call["server_latency_ms"],
+                    client_latency_ms=call["client_latency_ms"],
+                    error=call["error"],
+                )
+                for call in calls
+            ])
+        except Exception:
+            logger.exception("Failed to write %s Bedrock call log rows", len(calls))
+
+    def flush(self) -> None:
+        """Block until every queued call has been written (or failed)."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Write what is queued and end the writer thread; waits at most timeout seconds."""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(timeout)
+
+
+log_bedrock_call = BedrockCallLogWriter()
+atexit.register(log_bedrock_call.stop)
+# The writer thread does not survive a fork; a pre-fork server's workers each start their own
+os.register_at_fork(after_in_child=log_bedrock_call._reset)
@@ -2,13 +2,21 @@ from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.db import transaction
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.views.decorators.http import require_POST
 from datetime import datetime, timezone
+import hashlib
+import os
+import re
 import uuid
 
-from .forms import UploadedFileForm,lebenslaufMetadataForm
+from .forms import UploadedFileForm,lebenslaufMetadataForm,PresignedUploadForm
 from helper.logger_setup import setup_logger
-from helper.aws_boto3_agent import AWSBoto3Agent
+from helper.aws_boto3_agent import get_aws_agent
 from .services import Local_Supporter
+from .outbox import enqueue_upload_event
+from .backpressure import upload_admission
+from .upload_handlers import PDF_MAGIC
 from config.configuration import ConfigurationCenter
 from django.shortcuts import get_object_or_404
 
@@ -21,7 +29,9 @@ ALLOWED_EXTENSIONS = {'pdf'}
 _minicenter = ConfigurationCenter()
 MAX_FILE_SIZE_KB = int(_minicenter.get_parameter('general_configuration', 'max_filesize_kb') or 0)
 BUCKET_NAME = _minicenter.get_parameter('aws_configuration', 's3_bucketname') or ''
-_boto3_agent = AWSBoto3Agent()
+PRESIGNED_POST_EXPIRES_SECONDS = int(_minicenter.get_parameter('s3_configuration', 'presigned_post_expires_seconds') or 300)
+_range_header = re.compile(r"^bytes=(\d*)-(\d*)$")
+DUPLICATE_REUSED_MESSAGE = 'File uploaded successfully. It matches a document you uploaded before, so its extracted data was reused.'
 
 def home_page(request):
     return render(request, 'home_page.html')
@@ -30,42 +40,164 @@ def _exit_error(request, msg):
     messages.error(request, msg)
     return redirect('home_app:upload')
 
-def _exit_success(request, msg):
+def _exit_success(request, msg, notice=None):
     messages.success(request, msg)
+    if notice:
+        messages.warning(request, notice)
     return redirect('home_app:upload')
 
+def _build_file_key(user_id, original_name):
+    # Build a safe, unique S3 key
+    now_part = datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')
+    prefix = f"uploads/user-{user_id}/{now_part}-{uuid.uuid4().hex}-"
+    # The key is stored in file_address_key and filelocation (max_length 200); shorten the stem, keep the extension
+    room = UploadedFile._meta.get_field('file_address_key').max_length - len(prefix)
+    if len(original_name) > room:
+        stem, extension = os.path.splitext(original_name)
+        if len(extension) >= room // 2:
+            stem, extension = original_name, ''
+        original_name = stem[:room - len(extension)] + extension
+    return f"{prefix}{original_name}"
+
+def _validate_upload(file_name, file_size, content_type):
+    """Return an error message for the user, or None when the upload is acceptable."""
+    # Size check (bytes vs KB)
+    max_bytes = MAX_FILE_SIZE_KB * 1024
+    if max_bytes and file_size > max_bytes:
+        return f'File size exceeded {MAX_FILE_SIZE_KB} KB.'
+
+    # Extension check (case-insensitive)
+    if not Local_Supporter.allowed_file_extention(file_name, ALLOWED_EXTENSIONS):
+        return f'Unsupported file extension. Allowed: {", ".join(sorted(ALLOWED_EXTENSIONS))}'
+
+    # Optional: simple MIME/content-type check (server-provided; not foolproof)
+    if not content_type or 'pdf' not in content_type.lower():
+        logger.info("Content-Type check failed: %s", content_type)
+        return 'Unsupported file type. Only PDF is allowed.'
+    return None
+
+def _persist_upload(request, instance, file_key):
+    """Save the UploadedFile row and its outbox event in one transaction; roll the S3 object back on failure."""
+    # The SQS message is sent later by `manage.py relay_outbox`, so the request returns once the DB commits
+    try:
+        with transaction.atomic():
+            # Store bucket & key separately; don’t mash them with a dot
+            instance.file_address_key = file_key
+            # The object is already in S3 under file_key; naming the field after it keeps save() from storing it again
+            instance.filelocation = file_key
+            instance.save()
+            enqueue_upload_event(instance)
+    except Exception as e:
+        logger.exception("DB failure after S3 upload for user %s, key %s: %s", request.user.id, file_key, e)
+        # RollBack the S3 upload if the DB write fails
+        if not get_aws_agent().delete_fileobj_from_s3(file_key=file_key):
+            logger.error("Failed to delete S3 object %s after DB failure for user %s, This is Incosistency Red flag", file_key, request.user.id)
+        return False
+    return True
+
+def _reusable_metadata(user, file_hash, filetype):
+    """Extracted data of an earlier upload by this user with the same bytes and the same document type."""
+    # Uploads without metadata (other document types, failed or still queued CVs) go through normal processing
+    return (LebenslaufMetadata.objects.select_related('file_key')
+            .filter(file_key__user=user, file_key__file_hash=file_hash, file_key__filetype=filetype)
+            .order_by('-file_key__uploadtime'))
+
+def _clone_metadata(request, instance, metadata, file_key):
+    """Save the UploadedFile row for file_key with a copy of metadata, without queueing it for processing."""
+    duplicate = metadata.file_key
+    try:
+        with transaction.atomic():
+            instance.file_address_key = file_key
+            instance.file_hash = duplicate.file_hash
+            instance.filelocation = file_key
+            instance.save()
+
+            metadata.pk = None
+            metadata.file_key = instance
+            metadata.save()
+    except Exception as e:
+        logger.exception("DB failure cloning duplicate %s for user %s, key %s: %s", duplicate.file_address_key, request.user.id, file_key, e)
+        if not get_aws_agent().delete_fileobj_from_s3(file_key=file_key):
+            logger.error("Failed to delete S3 object %s after DB failure for user %s, This is Incosistency Red flag", file_key, request.user.id)
+        return False
+
+    logger.info("Duplicate upload reused metadata of %s for user %s, key %s", duplicate.file_address_key, request.user.id, file_key)
+    return True
+
+def _reuse_duplicate(request, instance, metadata, original_name, notice=None):
+    """
+    Identical bytes were already processed for this user: copy the object and metadata instead of re-processing.
+    notice is the backpressure notice from upload_admission, shown like on a normal upload.
+    """
+    file_key = _build_file_key(request.user.id, original_name)
+    if not get_aws_agent().copy_object_in_s3(metadata.file_key.file_address_key, file_key):
+        return _exit_error(request, 'Internal error during upload.')
+    if not _clone_metadata(request, instance, metadata, file_key):
+        return _exit_error(request, 'Internal error finalizing upload.')
+    return _exit_success(request, DUPLICATE_REUSED_MESSAGE, notice)
+
+def _s3_upload_is_pdf(file_key):
+    """Ranged GET of the first bytes of a direct upload; None when the object cannot be read."""
+    opened = get_aws_agent().get_object_stream(file_key, byte_range=(0, len(PDF_MAGIC) - 1))
+    if opened is None:
+        return None
+    return b"".join(opened[0]).startswith(PDF_MAGIC)
+
+def _s3_upload_sha256(file_key):
+    """SHA-256 of a direct upload, read in stream_chunk_size_kb chunks; None when the object cannot be read."""
+    opened = get_aws_agent().get_object_stream(file_key)
+    if opened is None:
+        return None
+    digest = hashlib.sha256()
+    for chunk in opened[0]:
+        digest.update(chunk)
+    return digest.hexdigest()
+
+def _check_upload_form(request, form):
+    """Validate the posted upload form; returns (uploaded_file, file_hash, error_message)."""
+    if not form.is_valid():
+        logger.warning("Upload form invalid for user %s: %s", request.user.id, form.errors)
+        rejections = getattr(request, 'upload_rejections', None)
+        if rejections:
+            # The upload handler stopped receiving the file once it crossed max_filesize_kb
+            return None, None, next(iter(rejections.values()))
+        return None, None, 'Invalid input. Please check the form and try again.'
+
+    uploaded_django_file = form.cleaned_data['filelocation']  # a Django InMemoryUploadedFile / TemporaryUploadedFile
+
+    error = _validate_upload(uploaded_django_file.name, uploaded_django_file.size, uploaded_django_file.content_type)
+    if error:
+        return None, None, error
+
+    # Sniffed from the first chunk by the upload handler, unlike content_type which the browser chooses
+    if getattr(uploaded_django_file, 'detected_mime', 'application/pdf') != 'application/pdf':
+        logger.info("PDF magic bytes missing in %s for user %s", uploaded_django_file.name, request.user.id)
+        return None, None, 'Unsupported file type. Only PDF is allowed.'
+
+    file_hash = getattr(uploaded_django_file, 'sha256', None) or Local_Supporter.file_sha256(uploaded_django_file)
+    return uploaded_django_file, file_hash, None
+
 @login_required(login_url='accounts_app:login')
 def upload_file(request):
     if request.method == 'POST':
-        form = UploadedFileForm(request.POST, request.FILES)
-        if not form.is_valid():
-            logger.warning("Upload form invalid for user %s: %s", request.user.id, form.errors)
-            return _exit_error(request, 'Invalid input. Please check the form and try again.')
+        accepted, notice = upload_admission(get_aws_agent(), request.user.id)
+        if not accepted:
+            return _exit_error(request, notice)
 
-        uploaded_django_file = form.cleaned_data['filelocation']  # a Django InMemoryUploadedFile / TemporaryUploadedFile
-
-        # Size check (bytes vs KB)
-        max_bytes = MAX_FILE_SIZE_KB * 1024
-        if max_bytes and uploaded_django_file.size > max_bytes:
-            return _exit_error(request, f'File size exceeded {MAX_FILE_SIZE_KB} KB.')
-
-        # Extension check (case-insensitive)
-        if not Local_Supporter.allowed_file_extention(uploaded_django_file.name, ALLOWED_EXTENSIONS):
-            return _exit_error(request, f'Unsupported file extension. Allowed: {", ".join(sorted(ALLOWED_EXTENSIONS))}')
+        form = UploadedFileForm(request.POST, request.FILES)
+        uploaded_django_file, file_hash, error = _check_upload_form(request, form)
+        if error:
+            return _exit_error(request, error)
 
-        # Optional: simple MIME/content-type check (server-provided; not foolproof)
-        if not uploaded_django_file.content_type or 'pdf' not in uploaded_django_file.content_type.lower():
-            logger.info("Content-Type check failed: %s", uploaded_django_file.content_type)
-            return _exit_error(request, 'Unsupported file type. Only PDF is allowed.')
+        metadata = _reusable_metadata(request.user, file_hash, form.cleaned_data['filetype']).first()
+        if metadata is not None:
+            return _reuse_duplicate(request, form.save(commit=False), metadata, uploaded_django_file.name, notice)
 
-        # Build a safe, unique S3 key
-        now_part = datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')
-        filename=f"{now_part}-{uuid.uuid4().hex}-{uploaded_django_file.name}"
-        file_key = f"uploads/user-{request.user.id}/{filename}"
+        file_key = _build_file_key(request.user.id, uploaded_django_file.name)
 
         # Upload to S3 first (so DB doesn’t point to missing objects if upload fails)
         try:
-            uploaded = _boto3_agent.upload_fileobj_to_s3(uploaded_django_file, file_key)  # assume this uses BUCKET_NAME internally or accepts bucket separately
+            uploaded = get_aws_agent().upload_fileobj_to_s3(uploaded_django_file, file_key)  # assume this uses BUCKET_NAME internally or accepts bucket separately
         except Exception as e:
             logger.exception("S3 upload error for user %s, key %s: %s", request.user.id, file_key, e)
             return _exit_error(request, 'Internal error during upload.')
@@ -74,33 +206,133 @@ def upload_file(request):
             logger.error("S3 upload returned falsy for user %s, key %s", request.user.id, file_key)
             return _exit_error(request, 'Internal error during upload.')
 
-        # Persist + SQS (atomic transaction for DB; decide policy if SQS fails)
-        try:
-            with transaction.atomic():
-                instance = form.save(commit=False)
-                # Store bucket & key separately; don’t mash them with a dot
-                instance.file_address_key = file_key
-                instance.save()
-
-                payload = Local_Supporter.clean_dict_for_sqs(instance)
-                msg_id = _boto3_agent.send_sqs_message(payload)
-                if not msg_id:
-                    # Decide whether to fail or just log. Here we fail so the user can retry.
-                    logger.error("SQS send failed for user %s; payload=%s", request.user.id, payload)
-                    raise RuntimeError("SQS send failed")
-        except Exception as e:
-            logger.exception("DB/SQS failure after S3 upload for user %s, key %s: %s", request.user.id, file_key, e)
-            # RollBack the S3 upload if DB/SQS fails
-            if not _boto3_agent.delete_fileobj_from_s3(file_key=file_key):
-                logger.error("Failed to delete S3 object %s after DB/SQS failure for user %s, This is Incosistency Red flag", file_key, request.user.id)
+        instance = form.save(commit=False)
+        instance.file_hash = file_hash
+        if not _persist_upload(request, instance, file_key):
             return _exit_error(request, 'Internal error finalizing upload.')
 
-        return _exit_success(request, 'File uploaded successfully.')
+        return _exit_success(request, 'File uploaded successfully.', notice)
 
     # GET
     form = UploadedFileForm()
     return render(request, 'upload_page.html', {'form': form})
 
+@login_required(login_url='accounts_app:login')
+@require_POST
+def upload_presign(request):
+    """Issue a presigned POST so the browser uploads the PDF to S3 without passing through this worker."""
+    form = PresignedUploadForm(request.POST)
+    if not form.is_valid():
+        logger.warning("Presign form invalid for user %s: %s", request.user.id, form.errors)
+        return JsonResponse({'success': False, 'error': 'Invalid input.'}, status=400)
+
+    data = form.cleaned_data
+    error = _validate_upload(data['filename'], data['size'], data['content_type'])
+    if error:
+        return JsonResponse({'success': False, 'error': error}, status=400)
+
+    accepted, notice = upload_admission(get_aws_agent(), request.user.id)
+    if not accepted:
+        # The page falls back to the regular form post, which reports the limit through messages
+        return JsonResponse({'success': False, 'error': notice}, status=429)
+
+    file_key = _build_file_key(request.user.id, data['filename'])
+    max_bytes = MAX_FILE_SIZE_KB * 1024 or data['size']
+    presigned = get_aws_agent().generate_presigned_upload(
+        file_key, max_bytes, content_type='application/pdf', expires_in=PRESIGNED_POST_EXPIRES_SECONDS,
+    )
+    if not presigned:
+        return JsonResponse({'success': False, 'error': 'Internal error during upload.'}, status=502)
+
+    # Remember which keys we handed out so the completion call cannot claim arbitrary objects
+    pending = request.session.get('pending_uploads', {})
+    pending[file_key] = data['filetype']
+    request.session['pending_uploads'] = pending
+
+    if notice:
+        # Shown with the completion message once the page reloads
+        messages.warning(request, notice)
+    return JsonResponse({'success': True, 'file_key': file_key, 'url': presigned['url'], 'fields': presigned['fields']})
+
+@login_required(login_url='accounts_app:login')
+@require_POST
+def upload_complete(request):
+    """Called by the browser after the direct S3 upload: verify the object, then persist and queue it."""
+    file_key = request.POST.get('file_key', '')
+    pending = request.session.get('pending_uploads', {})
+    filetype = pending.pop(file_key, None)
+    request.session['pending_uploads'] = pending
+    if filetype is None or not file_key.startswith(f"uploads/user-{request.user.id}/"):
+        logger.error("Upload completion for unknown key %s by user %s", file_key, request.user.id)
+        return JsonResponse({'success': False, 'error': 'Unknown upload.'}, status=400)
+
+    head = get_aws_agent().head_object_in_s3(file_key)
+    if not head:
+        messages.error(request, 'Upload did not reach storage. Please try again.')
+        return JsonResponse({'success': False, 'error': 'Object not found.'}, status=400)
+
+    error = _validate_upload(file_key, head.get('ContentLength', 0), head.get('ContentType'))
+    if error is None:
+        # The browser chose the Content-Type; the bytes have to start like a PDF as well
+        is_pdf = _s3_upload_is_pdf(file_key)
+        if is_pdf is None:
+            messages.error(request, 'Upload did not reach storage. Please try again.')
+            return JsonResponse({'success': False, 'error': 'Object not readable.'}, status=400)
+        if not is_pdf:
+            logger.info("PDF magic bytes missing in direct upload %s for user %s", file_key, request.user.id)
+            error = 'Unsupported file type. Only PDF is allowed.'
+    if error:
+        if not get_aws_agent().delete_fileobj_from_s3(file_key=file_key):
+            logger.error("Failed to delete rejected S3 object %s for user %s", file_key, request.user.id)
+        messages.error(request, error)
+        return JsonResponse({'success': False, 'error': error}, status=400)
+
+    instance = UploadedFile(user=request.user, filetype=filetype, file_hash=_s3_upload_sha256(file_key))
+    metadata = _reusable_metadata(request.user, instance.file_hash, filetype).first() if instance.file_hash else None
+    if metadata is not None:
+        if not _clone_metadata(request, instance, metadata, file_key):
+            messages.error(request, 'Internal error finalizing upload.')
+            return JsonResponse({'success': False, 'error': 'Internal error finalizing upload.'}, status=500)
+        messages.success(request, DUPLICATE_REUSED_MESSAGE)
+        return JsonResponse({'success': True, 'file_key': file_key})
+
+    if not _persist_upload(request, instance, file_key):
+        messages.error(request, 'Internal error finalizing upload.')
+        return JsonResponse({'success': False, 'error': 'Internal error finalizing upload.'}, status=500)
+
+    messages.success(request, 'File uploaded successfully.')
+    return JsonResponse({'success': True, 'file_key': file_key})
+
+def _bulk_delete(request, file_keys):
+    """Delete the selected documents with batched S3 deletes and one ORM delete, reporting each key."""
+    file_keys = list(dict.fromkeys(key for key in file_keys if key))
+    if not file_keys:
+        messages.error(request, 'No documents selected.')
+        return
+    try:
+        owned = set(UploadedFile.objects.filter(user=request.user, file_address_key__in=file_keys)
+                    .values_list('file_address_key', flat=True))
+        results = get_aws_agent().delete_objects_from_s3([key for key in file_keys if key in owned])
+        confirmed = [key for key, error in results.items() if error is None]
+        if confirmed:
+            UploadedFile.objects.filter(user=request.user, file_address_key__in=confirmed).delete()
+    except Exception as e:
+        logger.exception("Error bulk deleting documents for user %s, keys %s: %s", request.user.id, file_keys, e)
+        messages.error(request, 'An error occurred while deleting the documents.')
+        return
+
+    _report_bulk_delete(request, file_keys, owned, results)
+
+def _report_bulk_delete(request, file_keys, owned, results):
+    for key in file_keys:
+        name = key.rsplit('/', 1)[-1]
+        if key not in owned:
+            messages.error(request, f'{name}: document not found.')
+        elif results.get(key) is None:
+            messages.success(request, f'{name}: deleted.')
+        else:
+            messages.error(request, f'{name}: {results[key]}')
+
 @login_required(login_url='accounts_app:login')
 def my_documents(request):
     if request.method=="POST":
@@ -117,7 +349,7 @@ def my_documents(request):
                 instance = get_object_or_404(UploadedFile, file_address_key=file_key, user=request.user)
                 
                 # Delete the S3 object first
-                if not _boto3_agent.delete_fileobj_from_s3(file_key=file_key):
+                if not get_aws_agent().delete_fileobj_from_s3(file_key=file_key):
                     messages.error(request, 'Failed to delete the document from S3.')
                     return redirect('home_app:mydocuments')
                 instance.delete()
@@ -126,10 +358,60 @@ def my_documents(request):
                 messages.error(request, 'An error occurred while deleting the document.')
                 return redirect('home_app:mydocuments')
             messages.success(request, 'Document deleted successfully.')
+        elif request.POST.get('action') == 'bulk_delete':
+            _bulk_delete(request, request.POST.getlist('file_keys'))
         return redirect('home_app:mydocuments')
     documents = LebenslaufMetadata.objects.filter(user=request.user).order_by('-file_key')
     return render(request, 'my_documents.html', {'documents': documents})
 
+@login_required(login_url='accounts_app:login')
+def download_document(request, file_key_passed):
+    instance = get_object_or_404(UploadedFile, file_address_key=file_key_passed, user=request.user)
+    # Keys look like uploads/user-<id>/<timestamp>-<uuid>-<original name>
+    original_name = instance.file_address_key.rsplit('/', 1)[-1].split('-', 2)[-1]
+    url = get_aws_agent().generate_presigned_download(instance.file_address_key, filename=original_name)
+    if not url:
+        messages.error(request, 'The document is not available for download right now.')
+        return redirect('home_app:mydocuments')
+    return redirect(url)
+
+def _parse_range(header):
+    """Single 'bytes=start-end' range -> (start, end) for S3, None for no/unsupported range, False if invalid."""
+    if not header:
+        return None
+    match = _range_header.match(header.strip())
+    if not match or match.group(1) == '':
+        # Suffix ranges and multi-range requests are served as a full response
+        return None
+    start = int(match.group(1))
+    end = int(match.group(2)) if match.group(2) else None
+    if end is not None and end < start:
+        return False
+    return (start, end)
+
+@login_required(login_url='accounts_app:login')
+def stream_document(request, file_key_passed):
+    """Serve a document inline through the worker in fixed-size chunks, honouring a single Range header."""
+    instance = get_object_or_404(UploadedFile, file_address_key=file_key_passed, user=request.user)
+    byte_range = _parse_range(request.headers.get('Range'))
+    if byte_range is False:
+        return HttpResponse(status=416)
+
+    opened = get_aws_agent().get_object_stream(instance.file_address_key, byte_range=byte_range)
+    if opened is None:
+        return HttpResponse(status=416 if byte_range else 404)
+    chunks, info = opened
+
+    response = StreamingHttpResponse(chunks, status=206 if byte_range else 200,
+                                     content_type=info['content_type'] or 'application/pdf')
+    response['Accept-Ranges'] = 'bytes'
+    if info['content_length'] is not None:
+        response['Content-Length'] = str(info['content_length'])
+    if byte_range and info['content_range']:
+        response['Content-Range'] = info['content_range']
+    response['Content-Disposition'] = 'inline'
+    return response
+
 @login_required(login_url='accounts_app:login')
 def editdocument(request, file_key_passed):
     try:
@@ -0,0 +1,125 @@
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import redirect
+
+from helper.aws_boto3_agent import get_aws_agent
+from helper.aws_executor import run_blocking
+from helper.logger_setup import setup_logger
+from . import views
+from .backpressure import upload_admission
+from .forms import UploadedFileForm
+from .models import UploadedFile
+
+logger = setup_logger('home_app')
+
+'''
+Async twins of the upload and delete views for the Uvicorn deployment.
+Blocking boto3 calls run on the bounded AWS executor, ORM work goes through Django's
+async ORM or sync_to_async, so a worker keeps many uploads in flight instead of
+serialising them on the single thread Django uses for sync views under ASGI.
+GET requests are rendered by the sync views.
+'''
+
+
+def _bind_upload_form(request):
+    # Reading request.POST parses the multipart body through the upload handlers (hashing, temp-file
+    # writes) and form validation resolves the user field through the ORM, so neither runs on the event loop
+    form = UploadedFileForm(request.POST, request.FILES)
+    return (form, *views._check_upload_form(request, form))
+
+
+@login_required(login_url='accounts_app:login')
+async def upload_file(request):
+    if request.method != 'POST':
+        return await sync_to_async(views.upload_file)(request)
+
+    user = await request.auser()
+    accepted, notice = await sync_to_async(upload_admission)(get_aws_agent(), user.id)
+    if not accepted:
+        return views._exit_error(request, notice)
+
+    form, uploaded_django_file, file_hash, error = await sync_to_async(_bind_upload_form)(request)
+    if error:
+        return views._exit_error(request, error)
+
+    metadata = await views._reusable_metadata(user, file_hash, form.cleaned_data['filetype']).afirst()
+    if metadata is not None:
+        return await sync_to_async(views._reuse_duplicate)(request, form.save(commit=False), metadata,
+                                                            uploaded_django_file.name, notice)
+
+    file_key = views._build_file_key(user.id, uploaded_django_file.name)
+
+    # Upload to S3 first (so DB doesn’t point to missing objects if upload fails)
+    try:
+        uploaded = await run_blocking(get_aws_agent().upload_fileobj_to_s3, uploaded_django_file, file_key)
+    except Exception as e:
+        logger.exception("S3 upload error for user %s, key %s: %s", user.id, file_key, e)
+        return views._exit_error(request, 'Internal error during upload.')
+
+    if not uploaded:
+        logger.error("S3 upload returned falsy for user %s, key %s", user.id, file_key)
+        return views._exit_error(request, 'Internal error during upload.')
+
+    instance = form.save(commit=False)
+    instance.file_hash = file_hash
+    if not await sync_to_async(views._persist_upload)(request, instance, file_key):
+        return views._exit_error(request, 'Internal error finalizing upload.')
+
+    return views._exit_success(request, 'File uploaded successfully.', notice)
+
+
+async def _delete_document(request, user, file_key):
+    if not file_key:
+        messages.error(request, 'File key is missing.')
+        logger.error("Delete action called without file_key for user %s", user.id)
+        return
+    try:
+        instance = await UploadedFile.objects.filter(file_address_key=file_key, user=user).afirst()
+        if instance is None:
+            messages.error(request, 'Document not found.')
+            return
+
+        # Delete the S3 object first
+        if not await run_blocking(get_aws_agent().delete_fileobj_from_s3, file_key=file_key):
+            messages.error(request, 'Failed to delete the document from S3.')
+            return
+        await instance.adelete()
+    except Exception as e:
+        logger.exception("Error deleting document for user %s, file_key %s: %s", user.id, file_key, e)
+        messages.error(request, 'An error occurred while deleting the document.')
+        return
+    messages.success(request, 'Document deleted successfully.')
+
+
+async def _bulk_delete(request, user, file_keys):
+    file_keys = list(dict.fromkeys(key for key in file_keys if key))
+    if not file_keys:
+        messages.error(request, 'No documents selected.')
+        return
+    try:
+        owned_qs = UploadedFile.objects.filter(user=user, file_address_key__in=file_keys)
+        owned = {key async for key in owned_qs.values_list('file_address_key', flat=True)}
+        results = await run_blocking(get_aws_agent().delete_objects_from_s3, [key for key in file_keys if key in owned])
+        confirmed = [key for key, error in results.items() if error is None]
+        if confirmed:
+            await UploadedFile.objects.filter(user=user, file_address_key__in=confirmed).adelete()
+    except Exception as e:
+        logger.exception("Error bulk deleting documents for user %s, keys %s: %s", user.id, file_keys, e)
+        messages.error(request, 'An error occurred while deleting the documents.')
+        return
+    views._report_bulk_delete(request, file_keys, owned, results)
+
+
+@login_required(login_url='accounts_app:login')
+async def my_documents(request):
+    if request.method != 'POST':
+        return await sync_to_async(views.my_documents)(request)
+
+    user = await request.auser()
+    action = request.POST.get('action')
+    if action == 'delete':
+        await _delete_document(request, user, request.POST.get('file_key'))
+    elif action == 'bulk_delete':
+        await _bulk_delete(request, user, request.POST.getlist('file_keys'))
+    return redirect('home_app:mydocuments')
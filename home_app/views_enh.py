@@ -62,12 +62,13 @@ def _create_safe_filename(user_id: int, original_filename: str) -> str:
 def _validate_file_content(uploaded_file) -> Dict[str, Any]:
     """Validate file content beyond extension check."""
     try:
-        # Check actual MIME type
-        uploaded_file.seek(0)
-        file_content = uploaded_file.read(1024)  # Read first 1KB
-        uploaded_file.seek(0)
-        
-        detected_type = magic.from_buffer(file_content, mime=True)
+        # Check actual MIME type (already sniffed by the upload handler when it ran)
+        detected_type = getattr(uploaded_file, 'detected_mime', None)
+        if detected_type is None:
+            uploaded_file.seek(0)
+            file_content = uploaded_file.read(1024)  # Read first 1KB
+            uploaded_file.seek(0)
+            detected_type = magic.from_buffer(file_content, mime=True)
         
         if detected_type not in ALLOWED_MIME_TYPES:
             return {
@@ -76,9 +77,11 @@ def _validate_file_content(uploaded_file) -> Dict[str, Any]:
             }
         
         # Generate file hash for deduplication/integrity
-        uploaded_file.seek(0)
-        file_hash = hashlib.sha256(uploaded_file.read()).hexdigest()
-        uploaded_file.seek(0)
+        file_hash = getattr(uploaded_file, 'sha256', None)
+        if file_hash is None:
+            uploaded_file.seek(0)
+            file_hash = hashlib.sha256(uploaded_file.read()).hexdigest()
+            uploaded_file.seek(0)
         
         return {
             'valid': True,